@@ -1,14 +1,21 @@
 import os
 import re
-import tensorflow as tf
-import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
+from lazy_imports import lazy_import
 from datetime import datetime
+import timeutil
+import analytics
+import prediction_cache
 from db import create_connection
+from repositories import UserRepository, ConsultationRepository, PredictionRepository, ModelVersionRepository
 from gift_card import *
 from disease_outbreak import DiseaseOutbreak
 
+# Only needed for training, evaluation and plots; imported on first use
+tf = lazy_import('tensorflow')
+np = lazy_import('numpy')
+Image = lazy_import('PIL.Image')
+plt = lazy_import('matplotlib.pyplot')
+
 
 class AdminFunctions:
     def __init__(self):
@@ -81,30 +88,21 @@ class AdminFunctions:
                 print("Invalid choice")
 
     def view_all_users(self):
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, username, role, email, status 
-                    FROM users 
-                    ORDER BY role, username
-                ''')
-                users = cursor.fetchall()
-                
-                print("\n=== All Users ===")
-                if not users:
-                    print("No users found.")
-                else:
-                    for user in users:
-                        print(f"\nID: {user[0]}")
-                        print(f"Username: {user[1]}")
-                        print(f"Role: {user[2]}")
-                        print(f"Email: {user[3]}")
-                        print(f"Status: {user[4]}")
-                        print("-" * 30)
-            finally:
-                conn.close()
+        # Read from the live database, not the analytics replica: users
+        # register from other sessions, so a snapshot could miss them
+        print("\n=== All Users ===")
+        found = False
+        # Stream the listing instead of materializing every user up front
+        for user in UserRepository().iter_all():
+            found = True
+            print(f"\nID: {user.id}")
+            print(f"Username: {user.username}")
+            print(f"Role: {user.role}")
+            print(f"Email: {user.email}")
+            print(f"Status: {user.status}")
+            print("-" * 30)
+        if not found:
+            print("No users found.")
 
     def manage_expert_registrations(self):
         conn = create_connection()
@@ -141,6 +139,7 @@ class AdminFunctions:
                         else:
                             print("Invalid input")
                 conn.commit()
+                analytics.invalidate_snapshot()
                 print("Expert registrations processed successfully!")
             finally:
                 conn.close()
@@ -170,61 +169,32 @@ class AdminFunctions:
                 break
                
     def view_model_versions(self):
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT version_number, accuracy, total_classes, 
-                        training_date, description, is_active 
-                    FROM model_versions 
-                    ORDER BY training_date DESC
-                ''')
-                versions = cursor.fetchall()
-                
-                print("\n=== Model Versions ===")
-                for version in versions:
-                    print(f"\nVersion: {version[0]}")
-                    print(f"Accuracy: {version[1]*100:.2f}%")
-                    print(f"Total Classes: {version[2]}")
-                    print(f"Training Date: {version[3]}")
-                    print(f"Description: {version[4]}")
-                    print(f"Active: {'Yes' if version[5] else 'No'}")
-                    print("-" * 30)
-            finally:
-                conn.close()
+        conn = analytics.connect_replica()
+        if not conn:
+            return
+        try:
+            versions = ModelVersionRepository(conn).all()
+        finally:
+            conn.close()
+
+        print("\n=== Model Versions ===")
+        for version in versions:
+            print(f"\nVersion: {version.version_number}")
+            print(f"Accuracy: {version.accuracy*100:.2f}%")
+            print(f"Total Classes: {version.total_classes}")
+            print(f"Training Date: {timeutil.format_timestamp(version.training_date)}")
+            print(f"Description: {version.description}")
+            print(f"Active: {'Yes' if version.is_active else 'No'}")
+            print("-" * 30)
 
     def view_system_statistics(self):
-        conn = create_connection()
+        conn = analytics.connect_replica()
         if conn:
             try:
-                cursor = conn.cursor()
-                
-                # Get user statistics
-                cursor.execute('''
-                    SELECT role, COUNT(*) 
-                    FROM users 
-                    GROUP BY role
-                ''')
-                user_stats = cursor.fetchall()
-                
-                # Get consultation statistics
-                cursor.execute('''
-                    SELECT status, COUNT(*) 
-                    FROM consultations 
-                    GROUP BY status
-                ''')
-                consultation_stats = cursor.fetchall()
-                
-                # Get disease prediction statistics
-                cursor.execute('''
-                    SELECT disease_name, COUNT(*) 
-                    FROM disease_predictions 
-                    GROUP BY disease_name 
-                    ORDER BY COUNT(*) DESC 
-                    LIMIT 5
-                ''')
-                disease_stats = cursor.fetchall()
+                # Get user, consultation and disease prediction statistics
+                user_stats = UserRepository(conn).counts_by_role()
+                consultation_stats = ConsultationRepository(conn).counts_by_status()
+                disease_stats = PredictionRepository(conn).top_diseases(5)
 
                 print("\n=== System Statistics ===")
 
@@ -307,8 +277,8 @@ class AdminFunctions:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO news (title, content, created_at)
-                    VALUES (?, ?, datetime('now'))
-                ''', (title, content))
+                    VALUES (?, ?, ?)
+                ''', (title, content, timeutil.now()))
                 conn.commit()
                 print("\nNews added successfully!")
             except Exception as e:
@@ -333,7 +303,7 @@ class AdminFunctions:
                     print(f"\nID: {item[0]}")
                     print(f"Title: {item[1]}")
                     print(f"Content: {item[2]}")
-                    print(f"Date: {item[3]}")
+                    print(f"Date: {timeutil.format_timestamp(item[3])}")
                     print("-" * 50)
             finally:
                 conn.close()
@@ -588,14 +558,32 @@ class AdminFunctions:
                         description, is_active)
                         VALUES (?, ?, ?, ?, ?, ?)
                     ''', (model_path, version, accuracy, num_classes, description, 0))
+                    model_version_id = cursor.lastrowid
                     conn.commit()
+                    analytics.invalidate_snapshot()
                     print("\nModel saved and recorded in database successfully!")
                 except Exception as e:
                     print(f"Error recording model version: {e}")
+                    model_version_id = None
                 finally:
                     conn.close()
+                if model_version_id is not None:
+                    self.export_tflite_variants(trainer, model_path, model_version_id)
         else:
             print("\nModel accuracy too low. Consider adjusting parameters and training again.")
+    def export_tflite_variants(self, trainer, model_path, model_version_id):
+        print("\nExporting TFLite variants...")
+        try:
+            results = trainer.export_tflite_variants(model_path, model_version_id)
+        except Exception as e:
+            print(f"Error exporting TFLite variants: {e}")
+            return
+        for variant, (variant_accuracy, latency_ms) in results.items():
+            if variant_accuracy is None:
+                continue
+            print(f"{variant:<8} accuracy: {variant_accuracy * 100:.2f}%  latency: {latency_ms:.2f} ms")
+        print(f"Choose the serving variant with: python tflite_models.py --choose {model_version_id} --budget-ms <ms>")
+
     def view_model_classes(self):
         try:
             conn = create_connection() 
@@ -610,7 +598,7 @@ class AdminFunctions:
                     print("Class Index | Class Name     | Date Added")
                     print("-" * 50)  
                     for row in rows:
-                        formatted_date = row[2] if isinstance(row[2], str) else row[2].strftime('%Y-%m-%d')
+                        formatted_date = timeutil.format_timestamp(row[2], '%Y-%m-%d')
                         print(f"{row[0]:<12} | {row[1]:<15} | {formatted_date}")
                 else:
                     print("No model classes found.")
@@ -629,24 +617,18 @@ class AdminFunctions:
             try:
                 cursor = conn.cursor()
                 # Show all model versions
-                cursor.execute('''
-                    SELECT id, version_number, accuracy, total_classes, 
-                        training_date, description, is_active, model_path
-                    FROM model_versions
-                    ORDER BY training_date DESC
-                ''')
-                versions = cursor.fetchall()
+                versions = ModelVersionRepository(conn).all()
                 ids = []
                 print("\nAvailable Model Versions:")
                 for version in versions:
-                    print(f"\nID: {version[0]}")
-                    ids.append(version[0])
-                    print(f"Version: {version[1]}")
-                    print(f"Accuracy: {version[2]*100:.2f}%")
-                    print(f"Classes: {version[3]}")
-                    print(f"Date: {version[4]}")
-                    print(f"Description: {version[5]}")
-                    print(f"Active: {'Yes' if version[6] else 'No'}")
+                    print(f"\nID: {version.id}")
+                    ids.append(version.id)
+                    print(f"Version: {version.version_number}")
+                    print(f"Accuracy: {version.accuracy*100:.2f}%")
+                    print(f"Classes: {version.total_classes}")
+                    print(f"Date: {timeutil.format_timestamp(version.training_date)}")
+                    print(f"Description: {version.description}")
+                    print(f"Active: {'Yes' if version.is_active else 'No'}")
                     print("-" * 30)
                 
                 # get model id to activate
@@ -708,6 +690,9 @@ class AdminFunctions:
                                     ''', (class_name,))
                                 
                                 conn.commit()
+                                analytics.invalidate_snapshot()
+                                # Cached predictions belong to the previous model/class list
+                                prediction_cache.invalidate()
                                 print("\nModel activated and classes updated successfully!")
                                 print(f"\nNew classes added: {len(new_classes)}")
                                 print("Use 'View Current Classes' to see the updated list.")
@@ -833,5 +818,7 @@ class AdminFunctions:
         
        
 if __name__ == "__main__":
+    # Keep the reporting replica fresh while the admin dashboard is open
+    analytics.start_snapshot_scheduler()
     admin = AdminFunctions()
     admin.display_admin_menu()
\ No newline at end of file
@@ -5,6 +5,9 @@ go
 Use agroexpert 
 Go
 
+-- Timestamps are stored as seconds since the Unix epoch (UTC), as in the
+-- migrated SQLite schema (see migrations.py)
+
 -- Create Users table
 CREATE TABLE users (
     id INT PRIMARY KEY IDENTITY(1,1),
@@ -14,7 +17,7 @@ CREATE TABLE users (
     email NVARCHAR(255) UNIQUE,
     phone NVARCHAR(20),
     status BIT DEFAULT 1,
-    last_login DATETIME DEFAULT CURRENT_TIMESTAMP
+    last_login BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME())
 );
 
 -- Create expert_details table
@@ -43,7 +46,7 @@ CREATE TABLE disease_predictions (
     id INT PRIMARY KEY IDENTITY(1,1),
     prediction NVARCHAR(255) NOT NULL,
     disease NVARCHAR(255) NOT NULL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME())
 );
 
 -- Create Consultations table with image_path included
@@ -59,7 +62,7 @@ CREATE TABLE consultations (
     date_noticed DATE,
     treatments TEXT,
     status NVARCHAR(50) DEFAULT 'pending',
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    created_at BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     FOREIGN KEY (farmer_id) REFERENCES users (id),
     FOREIGN KEY (expert_id) REFERENCES users (id)
 );
@@ -70,7 +73,7 @@ CREATE TABLE consultation_responses (
     consultation_id INT,
     response TEXT,
     response_by INT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    created_at BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     FOREIGN KEY (consultation_id) REFERENCES consultations (id),
     FOREIGN KEY (response_by) REFERENCES users (id)
 );
@@ -89,7 +92,7 @@ CREATE TABLE reward_transactions (
     user_id INT,
     amount DECIMAL(10, 2),
     transaction_type NVARCHAR(50),
-    transaction_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    transaction_date BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     FOREIGN KEY (user_id) REFERENCES users (id)
 );
 
@@ -98,7 +101,7 @@ CREATE TABLE coupons (
     id INT PRIMARY KEY IDENTITY(1,1),
     code NVARCHAR(100) UNIQUE,
     value INT,
-    expiration_date DATETIME,
+    expiration_date BIGINT,
     is_active BIT DEFAULT 1
 );
 
@@ -107,7 +110,7 @@ CREATE TABLE coupon_usage (
     id INT PRIMARY KEY IDENTITY(1,1),
     coupon_id INT,
     user_id INT,
-    redemption_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    redemption_date BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     FOREIGN KEY (coupon_id) REFERENCES coupons (id)
 );
 
@@ -116,7 +119,7 @@ CREATE TABLE news (
     id INT PRIMARY KEY IDENTITY(1,1),
     title NVARCHAR(255) NOT NULL,
     content TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME())
 );
 
 -- Create Model Versions table
@@ -126,7 +129,7 @@ CREATE TABLE model_versions (
     version_number NVARCHAR(50) NOT NULL,
     accuracy FLOAT,
     total_classes INT,
-    training_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    training_date BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     description TEXT,
     is_active BIT DEFAULT 0
 );
@@ -140,7 +143,7 @@ CREATE TABLE unknown_diseases (
     samples_folder_path NVARCHAR(255),
     description TEXT,
     symptoms TEXT,
-    date_reported DATETIME DEFAULT CURRENT_TIMESTAMP,
+    date_reported BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     status NVARCHAR(50) DEFAULT 'pending',
     admin_notes TEXT,
     FOREIGN KEY (reported_by_farmer_id) REFERENCES users (id),
@@ -153,7 +156,7 @@ CREATE TABLE disease_samples (
     unknown_disease_id INT,
     farmer_id INT,
     samples_zip_path NVARCHAR(255),
-    upload_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    upload_date BIGINT DEFAULT DATEDIFF_BIG(SECOND, '1970-01-01', SYSUTCDATETIME()),
     status NVARCHAR(50) DEFAULT 'pending',
     expert_notes TEXT,
     FOREIGN KEY (unknown_disease_id) REFERENCES unknown_diseases (id),
@@ -0,0 +1,165 @@
+# analytics.py
+# Read-only analytics replica for admin reporting. The live database is
+# copied incrementally with the sqlite3 backup API, a few pages per step, so
+# farmers' writes are never blocked for the whole copy; reports then read the
+# replica through a mode=ro URI and hold no locks on the live file.
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+import db
+
+SNAPSHOT_PAGES = 256          # pages copied per backup step
+SNAPSHOT_STEP_SLEEP = 0.005   # seconds between steps, lets writers in
+SNAPSHOT_INTERVAL = float(os.environ.get('AGROEXPERT_SNAPSHOT_INTERVAL', 300))
+REPLICA_BUSY_TIMEOUT_MS = 5000
+
+_refresh_lock = threading.Lock()
+_stale = False
+
+
+def replica_path(database=None):
+    """
+    Path of the analytics replica for database (AGROEXPERT_REPLICA overrides it).
+
+    In-memory databases have no replica; reports read them directly.
+    """
+    if os.environ.get('AGROEXPERT_REPLICA'):
+        return os.environ['AGROEXPERT_REPLICA']
+    database = db.get_database() if database is None else database
+    if db.is_memory_database(database):
+        return None
+    path = database[len('file:'):].split('?', 1)[0] if database.startswith('file:') else database
+    root, ext = os.path.splitext(path)
+    return f"{root}_analytics{ext or '.db'}"
+
+
+def refresh_snapshot(database=None, replica=None, pages=SNAPSHOT_PAGES):
+    """
+    Copy the live database into the replica with the backup API.
+
+    Returns the snapshot duration in ms, or None if it failed.
+    """
+    database = db.get_database() if database is None else database
+    replica = replica_path(database) if replica is None else replica
+    if replica is None:
+        return None
+    global _stale
+    # Include writes still waiting in the group-commit queue
+    db.flush_writes()
+    with _refresh_lock:
+        start = time.perf_counter()
+        source = dest = None
+        try:
+            directory = os.path.dirname(replica)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            source = db.connect_raw(database)
+            dest = sqlite3.connect(replica, timeout=REPLICA_BUSY_TIMEOUT_MS / 1000)
+            source.backup(dest, pages=pages, sleep=SNAPSHOT_STEP_SLEEP)
+            # Rollback journal, so read-only openers never need to create -wal/-shm files
+            dest.execute('PRAGMA journal_mode=DELETE')
+            _stale = False
+            return (time.perf_counter() - start) * 1000
+        except sqlite3.Error as e:
+            print(f"Error refreshing analytics snapshot: {e}")
+            return None
+        finally:
+            if dest is not None:
+                dest.close()
+            if source is not None:
+                source.close()
+
+
+def invalidate_snapshot():
+    """Refresh the replica before the next report, e.g. after an admin change."""
+    global _stale
+    _stale = True
+
+
+def snapshot_age(replica=None):
+    """Seconds since the replica was last written, or None if it does not exist."""
+    replica = replica_path() if replica is None else replica
+    if replica is None or not os.path.exists(replica):
+        return None
+    return time.time() - os.path.getmtime(replica)
+
+
+def connect_replica(max_age=SNAPSHOT_INTERVAL):
+    """
+    Open a read-only connection to the analytics replica.
+
+    The replica is refreshed first if it is missing, invalidated or older
+    than max_age seconds. In-memory databases fall back to a pooled live
+    connection. Returns None if no connection could be opened.
+    """
+    replica = replica_path()
+    if replica is None:
+        return db.create_connection()
+    age = snapshot_age(replica)
+    if age is None or _stale or age > max_age:
+        if refresh_snapshot(replica=replica) is None and age is None:
+            return None
+    try:
+        conn = sqlite3.connect(f"{Path(replica).resolve().as_uri()}?mode=ro", uri=True,
+                               timeout=REPLICA_BUSY_TIMEOUT_MS / 1000)
+        conn.execute('PRAGMA query_only=ON')
+        return conn
+    except sqlite3.Error as e:
+        print(f"Error opening analytics replica: {e}")
+        return None
+
+
+class SnapshotScheduler:
+    """Background thread that refreshes the replica every interval seconds."""
+
+    def __init__(self, interval=SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='analytics-snapshot', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            refresh_snapshot()
+            if self._stop.wait(self.interval):
+                break
+
+
+_scheduler = None
+
+
+def start_snapshot_scheduler(interval=SNAPSHOT_INTERVAL):
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SnapshotScheduler(interval)
+    _scheduler.start()
+    return _scheduler
+
+
+def stop_snapshot_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+
+
+if __name__ == "__main__":
+    # One-off refresh, e.g. from cron: python analytics.py
+    duration_ms = refresh_snapshot()
+    if duration_ms is not None:
+        print(f"Analytics snapshot written to {replica_path()} ({duration_ms:.1f} ms)")
+    else:
+        sys.exit(1)
@@ -3,6 +3,7 @@ import sqlite3
 import hashlib
 from db import create_connection
 from getpass import getpass
+import analytics
 import re
 
 class Auth:
@@ -176,6 +177,7 @@ class Auth:
                     ))
                 
                 conn.commit()
+                analytics.invalidate_snapshot()
                 if role == 'expert':
                     print("\nRegistration successful! Your application will be reviewed by an admin.")
                     print("You will be notified once your account is approved.")
@@ -0,0 +1,175 @@
+# bulk_diagnose.py
+# Non-interactive diagnosis of every image under a folder, e.g. a field
+# survey. Images go through the batched DiseaseIdentification.process_images()
+# path; results are streamed to CSV or JSON lines as each batch completes and
+# recorded in disease_predictions for the given user.
+#
+#   python bulk_diagnose.py FOLDER --user-id 3 --output survey.csv
+#
+# Processed files are appended to a checkpoint (OUTPUT.checkpoint by
+# default) after their batch is written and committed, so an interrupted run
+# started again with the same arguments skips them and appends to the output.
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import db
+from repositories import UserRepository
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+OUTPUT_FIELDS = ['image_path', 'disease_name', 'confidence', 'top_k', 'error']
+PROGRESS_EVERY = 10   # batches between progress lines
+
+
+def iter_images(folder):
+    """Image paths under folder in a stable (sorted) order, without listing the whole tree first."""
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def load_checkpoint(path):
+    """Set of image paths already processed by an earlier run."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+class ResultWriter:
+    """Streams results to CSV or JSON lines, appending to an existing file."""
+
+    def __init__(self, path, output_format):
+        self.format = output_format
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='', encoding='utf-8')
+        if self.format == 'csv':
+            self.writer = csv.writer(self.file)
+            if is_new:
+                self.writer.writerow(OUTPUT_FIELDS)
+
+    def write(self, image_path, result):
+        if "error" in result:
+            row = {'image_path': image_path, 'error': result['error']}
+        else:
+            row = {'image_path': image_path, 'disease_name': result['name'],
+                   'confidence': round(result['confidence'], 6),
+                   'top_k': [[name, round(conf, 6)] for name, conf in result.get('top_k', [])]}
+        if self.format == 'csv':
+            top_k = json.dumps(row['top_k']) if 'top_k' in row else ''
+            self.writer.writerow([row['image_path'], row.get('disease_name', ''), row.get('confidence', ''),
+                                  top_k, row.get('error', '')])
+        else:
+            self.file.write(json.dumps(row) + '\n')
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def diagnose_folder(folder, user_id, output, output_format=None, checkpoint=None, resume=True,
+                    batch_size=None, identifier=None):
+    """
+    Diagnose every image under folder. Returns (processed, failed, skipped) counts.
+
+    After each batch the output is flushed, queued predictions are committed
+    and only then are the batch's paths added to the checkpoint, so a crash
+    can repeat at most one batch but never lose one.
+    """
+    if identifier is None:
+        from disease_identification import DiseaseIdentification
+        identifier = DiseaseIdentification(use_server=False, watch=False)
+    from disease_identification import PREDICT_BATCH_SIZE
+    batch_size = batch_size or PREDICT_BATCH_SIZE
+    output_format = output_format or ('jsonl' if output.endswith(('.jsonl', '.json')) else 'csv')
+    checkpoint = checkpoint or f"{output}.checkpoint"
+    # Without a model every image would be written (and checkpointed) as an error
+    if not identifier.verify_model_loaded():
+        raise RuntimeError("Model or classes not loaded properly")
+
+    done = load_checkpoint(checkpoint) if resume else set()
+    if not resume:
+        for path in (output, checkpoint):
+            if os.path.exists(path):
+                os.remove(path)
+    skipped = 0
+
+    def pending_images():
+        nonlocal skipped
+        for image_path in iter_images(folder):
+            if image_path in done:
+                skipped += 1
+            else:
+                yield image_path
+
+    writer = ResultWriter(output, output_format)
+    processed = failed = 0
+    pending = []
+    start = time.perf_counter()
+    try:
+        with open(checkpoint, 'a', encoding='utf-8') as checkpoint_file:
+            def commit_batch():
+                writer.flush()
+                db.flush_writes()
+                checkpoint_file.write(''.join(f"{path}\n" for path in pending))
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+                pending.clear()
+
+            for image_path, result in identifier.process_images(pending_images(), user_id, batch_size):
+                writer.write(image_path, result)
+                pending.append(image_path)
+                processed += 1
+                failed += "error" in result
+                if len(pending) >= batch_size:
+                    commit_batch()
+                    if (processed // batch_size) % PROGRESS_EVERY == 0:
+                        rate = processed / (time.perf_counter() - start)
+                        print(f"Processed {processed} images ({rate:.1f}/s), {failed} failed")
+            if pending:
+                commit_batch()
+    finally:
+        writer.close()
+    return processed, failed, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnose every image under a folder")
+    parser.add_argument('folder')
+    parser.add_argument('--user-id', type=int, required=True, help="user the predictions are recorded for")
+    parser.add_argument('--output', required=True, help="results file (.csv or .jsonl)")
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--checkpoint', help="processed-files list (default: OUTPUT.checkpoint)")
+    parser.add_argument('--no-resume', action='store_true', help="start over, replacing output and checkpoint")
+    parser.add_argument('--batch-size', type=int)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        print(f"Error: Folder not found: {args.folder}")
+        return 1
+    if UserRepository().get(args.user_id) is None:
+        print(f"Error: No user with id {args.user_id}")
+        return 1
+
+    start = time.perf_counter()
+    try:
+        processed, failed, skipped = diagnose_folder(args.folder, args.user_id, args.output, args.format,
+                                                     args.checkpoint, not args.no_resume, args.batch_size)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"\nDiagnosed {processed} images in {elapsed:.1f} s ({failed} failed, "
+          f"{skipped} already done). Results: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
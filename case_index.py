@@ -0,0 +1,286 @@
+# case_index.py
+# Similar-case search: the past diagnoses and consultations whose image
+# embeddings (see embeddings.py) are closest to a new photo, with the
+# expert's response where there was one. Embeddings are kept in memory per
+# model version, loaded from case_embeddings on first use and updated as
+# cases are stored.
+#
+# Below IVF_MIN_SIZE cases a query is one batched dot product over the whole
+# float16 matrix. Above it the index switches to an inverted-file (IVF)
+# layout: vectors are clustered with spherical k-means into about sqrt(n)
+# lists stored contiguously, and a query scores only the NPROBE lists whose
+# centroids are closest, so a million cases are searched in about a
+# millisecond (roughly 16 lists of 1000 vectors).
+#
+#   python case_index.py --benchmark 1000000   # query latency on random vectors
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from lazy_imports import lazy_import
+from repositories import CaseEmbeddingRepository
+import embeddings
+
+np = lazy_import('numpy')
+
+IVF_MIN_SIZE = int(os.environ.get('AGROEXPERT_CASE_IVF_MIN', 20000))
+NPROBE = int(os.environ.get('AGROEXPERT_CASE_NPROBE', 16))
+KMEANS_ITERATIONS = 6
+KMEANS_SAMPLES_PER_LIST = 32
+# Cases added after the lists were built are assigned to the nearest list
+# but stored unsorted; past this fraction of the index the lists are rebuilt
+RETRAIN_FRACTION = 0.2
+ASSIGN_BATCH = 8192
+LOAD_BATCH = 10000
+K = 5
+
+SimilarCase = namedtuple('SimilarCase', ['similarity', 'case'])
+
+
+def _key_ids(keys):
+    """64-bit fingerprints of an S64 key array (XOR of its eight words), for membership tests."""
+    return np.bitwise_xor.reduce(np.ascontiguousarray(keys).view(np.uint64).reshape(len(keys), -1), axis=1)
+
+
+class EmbeddingIndex:
+    """Cosine-similarity search over L2-normalised float16 vectors, keyed by image hash."""
+
+    def __init__(self, ivf_min_size=IVF_MIN_SIZE, nprobe=NPROBE):
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.size = 0
+        self._vectors = None
+        self._keys = None
+        self._ids = None
+        # IVF layout: rows [offsets[i], offsets[i+1]) belong to centroids[i].
+        # Rows from trained_size on were added later; _lists holds their list.
+        self.centroids = None
+        self.offsets = None
+        self._lists = None
+        self.trained_size = 0
+
+    def add(self, keys, vectors, train=True, unique=False):
+        """
+        Add image hashes and their (n, dim) embeddings. Hashes already in the
+        index are skipped: under one model version an image's embedding never
+        changes. unique=True skips that check, for keys known to be new (rows
+        of the unique case_embeddings index). With train=False the lists are
+        not rebuilt, for bulk loads that call maybe_train() once.
+        """
+        if not len(keys):
+            return
+        vectors = np.asarray(vectors, dtype=embeddings.EMBEDDING_DTYPE).reshape(len(keys), -1)
+        keys = np.asarray(keys, dtype='S64')
+        if not unique:
+            # First occurrence of each key, minus those already indexed
+            _, first = np.unique(keys, return_index=True)
+            first = np.sort(first)
+            first = first[~self._indexed(keys[first])]
+            if not len(first):
+                return
+            keys, vectors = keys[first], vectors[first]
+        if self._vectors is None:
+            self._vectors = np.empty((max(1024, len(keys)), vectors.shape[1]), dtype=vectors.dtype)
+            self._keys = np.empty(len(self._vectors), dtype='S64')
+            self._ids = np.zeros(len(self._vectors), dtype=np.uint64)
+            self._lists = np.zeros(len(self._vectors), dtype=np.int32)
+        end = self.size + len(keys)
+        if end > len(self._vectors):
+            # Double the capacity so appends stay amortised O(1)
+            capacity = max(end, 2 * len(self._vectors))
+            self._vectors = np.resize(self._vectors, (capacity, self._vectors.shape[1]))
+            self._keys = np.resize(self._keys, capacity)
+            self._ids = np.resize(self._ids, capacity)
+            self._lists = np.resize(self._lists, capacity)
+        self._vectors[self.size:end] = vectors
+        self._keys[self.size:end] = keys
+        self._ids[self.size:end] = _key_ids(keys)
+        if self.centroids is not None:
+            self._lists[self.size:end] = self._assign(vectors)
+        self.size = end
+        if train:
+            self.maybe_train()
+
+    def _indexed(self, keys):
+        """Boolean mask of the keys (an S64 array) that are already in the index."""
+        if not self.size:
+            return np.zeros(len(keys), dtype=bool)
+        indexed = self._ids[:self.size]
+        return np.array([np.any(self._keys[np.flatnonzero(indexed == key_id)] == key)
+                         for key, key_id in zip(keys, _key_ids(keys))], dtype=bool)
+
+    def __contains__(self, key):
+        return bool(self._indexed(np.asarray([key], dtype='S64'))[0])
+
+    def maybe_train(self):
+        """Build the inverted lists once the index is large enough, or rebuild them once enough was added."""
+        untrained = self.size - self.trained_size
+        if self.size >= self.ivf_min_size and untrained > RETRAIN_FRACTION * max(self.trained_size, 1):
+            self.train()
+
+    def _assign(self, vectors):
+        # Nearest centroid of each vector, in batches to bound the score matrix
+        return np.concatenate([np.argmax(vectors[start:start + ASSIGN_BATCH].astype(np.float32) @ self.centroids.T,
+                                         axis=1)
+                               for start in range(0, len(vectors), ASSIGN_BATCH)])
+
+    def train(self, seed=0):
+        """Cluster the vectors into inverted lists and store each list contiguously."""
+        vectors = self._vectors[:self.size]
+        nlist = int(min(4096, self.size, max(16, np.sqrt(self.size))))
+        rng = np.random.default_rng(seed)
+        sample_size = min(self.size, nlist * KMEANS_SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(self.size, sample_size, replace=False)].astype(np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            # Empty lists keep their old centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self.centroids = centroids
+        assignment = self._assign(vectors)
+        order = np.argsort(assignment, kind='stable')
+        self._vectors[:self.size] = vectors[order]
+        self._keys[:self.size] = self._keys[:self.size][order]
+        self._ids[:self.size] = self._ids[:self.size][order]
+        self._lists[:self.size] = assignment[order]
+        self.offsets = np.searchsorted(self._lists[:self.size], np.arange(nlist + 1))
+        self.trained_size = self.size
+
+    def search(self, query, k=K):
+        """(similarity, image hash) of the k nearest vectors, most similar first."""
+        if not self.size:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        if self.centroids is None:
+            rows = np.arange(self.size)
+            scores = self._vectors[:self.size].astype(np.float32) @ query
+        else:
+            nprobe = min(self.nprobe, len(self.centroids))
+            lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            added = np.flatnonzero(np.isin(self._lists[self.trained_size:self.size], lists)) + self.trained_size
+            rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists] + [added])
+            scores = self._vectors[rows].astype(np.float32) @ query
+        k = min(k, len(rows))
+        if not k:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(float(scores[i]), self._keys[rows[i]].decode('ascii')) for i in best]
+
+
+class CaseIndex:
+    """Embedding indexes of all cases and of consultation cases, for one model version at a time."""
+
+    def __init__(self):
+        self.model_version_id = None
+        self.cases = EmbeddingIndex()
+        self.consultations = EmbeddingIndex()
+        self._lock = threading.Lock()
+
+    def _ensure_version(self, model_version_id):
+        if model_version_id == self.model_version_id:
+            return
+        cases, consultations = EmbeddingIndex(), EmbeddingIndex()
+        rows = []
+
+        def load(rows):
+            keys = [row[0] for row in rows]
+            vectors = np.frombuffer(b''.join(row[2] for row in rows),
+                                    dtype=embeddings.EMBEDDING_DTYPE).reshape(len(rows), -1)
+            cases.add(keys, vectors, train=False, unique=True)
+            consulted = np.fromiter((bool(row[1]) for row in rows), dtype=bool, count=len(rows))
+            consultations.add([key for key, flag in zip(keys, consulted) if flag], vectors[consulted],
+                              train=False, unique=True)
+
+        # In batches, so a million cases never sit in memory as Python tuples
+        for row in CaseEmbeddingRepository().stream_for_version(model_version_id):
+            rows.append(row)
+            if len(rows) == LOAD_BATCH:
+                load(rows)
+                rows = []
+        if rows:
+            load(rows)
+        cases.maybe_train()
+        consultations.maybe_train()
+        self.cases, self.consultations, self.model_version_id = cases, consultations, model_version_id
+
+    def add(self, model_version_id, image_hash, embedding, consultation=False):
+        if embedding is None or model_version_id is None:
+            return
+        with self._lock:
+            # Cases of another version are loaded from the table when that version is used
+            if model_version_id == self.model_version_id:
+                # As when loading: every case is searchable, consultations also on their own
+                self.cases.add([image_hash], [embedding])
+                if consultation:
+                    self.consultations.add([image_hash], [embedding])
+
+    def search(self, model_version_id, embedding, k=K, consultations_only=False):
+        with self._lock:
+            self._ensure_version(model_version_id)
+            index = self.consultations if consultations_only else self.cases
+            return index.search(embedding, k)
+
+    def reset(self):
+        with self._lock:
+            self.model_version_id = None
+            self.cases, self.consultations = EmbeddingIndex(), EmbeddingIndex()
+
+
+_index = CaseIndex()
+
+
+def add(model_version_id, image_hash, embedding, consultation=False):
+    _index.add(model_version_id, image_hash, embedding, consultation)
+
+
+def reset():
+    _index.reset()
+
+
+def similar_cases(model_version_id, embedding, k=K, consultations_only=True, exclude=None):
+    """
+    The k past cases most similar to an embedding, most similar first, as
+    SimilarCase(similarity, repositories.CaseRow) with the expert response
+    where there was one. exclude is an image hash to leave out (the query's own).
+    """
+    if embedding is None or model_version_id is None:
+        return []
+    found = _index.search(model_version_id, embedding, k + 1, consultations_only)
+    found = [(similarity, key) for similarity, key in found if key != exclude][:k]
+    rows = {row.image_hash: row for row in CaseEmbeddingRepository().cases(model_version_id,
+                                                                              [key for _, key in found])}
+    return [SimilarCase(round(similarity, 4), rows[key]) for similarity, key in found if key in rows]
+
+
+def benchmark(size=1000000, dim=64, queries=200, k=K):
+    """Build time and p50/p99 query latency (ms) of an EmbeddingIndex on random vectors."""
+    from query_profiler import percentile
+    rng = np.random.default_rng(0)
+    vectors = embeddings.normalise(rng.standard_normal((size, dim), dtype=np.float32))
+    index = EmbeddingIndex()
+    start = time.perf_counter()
+    index.add([f'{i:064x}' for i in range(size)], vectors, unique=True)
+    build_ms = (time.perf_counter() - start) * 1000
+    latencies = []
+    for query in rng.standard_normal((queries, dim), dtype=np.float32):
+        start = time.perf_counter()
+        index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {'size': size, 'ivf': index.centroids is not None, 'build_ms': round(build_ms, 1),
+            'p50_ms': round(percentile(latencies, 0.50), 3), 'p99_ms': round(percentile(latencies, 0.99), 3)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark':
+        print(benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000))
+    else:
+        print("Usage: python case_index.py --benchmark [SIZE]")
@@ -1,5 +1,6 @@
 from auth import Auth
-from db import init_database, init_model_classes, init_first_model, verify_database
+from db import init_model_classes, init_first_model, verify_database
+from migrations import migrate
 import os
 
 class AgroExpertInitialiser:
@@ -11,8 +12,8 @@ def initialize_system():
         # Create data directory if it doesn't exist
         os.makedirs('data', exist_ok=True)
 
-        print("\nInitializing database...")
-        init_database()
+        print("\nApplying database migrations...")
+        migrate()
         
         print("\nInitializing model classes...")
         init_model_classes()
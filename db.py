@@ -1,257 +1,915 @@
 # db.py
+import atexit
+import base64
+import glob
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from sqlite3 import Error
+import query_profiler
+
+# Database target: a file path, 'memory' for a shared-cache in-memory
+# database, or a sqlite 'file:' URI. Override with AGROEXPERT_DB.
+DEFAULT_DB_PATH = 'data/agroexpert.db'
+DB_PATH = os.environ.get('AGROEXPERT_DB', DEFAULT_DB_PATH)
+MEMORY_DB_URI = 'file:agroexpert?mode=memory&cache=shared'
+
+# Idle connections kept per thread, and across all threads, by the pool
+POOL_MAX_PER_THREAD = 2
+POOL_MAX_SIZE = 16
+# Connection attributes a caller may change that are reset when it releases the connection
+RESET_ON_RELEASE = ('row_factory', 'text_factory', 'isolation_level')
+
+# Callables applied to every new connection before it is handed out
+_connection_setup = []
+
+
+def register_connection_setup(setup):
+    """Register a callable that is applied to every new pooled connection."""
+    if setup not in _connection_setup:
+        _connection_setup.append(setup)
+
+
+# PRAGMA settings applied to every connection. Sizes follow SQLite units:
+# a negative cache_size is in KiB, mmap_size is in bytes, busy_timeout in ms.
+PRAGMA_PROFILES = {
+    # Short read/write transactions from the CLI menus
+    'interactive': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -8000,
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    # Large batched inserts, e.g. bulk diagnosis jobs or data imports
+    'bulk-load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'busy_timeout': 30000,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    # Long GROUP BY / reporting queries
+    'analytics': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 15000,
+        'cache_size': -128000,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+DEFAULT_PRAGMA_PROFILE = os.environ.get('AGROEXPERT_DB_PROFILE', 'interactive')
+
+_pragma_profile_name = DEFAULT_PRAGMA_PROFILE
+_pragma_overrides = {}
+
+
+def get_pragma_settings():
+    """Return the PRAGMA settings of the configured profile, including overrides."""
+    settings = dict(PRAGMA_PROFILES[_pragma_profile_name])
+    settings.update(_pragma_overrides)
+    return settings
+
+
+def set_pragma_profile(name, **overrides):
+    """
+    Select the PRAGMA profile used for new connections.
+
+    Overrides replace single settings of the profile, e.g.
+    set_pragma_profile('interactive', busy_timeout=10000).
+    Pooled connections are closed so that every connection uses the new profile.
+    """
+    global _pragma_profile_name, _pragma_overrides
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown pragma profile '{name}'. Choose from: {', '.join(PRAGMA_PROFILES)}")
+    _pragma_profile_name = name
+    _pragma_overrides = dict(overrides)
+    close_pool()
+
+
+def apply_pragma_profile(conn, settings=None):
+    """Apply PRAGMA settings (the configured profile by default) to a raw connection."""
+    settings = get_pragma_settings() if settings is None else settings
+    for pragma, value in settings.items():
+        try:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        except Error as e:
+            print(f"Error applying PRAGMA {pragma}: {e}")
+
+
+def pragma_report(conn=None):
+    """
+    Return the PRAGMA values actually in effect on a connection.
+
+    SQLite reports journal_mode in lower case and synchronous/temp_store as
+    numbers (synchronous: 0=OFF, 1=NORMAL, 2=FULL; temp_store: 2=MEMORY).
+    """
+    report = {'profile': _pragma_profile_name}
+    own_conn = conn is None
+    if own_conn:
+        conn = create_connection()
+        if conn is None:
+            return report
+    try:
+        for pragma in PRAGMA_PROFILES[_pragma_profile_name]:
+            row = conn.execute(f"PRAGMA {pragma}").fetchone()
+            report[pragma] = row[0] if row else None
+    finally:
+        if own_conn:
+            conn.close()
+    return report
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a sqlite3 connection checked out from a ConnectionPool.
+
+    It behaves like the wrapped connection, except that close() hands the
+    connection back to the pool instead of closing the underlying file.
+    Attributes such as row_factory are read from and set on the wrapped
+    connection. Cursors are timed by query_profiler when profiling is enabled.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        if name in ('_pool', '_raw'):
+            object.__setattr__(self, name, value)
+            return
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        setattr(raw, name, value)
+
+    def cursor(self, *args):
+        cursor = self.__getattr__('cursor')(*args)
+        profiler = query_profiler.get_profiler()
+        return profiler.wrap(cursor) if profiler else cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __enter__(self):
+        self._raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._raw.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections.
+
+    Connections are cached per thread, so a thread normally reuses a single
+    connection for every create_connection()/close() pair it runs.
+    Nested checkouts on the same thread get their own connection, which keeps
+    transactions of the caller and callee independent as before.
+    """
+
+    def __init__(self, database, max_per_thread=POOL_MAX_PER_THREAD, max_size=POOL_MAX_SIZE):
+        self.database = database
+        self.max_per_thread = max_per_thread
+        self.max_size = max_size
+        self._idle = {}  # thread id -> list of idle connections
+        self._lock = threading.Lock()
+        # Connection settings as opened; restored on release so that one
+        # caller's row_factory or isolation_level never reaches the next
+        self._settings = {}
+        self.hits = 0
+        self.misses = 0
+        self.discards = 0
+
+    def _open(self):
+        raw = connect_raw(self.database)
+        for setup in _connection_setup:
+            setup(raw)
+        self._settings = {name: getattr(raw, name) for name in RESET_ON_RELEASE}
+        return raw
+
+    def _idle_count(self):
+        return sum(len(conns) for conns in self._idle.values())
+
+    @staticmethod
+    def _close_quietly(raw):
+        # A connection owned by another thread cannot be closed from here;
+        # dropping the last reference closes it instead.
+        try:
+            raw.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+    def _prune_dead_threads(self):
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._idle if ident not in alive]:
+            for raw in self._idle.pop(ident):
+                self._close_quietly(raw)
+
+    def acquire(self):
+        """Return a PooledConnection, reusing an idle one when available."""
+        ident = threading.get_ident()
+        with self._lock:
+            idle = self._idle.get(ident)
+            if idle:
+                self.hits += 1
+                return PooledConnection(self, idle.pop())
+            self.misses += 1
+        return PooledConnection(self, self._open())
+
+    def release(self, raw):
+        """Take a connection back; uncommitted work is discarded as on close()."""
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+            for name, value in self._settings.items():
+                if getattr(raw, name) != value:
+                    setattr(raw, name, value)
+        except Error:
+            raw.close()
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            if self._idle_count() >= self.max_size:
+                self._prune_dead_threads()
+            idle = self._idle.setdefault(ident, [])
+            if len(idle) < self.max_per_thread and self._idle_count() < self.max_size:
+                idle.append(raw)
+                return
+            self.discards += 1
+        raw.close()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with-block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'database': self.database,
+                'hits': self.hits,
+                'misses': self.misses,
+                'discards': self.discards,
+                'idle': self._idle_count(),
+                'max_per_thread': self.max_per_thread,
+                'max_size': self.max_size,
+            }
+
+    def close_all(self):
+        """Close every idle connection held by the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for raw in conns:
+                self._close_quietly(raw)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# One open connection per in-memory database keeps its contents alive while
+# pools come and go.
+_memory_anchors = {}
+
+
+def resolve_database(target):
+    """Map a configured target ('memory', a URI or a path) to what sqlite3 should open."""
+    if target in ('memory', ':memory:'):
+        return MEMORY_DB_URI
+    return target
+
+
+def is_memory_database(database):
+    return database.startswith('file:') and 'mode=memory' in database
+
+
+def connect_raw(database):
+    """Open a plain sqlite3 connection to a path or 'file:' URI."""
+    if database.startswith('file:'):
+        return sqlite3.connect(database, uri=True)
+    return sqlite3.connect(database)
+
+
+def configure_database(target):
+    """
+    Point create_connection() at another database, e.g. a temporary file or
+    'memory'. Idle pooled connections to the previous database are closed.
+    """
+    global DB_PATH
+    database = resolve_database(target)
+    # Queued writes (and their spool) belong to the previous database
+    close_write_queue()
+    if is_memory_database(database) and database not in _memory_anchors:
+        _memory_anchors[database] = connect_raw(database)
+    for uri in [uri for uri in _memory_anchors if uri != database]:
+        _memory_anchors.pop(uri).close()
+    DB_PATH = database
+    close_pool()
+    return database
+
+
+def get_database():
+    """Return the database create_connection() currently opens."""
+    return resolve_database(DB_PATH)
+
+register_connection_setup(apply_pragma_profile)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            database = resolve_database(DB_PATH)
+            if is_memory_database(database) and database not in _memory_anchors:
+                _memory_anchors[database] = connect_raw(database)
+            _pool = ConnectionPool(database)
+        return _pool
+
 
 def create_connection():
     try:
-        conn = sqlite3.connect('data/agroexpert.db')
-        return conn
+        return get_pool().acquire()
     except Error as e:
         print(f"Error connecting to database: {e}")
         return None
+
+
+@contextmanager
+def connection():
+    """Context-manager form of create_connection(); the connection goes back to the pool on exit."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def pool_stats():
+    """Return hit/miss counters for the shared connection pool."""
+    return get_pool().stats()
+
+
+def close_pool():
+    """Close all pooled connections, e.g. before the database file is replaced."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close_all()
+
+# Group commit: writes are batched into one transaction per flush
+WRITE_QUEUE_MAX_BATCH = 200
+WRITE_QUEUE_MAX_WAIT = 0.05  # seconds a batch may wait for more jobs
+
+# Crash safety: queued writes are also appended to a spool file next to the
+# database and replayed by the next process if this one dies before commit.
+# Set AGROEXPERT_WRITE_SPOOL=0 to disable, AGROEXPERT_WRITE_SPOOL_FSYNC=1 to
+# also survive power loss (an fsync per write).
+WRITE_SPOOL_ENABLED = os.environ.get('AGROEXPERT_WRITE_SPOOL', '1') != '0'
+WRITE_SPOOL_FSYNC = os.environ.get('AGROEXPERT_WRITE_SPOOL_FSYNC', '0') == '1'
+
+_STOP = object()
+
+SQL_SPOOL_STATE_GET = 'SELECT committed_seq FROM write_spool_state WHERE spool = ?'
+SQL_SPOOL_STATE_SET = '''
+    INSERT INTO write_spool_state (spool, committed_seq) VALUES (?, ?)
+    ON CONFLICT (spool) DO UPDATE SET committed_seq = excluded.committed_seq
+'''
+SQL_SPOOL_STATE_DELETE = 'DELETE FROM write_spool_state WHERE spool = ?'
+
+
+def spool_directory(database=None):
+    """Directory for write spools of a database (None for in-memory databases)."""
+    database = get_database() if database is None else database
+    if is_memory_database(database) or database.startswith('file:'):
+        return None
+    return f"{database}-spool"
+
+
+def _try_lock(f):
+    """Take a non-blocking exclusive lock on an open file; False if another process holds it."""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class WriteSpool:
+    """
+    Append-only log of the writes a process has queued but not yet committed.
+
+    Each job is written as a JSON line [seq, sql, params] before it is
+    queued; bytes parameters (BLOBs) are written as {"b64": ...}. The
+    highest committed seq is stored in write_spool_state in the same
+    transaction as the writes, so replaying a spool after a crash
+    applies each job exactly once. The file is truncated whenever everything
+    in it is committed. Each process has its own file, locked for as long as
+    the process lives; recover_spools() replays files whose process is gone.
+    """
+
+    def __init__(self, directory, fsync=WRITE_SPOOL_FSYNC):
+        os.makedirs(directory, exist_ok=True)
+        self.name = f"{os.getpid()}-{time.time_ns()}.spool"
+        self.path = os.path.join(directory, self.name)
+        self.fsync = fsync
+        self._file = open(self.path, 'a+', encoding='utf-8')
+        _try_lock(self._file)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._committed = 0
+
+    def append(self, jobs, enqueue):
+        """Log (sql, params) jobs and pass each (sql, params, seq) to enqueue in the same order."""
+        with self._lock:
+            lines = []
+            first = self._seq + 1
+            for sql, params in jobs:
+                self._seq += 1
+                lines.append(json.dumps([self._seq, sql, [_spool_param(p) for p in params]]))
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            # Enqueued under the lock so the queue sees jobs in seq order
+            for seq, (sql, params) in enumerate(jobs, first):
+                enqueue((sql, params, seq))
+
+    def committed(self, seq):
+        with self._lock:
+            self._committed = max(self._committed, seq)
+            if self._committed == self._seq:
+                self._file.truncate(0)
+
+    def close(self, conn=None):
+        """Remove the spool once everything in it is committed."""
+        with self._lock:
+            drained = self._committed == self._seq
+            self._file.close()
+            if drained:
+                os.remove(self.path)
+        if drained and conn is not None:
+            conn.execute(SQL_SPOOL_STATE_DELETE, (self.name,))
+            conn.commit()
+
+
+def _spool_param(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'b64': base64.b64encode(value).decode('ascii')}
+    return value
+
+
+def _unspool_param(value):
+    if isinstance(value, dict):
+        return base64.b64decode(value['b64'])
+    return value
+
+
+def _read_spool(f):
+    jobs = []
+    for line in f:
+        try:
+            seq, sql, params = json.loads(line)
+        except ValueError:
+            # A line cut short by the crash was never queued
+            continue
+        jobs.append((seq, sql, [_unspool_param(p) for p in params]))
+    return jobs
+
+
+def spool_state_available():
+    """True once the write_spool_state table exists (migration 7)."""
+    conn = create_connection()
+    if conn is None:
+        return False
+    try:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'write_spool_state'"
+                            ).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def recover_spools(directory, exclude=None):
+    """
+    Replay the spools of processes that exited with writes uncommitted.
+    Returns the number of writes applied.
+    """
+    if directory is None or not os.path.isdir(directory):
+        return 0
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(directory, '*.spool'))):
+        name = os.path.basename(path)
+        if name == exclude:
+            continue
+        with open(path, 'r+', encoding='utf-8') as f:
+            if not _try_lock(f):
+                continue  # its process is still running
+            f.seek(0)
+            jobs = _read_spool(f)
+            conn = create_connection()
+            if conn is None:
+                return replayed
+            try:
+                row = conn.execute(SQL_SPOOL_STATE_GET, (name,)).fetchone()
+                committed = row[0] if row else 0
+                for seq, sql, params in jobs:
+                    if seq > committed:
+                        try:
+                            conn.execute(sql, params)
+                            replayed += 1
+                        except Error as e:
+                            print(f"Error replaying spooled write: {e}")
+                conn.execute(SQL_SPOOL_STATE_DELETE, (name,))
+                conn.commit()
+            finally:
+                conn.close()
+        os.remove(path)
+    if replayed:
+        print(f"Recovered {replayed} queued writes from an interrupted session")
+    return replayed
+
+
+class WriteQueue:
+    """
+    Background writer that groups INSERT/UPDATE jobs into batched transactions.
+
+    Jobs are committed when max_batch jobs are waiting or max_wait seconds
+    after the first job of a batch, whichever comes first. flush() blocks
+    until everything submitted before it is committed, for callers that need
+    to read their own writes. With a WriteSpool, durable jobs are logged
+    before they are queued so a crash cannot lose them.
+    """
+
+    def __init__(self, max_batch=WRITE_QUEUE_MAX_BATCH, max_wait=WRITE_QUEUE_MAX_WAIT, spool=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.spool = spool
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self._commit_ms = deque(maxlen=1024)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-write-queue', daemon=True)
+                self._thread.start()
+
+    def submit(self, sql, params=(), durable=True):
+        """
+        Queue one write statement; it is committed with the next batch.
+        durable=False skips the spool, for writes that may be lost in a crash.
+        """
+        self.submit_many(sql, [params], durable)
+
+    def submit_many(self, sql, seq_of_params, durable=True):
+        self._ensure_worker()
+        if self.spool is not None and durable:
+            self.spool.append([(sql, params) for params in seq_of_params], self._queue.put)
+        else:
+            for params in seq_of_params:
+                self._queue.put((sql, params, None))
+
+    def flush(self, timeout=None):
+        """Wait until all previously submitted writes are committed."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Commit outstanding writes and stop the worker thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        if self.spool is not None:
+            conn = create_connection()
+            try:
+                self.spool.close(conn)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.max_wait
+            while True:
+                if isinstance(job, threading.Event):
+                    # A flush ends the batch immediately
+                    waiters.append(job)
+                    break
+                batch.append(job)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+            if batch:
+                self._commit(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        conn = create_connection()
+        if conn is None:
+            self.failed += len(batch)
+            return
+        last_seq = max((seq for _, _, seq in batch if seq is not None), default=None)
+        try:
+            try:
+                cursor = conn.cursor()
+                for sql, params, _ in batch:
+                    cursor.execute(sql, params)
+                self._mark_committed(cursor, last_seq)
+                conn.commit()
+                self.rows += len(batch)
+            except Error:
+                conn.rollback()
+                # Retry one by one so a single bad row does not drop the whole batch
+                for sql, params, seq in batch:
+                    try:
+                        conn.execute(sql, params)
+                        self.rows += 1
+                    except Error as e:
+                        self.failed += 1
+                        print(f"Error in queued write: {e}")
+                    try:
+                        self._mark_committed(conn, seq)
+                        conn.commit()
+                    except Error:
+                        conn.rollback()
+        finally:
+            conn.close()
+        if last_seq is not None:
+            self.spool.committed(last_seq)
+        self.batches += 1
+        self._commit_ms.append((time.perf_counter() - start) * 1000)
+
+    def _mark_committed(self, cursor, seq):
+        # Same transaction as the writes, so a replay never applies them twice
+        if seq is not None:
+            cursor.execute(SQL_SPOOL_STATE_SET, (self.spool.name, seq))
+
+    def stats(self):
+        commit_ms = sorted(self._commit_ms)
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches': self.batches,
+            'rows': self.rows,
+            'failed': self.failed,
+            'commit_p50_ms': round(query_profiler.percentile(commit_ms, 0.50), 3),
+            'commit_p99_ms': round(query_profiler.percentile(commit_ms, 0.99), 3),
+        }
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            directory = spool_directory() if WRITE_SPOOL_ENABLED else None
+            if directory is not None and spool_state_available():
+                recover_spools(directory)
+                _write_queue = WriteQueue(spool=WriteSpool(directory))
+            else:
+                _write_queue = WriteQueue()
+        return _write_queue
+
+
+def enqueue_write(sql, params=(), durable=True):
+    """
+    Queue a write for the next group commit instead of committing it now.
+    durable=False skips the crash spool, for writes that may be lost.
+    """
+    get_write_queue().submit(sql, params, durable)
+
+
+def flush_writes(timeout=None):
+    """Block until queued writes are committed (no-op when nothing was queued)."""
+    if _write_queue is not None:
+        return _write_queue.flush(timeout)
+    return True
+
+
+def write_queue_stats():
+    return get_write_queue().stats()
+
+
+def close_write_queue():
+    global _write_queue
+    with _write_queue_lock:
+        write_queue, _write_queue = _write_queue, None
+    if write_queue is not None:
+        write_queue.close()
+
+
+atexit.register(close_write_queue)
+
+
 def init_database():
+    """Bring the database schema up to date by applying pending migrations."""
+    from migrations import migrate
     conn = create_connection()
     if conn is not None:
         try:
-            c = conn.cursor()
-            
-            # Create Users table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    email TEXT UNIQUE,
-                    phone TEXT,
-                    status TEXT DEFAULT 'active',
-                    last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS expert_details (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER UNIQUE,
-                    scope TEXT,
-                    specialization TEXT,
-                    commodity TEXT,
-                    region TEXT,
-                    city TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            # Create Diseases table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS diseases (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    symptoms TEXT,
-                    treatment TEXT
-                )
-            ''')
-
-            # Create Disease Predictions table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS disease_predictions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    image_path TEXT,
-                    disease_name TEXT,
-                    confidence REAL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Create NEW Consultations table with image_path included
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS consultations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    farmer_id INTEGER,
-                    expert_id INTEGER,
-                    description TEXT,
-                    image_path TEXT,
-                    plant_name TEXT,
-                    symptoms TEXT,
-                    region TEXT,
-                    date_noticed DATE,
-                    treatments TEXT,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (farmer_id) REFERENCES users (id),
-                    FOREIGN KEY (expert_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Create Consultation Responses table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS consultation_responses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    consultation_id INTEGER,
-                    expert_id INTEGER,
-                    expert_response TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (consultation_id) REFERENCES consultations (id),
-                    FOREIGN KEY (expert_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Create Rewards table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS rewards (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    points INTEGER DEFAULT 0,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Create Reward Transactions table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS reward_transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    action TEXT,
-                    points INTEGER,
-                    description TEXT,
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-             # Create coupons table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS coupons (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    code TEXT UNIQUE,
-                    value INTEGER,
-                    expiration_date TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            ''')
-
-            # Create coupon usage table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS coupon_usage (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    coupon_id INTEGER,
-                    user_id INTEGER,
-                    redemption_date TIMESTAMP,
-                    FOREIGN KEY (coupon_id) REFERENCES coupons (id)
-                )
-            ''')
-            # Create News table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS news (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    content TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # For tracking ML model versions
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS model_versions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    model_path TEXT NOT NULL,
-                    version_number TEXT NOT NULL,
-                    accuracy REAL,
-                    total_classes INTEGER,
-                    training_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    description TEXT,
-                    is_active BOOLEAN DEFAULT 0
-                )
-            ''')
-
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS unknown_diseases (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    reported_by_farmer_id INTEGER,
-                    verified_by_expert_id INTEGER,
-                    related_consultation_id INTEGER, -- Link to specific consultation
-                    initial_image_path TEXT,
-                    samples_folder_path TEXT,
-                    description TEXT,
-                    symptoms TEXT,
-                    date_reported TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'pending', -- pending, samples_requested, samples_received, verified, training_in_progress, completed
-                    admin_notes TEXT,
-                    FOREIGN KEY (reported_by_farmer_id) REFERENCES users (id),
-                    FOREIGN KEY (verified_by_expert_id) REFERENCES users (id),
-                    FOREIGN KEY (related_consultation_id) REFERENCES consultations (id)
-                )
-            ''')
-
-
-            # For tracking disease samples collection
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS disease_samples (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    unknown_disease_id INTEGER,
-                    farmer_id INTEGER,
-                    samples_zip_path TEXT,
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'pending', -- pending, verified, rejected
-                    expert_notes TEXT,
-                    FOREIGN KEY (unknown_disease_id) REFERENCES unknown_diseases (id),
-                    FOREIGN KEY (farmer_id) REFERENCES users (id)
-                )
-            ''')
-
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS model_classes (
-                    class_index INTEGER PRIMARY KEY AUTOINCREMENT,
-                    class_name TEXT NOT NULL UNIQUE,
-                    date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-               # Create Crops table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS crops (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    crop_name TEXT,
-                    variety TEXT,
-                    planting_date DATE,
-                    notes TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS disease_alerts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    disease_name TEXT NOT NULL,
-                    affected_crop TEXT NOT NULL,
-                    region TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS farmer_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                alert_id INTEGER,
-                notified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                viewed INTEGER DEFAULT 0,  -- New column to track if the notification has been viewed
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (alert_id) REFERENCES disease_alerts (id)
-            );
-            ''')
-            conn.commit()
+            migrate(conn)
             print("Database initialized successfully")
-        except Error as e:
+            settings = pragma_report(conn)
+            print(f"Journal mode: {settings.get('journal_mode')} (profile: {settings['profile']})")
+        except Exception as e:
             print(f"Error creating tables: {e}")
         finally:
             conn.close()
     else:
         print("Error: Could not establish database connection")
 
+# Queries the indexes created by the migrations are meant to serve: (name, sql, sample parameters)
+HOT_QUERIES = [
+    ('pending consultations', '''
+        SELECT c.id, u.username, c.description, c.image_path, c.created_at
+        FROM consultations c
+        JOIN users u ON c.farmer_id = u.id
+        WHERE c.status = 'pending'
+        ORDER BY c.created_at
+    ''', ()),
+    ('pending consultation count', "SELECT COUNT(*) FROM consultations WHERE status = 'pending'", ()),
+    ('farmer consultations', '''
+        SELECT id, description, status, created_at
+        FROM consultations
+        WHERE farmer_id = ?
+        ORDER BY created_at DESC
+    ''', (1,)),
+    ('consultation response', 'SELECT expert_response FROM consultation_responses WHERE consultation_id = ?', (1,)),
+    ('replies since last login', '''
+        SELECT COUNT(*)
+        FROM consultation_responses cr
+        INNER JOIN consultations c ON cr.consultation_id = c.id
+        WHERE c.farmer_id = ? AND cr.created_at > ?
+    ''', (1, 1704067200)),
+    ('unviewed farmer alerts', '''
+        SELECT da.disease_name, fn.notified_at, fn.id
+        FROM farmer_notifications fn
+        JOIN disease_alerts da ON fn.alert_id = da.id
+        WHERE fn.user_id = ? AND fn.viewed = 0
+    ''', (1,)),
+    ('farmer crops', 'SELECT id, crop_name FROM crops WHERE user_id = ?', (1,)),
+    ('farmers growing crop', '''
+        SELECT DISTINCT u.id, u.username, u.email
+        FROM users u
+        JOIN crops c ON u.id = c.user_id
+        WHERE LOWER(c.crop_name) = LOWER(?)
+    ''', ('grape',)),
+    ('user points', 'SELECT SUM(points) FROM rewards WHERE user_id = ?', (1,)),
+    ('points history', '''
+        SELECT action, points, description, transaction_date
+        FROM reward_transactions
+        WHERE user_id = ?
+        ORDER BY transaction_date DESC
+        LIMIT 10
+    ''', (1,)),
+    ('pending sample submissions', '''
+        SELECT ds.id
+        FROM disease_samples ds
+        JOIN unknown_diseases ud ON ds.unknown_disease_id = ud.id
+        WHERE ds.status = 'pending' AND ud.verified_by_expert_id = ?
+    ''', (1,)),
+    ('expired coupons', '''
+        UPDATE coupons
+        SET is_active = 0
+        WHERE is_active = 1 AND expiration_date < ?
+    ''', (1704067200,)),
+    ('recent alerts', '''
+        SELECT id, disease_name, affected_crop, region, description, created_at
+        FROM disease_alerts
+        WHERE created_at >= ?
+        ORDER BY created_at DESC
+    ''', (1704067200,)),
+    ('cached prediction', '''
+        SELECT id, disease_name, confidence, all_predictions
+        FROM prediction_cache
+        WHERE image_hash = ? AND model_version_id = ?
+    ''', ('0' * 64, 1)),
+    ('case embeddings for version', '''
+        SELECT image_hash, consultation_id IS NOT NULL, embedding
+        FROM case_embeddings
+        WHERE model_version_id = ?
+    ''', (1,)),
+    ('cases by image hash', '''
+        SELECT e.image_hash, e.image_path, e.disease_name, e.consultation_id, c.description,
+            (SELECT r.expert_response FROM consultation_responses r
+             WHERE r.consultation_id = e.consultation_id
+             ORDER BY r.created_at DESC LIMIT 1) AS expert_response
+        FROM case_embeddings e
+        LEFT JOIN consultations c ON c.id = e.consultation_id
+        WHERE e.model_version_id = ? AND e.image_hash IN (?, ?)
+    ''', (1, '0' * 64, '1' * 64)),
+    ('image rejections by reason', '''
+        SELECT reason, COUNT(*) AS count
+        FROM image_rejections
+        WHERE created_at >= ?
+        GROUP BY reason
+        ORDER BY count DESC
+    ''', (0,)),
+    ('prediction cache perceptual hashes', '''
+        SELECT image_hash, phash
+        FROM prediction_cache
+        WHERE model_version_id = ? AND phash IS NOT NULL
+    ''', (1,)),
+    ('prediction cache eviction', '''
+        SELECT id FROM prediction_cache ORDER BY last_used_at LIMIT ?
+    ''', (10,)),
+]
+
+
+def is_full_scan(detail):
+    """True for an EXPLAIN QUERY PLAN step that reads a whole table without an index."""
+    detail = detail.upper()
+    return detail.startswith('SCAN') and 'USING' not in detail
+
+
+def check_query_plans(conn=None, queries=None):
+    """
+    Print the EXPLAIN QUERY PLAN of every registered hot query and flag full table scans.
+
+    Returns the names of the queries that still contain a full scan.
+    """
+    queries = HOT_QUERIES if queries is None else queries
+    own_conn = conn is None
+    if own_conn:
+        conn = create_connection()
+        if conn is None:
+            print("Error: Could not establish database connection")
+            return []
+    flagged = []
+    try:
+        for name, sql, params in queries:
+            plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            scans = [row[3] for row in plan if is_full_scan(row[3])]
+            status = 'FULL SCAN' if scans else 'OK'
+            print(f"\n[{status}] {name}")
+            for row in plan:
+                print(f"    {row[3]}")
+            if scans:
+                flagged.append(name)
+    finally:
+        if own_conn:
+            conn.close()
+    print(f"\n{len(flagged)} of {len(queries)} hot queries use a full table scan.")
+    return flagged
+
+
 def init_first_model():
     conn = create_connection()
     if conn:
@@ -381,9 +1039,12 @@ def verify_database():
             conn.close()
 
 if __name__ == "__main__":
-    import os
+    import sys
     init_database()
-    init_model_classes() 
-    init_first_model()
-    verify_database()
+    if 'explain' in sys.argv[1:]:
+        check_query_plans()
+    else:
+        init_model_classes()
+        init_first_model()
+        verify_database()
 
@@ -1,41 +1,173 @@
 # Description: This file contains the DiseaseIdentification class which is responsible for identifying plant diseases using a pre-trained model and storing the results in a database. It also provides a method to display information about the detected disease.
 # disease_identification.py
 import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from db import create_connection
-import tensorflow as tf
-from PIL import Image
-import matplotlib.image as mpimg
-import matplotlib.pyplot as plt
+from repositories import (PredictionRepository, ModelVersionRepository, ModelVariantRepository,
+                          ImageRejectionRepository, CaseEmbeddingRepository)
+from model_manager import ModelManager
+import prediction_cache
+import perceptual_index
+import preprocessing
+import predictions
+import inference_metrics
+import image_quality
+import embeddings
+import case_index
+from lazy_imports import lazy_import
+
+# Imported on first use, see lazy_imports.py
+tf = lazy_import('tensorflow')
+np = lazy_import('numpy')
+mpimg = lazy_import('matplotlib.image')
+plt = lazy_import('matplotlib.pyplot')
+inference_server = lazy_import('inference_server')
+tflite_models = lazy_import('tflite_models')
+
+IMAGE_SIZE = preprocessing.IMAGE_SIZE
+# Images per forward pass in process_images(); partial batches are padded to
+# this size so the model always sees the same input shape
+PREDICT_BATCH_SIZE = 32
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+# Overrides the serving variant chosen by tflite_models.choose_variant()
+# ('keras', 'float16' or 'int8')
+MODEL_VARIANT = os.environ.get('AGROEXPERT_MODEL_VARIANT')
+# Run dummy batches through a freshly loaded model so the first diagnosis
+# does not pay for graph tracing and buffer allocation
+WARMUP = os.environ.get('AGROEXPERT_MODEL_WARMUP', '1') != '0'
+
+# A model and the class list it was trained with. Swapped as one unit, so a
+# prediction that took a reference finishes on the model it started with.
+LoadedModel = namedtuple('LoadedModel', ['model', 'classes', 'version_id', 'variant', 'stamp'])
+NO_MODEL = LoadedModel(None, [], None, None, None)
+# An image's embedding and what it was diagnosed as, see embed_image()
+EmbeddedImage = namedtuple('EmbeddedImage', ['model_version_id', 'image_hash', 'disease_name', 'embedding'])
+
+
+def warm_up(model, batch_sizes=(PREDICT_BATCH_SIZE, 1)):
+    """
+    Run a dummy batch of each size used for inference, so the first real
+    prediction does not pay for tracing and allocation. Ends on batch size
+    1, the single-image diagnosis shape.
+    """
+    for batch_size in batch_sizes:
+        try:
+            model.predict_on_batch(np.zeros((batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"Error warming up model: {e}")
+            return
 
-import numpy as np
 
 class DiseaseIdentification:
-    def __init__(self):
+    def __init__(self, preload=False, use_server=True, watch=True, warmup=WARMUP):
         self.confidence_threshold = 0.7
-        self.model = None
-        self.classes = []
+        # Send single-image predictions to inference_server.py when it is running
+        self.use_server = use_server
+        self.warmup = warmup
+        # Per-stage latency per model version, see latency_stats()
+        self.metrics = inference_metrics.InferenceMetrics()
+        self.current = NO_MODEL
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._preload_thread = None
+        # Follow model activations once a model is loaded, see model_manager.py
+        self.model_manager = ModelManager(self) if watch else None
         # Create models directory if it doesn't exist
         os.makedirs('models', exist_ok=True)
-        self.load_latest_model()
-        
-    
-    def load_latest_model(self):
+        # The model is loaded on first use (or by preload()), not at startup
+        if preload:
+            self.preload()
+
+    @property
+    def model(self):
+        return self.current.model
+
+    @model.setter
+    def model(self, model):
+        self.current = self.current._replace(model=model)
+
+    @property
+    def classes(self):
+        return self.current.classes
+
+    @classes.setter
+    def classes(self, classes):
+        self.current = self.current._replace(classes=classes)
+
+    @property
+    def model_version_id(self):
+        return self.current.version_id
+
+    @property
+    def model_variant(self):
+        return self.current.variant
+
+    def preload(self):
+        """Start loading the model in a background thread so it is ready by first use."""
+        if self._loaded or (self._preload_thread is not None and self._preload_thread.is_alive()):
+            return
+        if self.server_available():
+            return
+        self._preload_thread = threading.Thread(target=self.ensure_model_loaded, kwargs={'verbose': False},
+                                                name='model-preload', daemon=True)
+        self._preload_thread.start()
+
+    def ensure_model_loaded(self, verbose=True):
+        """Load the model once; waits for a preload that is already running."""
+        with self._load_lock:
+            if not self._loaded:
+                self.load_latest_model(verbose)
+                self._loaded = True
+                if self.model_manager is not None and self.model is not None:
+                    self.model_manager.start()
+        return self.model is not None
+
+    def load_latest_model(self, verbose=True):
         """Load the latest active model and its classes from the database"""
+        loaded = self.read_active_model(verbose)
+        if loaded is not None:
+            if self.warmup and loaded.model is not None:
+                warm_up(loaded.model)
+            self.current = loaded
+
+    def swap_model(self, verbose=False):
+        """
+        Load the active model alongside the current one, warm it up (unless
+        warm-up is turned off) and swap it in. The current model keeps
+        serving until the swap.
+        """
+        loaded = self.read_active_model(verbose)
+        if loaded is None or loaded.model is None:
+            return False
+        if self.warmup:
+            warm_up(loaded.model)
+        with self._load_lock:
+            self.current = loaded
+            self._loaded = True
+        print(f"Switched to model version id {loaded.version_id} ({loaded.variant})")
+        return True
+
+    def read_active_model(self, verbose=True):
+        """Load the latest active model and its classes into a LoadedModel (model is None on failure)."""
+        # Read before the model, so a change made while loading is seen on the next check
+        stamp = ModelVersionRepository().stamp()
         conn = create_connection()
         if conn:
             try:
                 cursor = conn.cursor()
                 # First load classes
                 cursor.execute('SELECT class_name FROM model_classes ORDER BY class_index')
-                self.classes = [row[0] for row in cursor.fetchall()]
+                classes = [row[0] for row in cursor.fetchall()]
                 
-                if not self.classes:
+                if not classes:
                     print("No classes found in database!")
-                    return
+                    return NO_MODEL
 
                 # Get the latest active model
                 cursor.execute('''
-                    SELECT model_path 
+                    SELECT id, model_path, serving_variant
                     FROM model_versions 
                     WHERE is_active = 1 
                     ORDER BY training_date DESC 
@@ -44,29 +176,81 @@ class DiseaseIdentification:
                 result = cursor.fetchone()
                 
                 if result:
-                    model_path = result[0]
+                    model_version_id, model_path, serving_variant = result
                     if not os.path.exists(model_path):
                         print(f"Model file not found at: {model_path}")
-                        return
+                        return NO_MODEL._replace(classes=classes)
                         
                     try:
-                        self.model = tf.keras.models.load_model(model_path)
-                        print(f"Model loaded successfully with {len(self.classes)} classes!")
+                        model, variant = self._load_variant(
+                            cursor, model_version_id, model_path, MODEL_VARIANT or serving_variant)
+                        if verbose:
+                            print(f"Model loaded successfully with {len(classes)} classes!")
                         # print("\nAvailable classes:")
-                        # for i, class_name in enumerate(self.classes, 1):
+                        # for i, class_name in enumerate(classes, 1):
                         #     print(f"{i}. {class_name}")
+                        return LoadedModel(model, classes, model_version_id, variant, stamp)
                     except Exception as e:
                         print(f"Error loading model: {e}")
-                        self.model = None
+                        return NO_MODEL._replace(classes=classes)
                 else:
                     print("No active model found in database!")
+                    return NO_MODEL._replace(classes=classes)
             except Exception as e:
                 print(f"Database error: {e}")
             finally:
                 conn.close()
+        return None
     
+    def read_model_version(self, version, variant=None):
+        """
+        Load any row of model_versions, active or not, with the current class
+        list into a LoadedModel, e.g. for benchmarks. variant defaults to the
+        version's serving variant. Errors are raised, not printed.
+        """
+        conn = create_connection()
+        if conn is None:
+            raise RuntimeError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT class_name FROM model_classes ORDER BY class_index')
+            classes = [row[0] for row in cursor.fetchall()]
+            if not classes:
+                raise RuntimeError("No classes found in database")
+            if not os.path.exists(version.model_path):
+                raise RuntimeError(f"Model file not found at: {version.model_path}")
+            variant = variant or ModelVariantRepository(conn).serving_variant(version.id)
+            model, variant = self._load_variant(cursor, version.id, version.model_path, variant)
+        finally:
+            conn.close()
+        return LoadedModel(model, classes, version.id, variant, None)
+
+    def _load_variant(self, cursor, model_version_id, model_path, variant):
+        """Load the requested TFLite variant, falling back to the Keras model."""
+        if variant and variant != 'keras':
+            cursor.execute('SELECT model_path FROM model_variants WHERE model_version_id = ? AND variant = ?',
+                           (model_version_id, variant))
+            row = cursor.fetchone()
+            if row and os.path.exists(row[0]):
+                try:
+                    return tflite_models.TFLiteModel(row[0]), variant
+                except Exception as e:
+                    print(f"Error loading {variant} TFLite model, using the Keras model: {e}")
+            else:
+                print(f"No {variant} TFLite model for this version, using the Keras model")
+        # Keras models also return penultimate-layer embeddings for similar-case search
+        return embeddings.with_features(tf.keras.models.load_model(model_path)), 'keras'
+
+    def server_available(self):
+        return self.use_server and inference_server.server_available()
+
+    def latency_stats(self):
+        """Per-stage latency (count, mean, p50, p99, max in ms) keyed by model version id."""
+        return self.metrics.stats()
+
     def verify_model_loaded(self):
         """Verify if model and classes are properly loaded"""
+        self.ensure_model_loaded()
         if self.model is None:
             print("Error: Model not loaded!")
             return False
@@ -74,69 +258,285 @@ class DiseaseIdentification:
             print("Error: No classes loaded!")
             return False
         return True
-    def img_to_pred(self, image_path):
+    def img_to_pred(self, image_path, timings=None):
         try:
-            new_size = (224, 224)
-            image = Image.open(image_path)
-            image = image.resize(new_size)
-            image = np.asarray(image)
-            image = tf.expand_dims(image, 0)
-            return image
+            image = preprocessing.decode(image_path, IMAGE_SIZE, timings)
+            return np.expand_dims(image, 0)
         except Exception as e:
             print(f"Error preprocessing image: {e}")
             return None
 
-    def predict_disease(self, preprocessed_image):
+    def predict_disease(self, preprocessed_image, current=None):
+        # current pins the model and classes for the whole prediction
+        current = current or self.current
         try:
-            # Make prediction
-            predictions = self.model.predict(preprocessed_image)
-            # Get the index of the highest confidence prediction
-            predicted_class_index = np.argmax(predictions)
-            # Get the confidence score
-            confidence = float(predictions[0][predicted_class_index])
-            
-            return {
-                "name": self.classes[predicted_class_index],
-                "confidence": confidence,
-                "all_predictions": {self.classes[i]: float(predictions[0][i]) 
-                                  for i in range(len(self.classes))}
-            }
+            # Make prediction; predict_on_batch skips the per-call setup of predict()
+            scores, features = embeddings.forward(current.model, preprocessed_image)
+            return predictions.from_scores(current.classes, scores[0],
+                                           features=features[0] if features is not None else None)
         except Exception as e:
             print(f"Error making prediction: {e}")
             return None
-    def process_image(self, image_path, user_id):
+
+    def prediction_from_scores(self, scores):
+        """Build the prediction (see predictions.Prediction) from one row of model output."""
+        return predictions.from_scores(self.classes, scores)
+
+    def predictions_from_batch(self, scores, classes=None, features=None):
+        """Predictions for every row of a batch of model output, with one top-k pass."""
+        return predictions.from_batch(classes if classes is not None else self.classes, scores, features=features)
+
+    def decode_and_screen(self, image_path, timings):
+        """
+        Decode one image into a batch of one and run the quality pre-screen
+        (see image_quality.py). Returns (batch, rejection), where rejection is
+        None for a usable image. Decoding errors are raised.
+        """
+        batch = preprocessing.allocate_batch(1, IMAGE_SIZE)
+        source_size = preprocessing.decode_into(image_path, batch[0], timings)
+        with timings.stage('screen'):
+            rejection = image_quality.screen(batch[0], source_size)
+        return batch, rejection
+
+    def _reject(self, user_id, image_path, rejection, timings, version_id):
+        # Recorded so admins can see how often (and why) photos are turned away
+        ImageRejectionRepository().enqueue(user_id, image_path, rejection.reason, rejection.value)
+        self.metrics.record(version_id, timings.finish(), source='rejected')
+        return rejection.result()
+
+    def process_images(self, image_paths, user_id, batch_size=PREDICT_BATCH_SIZE, workers=DECODE_WORKERS):
+        """
+        Diagnose many images with one forward pass per batch.
+
+        Images are decoded in a thread pool straight into a preallocated
+        batch buffer, with the next batch decoding while the current one is
+        predicted. Yields (image_path, result) in
+        input order as each batch completes, where result is the
+        process_image() dict or {"error": ...}. Each batch's predictions are
+        stored with one bulk insert.
+        """
         if not self.verify_model_loaded():
-            return {"error": "Model or classes not loaded properly"}
+            for image_path in image_paths:
+                yield image_path, {"error": "Model or classes not loaded properly"}
+            return
 
+        paths = iter(image_paths)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            current = self._submit_decodes(executor, paths, batch_size)
+            while current:
+                upcoming = self._submit_decodes(executor, paths, batch_size)
+                yield from self._predict_batch(current, user_id, batch_size)
+                current = upcoming
+
+    def _submit_decodes(self, executor, paths, batch_size):
+        buffer = preprocessing.allocate_batch(batch_size, IMAGE_SIZE)
+        decodes = []
+        for image_path in paths:
+            row = buffer[len(decodes)]
+            decodes.append((image_path, executor.submit(self._decode_row, image_path, row)))
+            if len(decodes) == batch_size:
+                break
+        return (buffer, decodes) if decodes else None
+
+    @staticmethod
+    def _decode_row(image_path, row):
+        # The image hash keys the stored embedding; like decoding, it overlaps the previous batch
+        return preprocessing.decode_into(image_path, row), prediction_cache.image_hash(image_path)
+
+    def _predict_batch(self, batch, user_id, batch_size):
+        buffer, decodes = batch
+        # Batch stages are kept apart from single-image ones ('batch_forward', ...)
+        timings = inference_metrics.Timings()
+        results = [None] * len(decodes)
+        positions = []
+        # Decoding overlaps the previous batch; this is only the part it did not hide
+        decoded = []
+        digests = [None] * len(decodes)
+        with timings.stage('batch_decode'):
+            for position, (image_path, future) in enumerate(decodes):
+                try:
+                    source_size, digests[position] = future.result()
+                    decoded.append((position, source_size))
+                except FileNotFoundError:
+                    results[position] = {"error": "Image file not found"}
+                except Exception as e:
+                    print(f"Error preprocessing image {image_path}: {e}")
+                    results[position] = {"error": "Error preprocessing image"}
+        rejected = []
+        with timings.stage('batch_screen'):
+            for position, source_size in decoded:
+                rejection = image_quality.screen(buffer[position], source_size)
+                if rejection is None:
+                    positions.append(position)
+                else:
+                    results[position] = rejection.result()
+                    rejected.append((user_id, decodes[position][0], rejection.reason, rejection.value))
+        if rejected:
+            ImageRejectionRepository().enqueue_many(rejected)
+
+        current = self.current
+        if positions:
+            try:
+                # Rows of failed or missing images are ignored (and padding is zeros)
+                with timings.stage('batch_forward'):
+                    scores, features = embeddings.forward(current.model, buffer)
+                    scores = scores[positions]
+                    features = features[positions] if features is not None else None
+                rows = []
+                for position, prediction in zip(positions,
+                                                self.predictions_from_batch(scores, current.classes, features)):
+                    results[position] = prediction
+                    rows.append((user_id, decodes[position][0], prediction['name'], prediction['confidence']))
+                with timings.stage('batch_db_insert'):
+                    PredictionRepository().enqueue_many(rows)
+            except Exception as e:
+                print(f"Error making prediction: {e}")
+                for position in positions:
+                    results[position] = {"error": "Error making prediction"}
+            else:
+                self.store_cases(current.version_id, user_id,
+                                 [(digests[position], decodes[position][0], results[position])
+                                  for position in positions])
+        timings.finish('batch_total')
+        self.metrics.record(current.version_id, timings, images=len(positions), source='batch')
+
+        for (image_path, _), result in zip(decodes, results):
+            yield image_path, result
+
+    def process_image(self, image_path, user_id):
         if not os.path.exists(image_path):
             return {"error": "Image file not found"}
 
-        # Preprocess the image
-        processed_image = self.img_to_pred(image_path) 
-        if processed_image is None:
-            return {"error": "Error preprocessing image"}
+        timings = inference_metrics.Timings()
+        # A photo seen before with the active model needs no decode or inference
+        with timings.stage('cache'):
+            try:
+                digest = prediction_cache.image_hash(image_path)
+            except OSError:
+                return {"error": "Image file not found"}
+            active_version_id = prediction_cache.active_model_version_id()
+            prediction = prediction_cache.lookup(digest, active_version_id)
+            phash = None
+            if prediction is None:
+                # A recompressed or resized copy of an earlier photo
+                phash = perceptual_index.image_phash(image_path)
+                prediction = prediction_cache.lookup_similar(phash, active_version_id)
+                if prediction is not None:
+                    prediction_cache.store(digest, active_version_id, prediction, phash)
+        version_id, source = active_version_id, 'cache'
+        embedding = None
 
-        # Get prediction
-        prediction = self.predict_disease(processed_image)
         if prediction is None:
-            return {"error": "Error making prediction"}
+            # Use the shared inference server when it is running
+            prediction = inference_server.predict_remote(image_path) if self.use_server else None
+            if prediction is None:
+                if not self.verify_model_loaded():
+                    return {"error": "Model or classes not loaded properly"}
 
-        # Store the result in database
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO disease_predictions 
-                    (user_id, image_path, disease_name, confidence)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, image_path, prediction['name'], prediction['confidence']))
-                conn.commit()
-            finally:
-                conn.close()
+                # Preprocess the image and turn away unusable photos before the forward pass
+                try:
+                    processed_image, rejection = self.decode_and_screen(image_path, timings)
+                except Exception as e:
+                    print(f"Error preprocessing image: {e}")
+                    return {"error": "Error preprocessing image"}
+                if rejection is not None:
+                    return self._reject(user_id, image_path, rejection, timings, self.model_version_id)
+
+                # Get prediction
+                current = self.current
+                with timings.stage('forward'):
+                    prediction = self.predict_disease(processed_image, current)
+                if prediction is None:
+                    return {"error": "Error making prediction"}
+                # Cache under the version that actually made the prediction
+                version_id, source = current.version_id, 'local'
+                embedding = prediction.embedding
+                prediction_cache.store(digest, version_id, prediction, phash)
+            elif "rejected" in prediction:
+                rejection = image_quality.Rejection(prediction['rejected'], prediction.get('measured'))
+                return self._reject(user_id, image_path, rejection, timings, active_version_id)
+            elif "error" in prediction:
+                return prediction
+            else:
+                # The server reports the version it ran, which can lag an activation
+                version_id, source = prediction.pop('model_version_id', active_version_id), 'server'
+                embedding = embeddings.from_text(prediction.pop('embedding', None))
+                prediction_cache.store(digest, version_id, prediction, phash)
+
+        # Store the result in database; the write queue group-commits it
+        with timings.stage('db_insert'):
+            PredictionRepository().enqueue(user_id, image_path, prediction['name'], prediction['confidence'])
+            # A freshly diagnosed image also becomes a case for similar-case search
+            self.store_case(version_id, digest, user_id, image_path, prediction['name'], embedding)
 
+        self.metrics.record(version_id, timings.finish(), source=source)
         return prediction
 
+    def store_case(self, model_version_id, image_hash, user_id, image_path, disease_name, embedding,
+                   consultation_id=None):
+        """
+        Record an image's embedding in case_embeddings and the similar-case
+        index (see case_index.py). A failure is printed, not raised: the
+        diagnosis it belongs to has already been made and stored.
+        """
+        if embedding is None or model_version_id is None:
+            return
+        try:
+            CaseEmbeddingRepository().enqueue(model_version_id, image_hash, user_id, consultation_id, image_path,
+                                              disease_name, embeddings.to_bytes(embedding))
+            case_index.add(model_version_id, image_hash, embedding, consultation=consultation_id is not None)
+        except Exception as e:
+            print(f"Error storing case embedding: {e}")
+
+    def store_cases(self, model_version_id, user_id, cases):
+        """store_case() for a batch of (image hash, image path, prediction), with one queue submission."""
+        cases = [(image_hash, image_path, prediction) for image_hash, image_path, prediction in cases
+                 if prediction.embedding is not None]
+        if not cases or model_version_id is None:
+            return
+        try:
+            CaseEmbeddingRepository().enqueue_many([(model_version_id, image_hash, user_id, None, image_path,
+                                                     prediction['name'], embeddings.to_bytes(prediction.embedding))
+                                                    for image_hash, image_path, prediction in cases])
+            for image_hash, _, prediction in cases:
+                case_index.add(model_version_id, image_hash, prediction.embedding)
+        except Exception as e:
+            print(f"Error storing case embeddings: {e}")
+
+    def embed_image(self, image_path):
+        """
+        EmbeddedImage for one image, or None if it cannot be diagnosed or the
+        model gives no embeddings (TFLite variants). An image already stored
+        as a case for the active model is not run through the model again;
+        otherwise the inference server is used when it is running.
+        """
+        try:
+            digest = prediction_cache.image_hash(image_path)
+        except OSError:
+            return None
+        version_id = prediction_cache.active_model_version_id()
+        stored = CaseEmbeddingRepository().get(version_id, digest) if version_id is not None else None
+        if stored is not None:
+            return EmbeddedImage(version_id, digest, stored[0], embeddings.from_bytes(stored[1]))
+        prediction = inference_server.predict_remote(image_path) if self.use_server else None
+        if prediction is not None:
+            if "error" in prediction or not prediction.get('embedding'):
+                return None
+            return EmbeddedImage(prediction.get('model_version_id'), digest, prediction['name'],
+                                 embeddings.from_text(prediction['embedding']))
+        if not self.verify_model_loaded():
+            return None
+        current = self.current
+        try:
+            batch, _ = self.decode_and_screen(image_path, inference_metrics.Timings())
+        except Exception as e:
+            print(f"Error preprocessing image: {e}")
+            return None
+        prediction = self.predict_disease(batch, current)
+        if prediction is None or prediction.embedding is None:
+            return None
+        return EmbeddedImage(current.version_id, digest, prediction['name'], prediction.embedding)
+
     def display_disease_info(self, disease_name):
         # Extract crop and disease from the prediction
         parts = disease_name.split('___')
@@ -184,11 +584,13 @@ class DiseaseIdentification:
         
         print("\n=== Disease Identification ===")
         # Verify model and classes are loaded
-        if not self.verify_model_loaded():
+        if self.server_available():
+            print("Using the AgroExpert inference server")
+        elif not self.verify_model_loaded():
             print("Please contact administrator. System not properly initialized.")
             return
-            
-        print(f"Model ready with {len(self.classes)} classes")
+        else:
+            print(f"Model ready with {len(self.classes)} classes")
         while True:
             image_path = input("Enter the path to your image file (or 'q' to quit): ").strip('"').strip("'")
             if image_path.lower() == 'q':
@@ -215,9 +617,7 @@ class DiseaseIdentification:
             
             # Display top 3 predictions
             print("\nTop 3 Possibilities:")
-            sorted_predictions = sorted(prediction['all_predictions'].items(), 
-                                     key=lambda x: x[1], reverse=True)[:3]
-            for disease, conf in sorted_predictions:
+            for disease, conf in prediction['top_k'][:3]:
                 print(f"{disease}: {conf * 100:.2f}%")
             
             if prediction['confidence'] < self.confidence_threshold:
@@ -1,6 +1,7 @@
 from db import create_connection
+from repositories import AlertRepository
 import re
-from datetime import datetime
+import timeutil
 
 class DiseaseOutbreak:
     def create_alert(self):
@@ -69,14 +70,10 @@ class DiseaseOutbreak:
                 for farmer in affected_farmers:
                     # Notify farmers (In a real system, this would send an email or notification)
                     print(f"Notifying farmer: {farmer[1]} (Email: {farmer[2]})")
-                    
-                    # Insert a notification for the farmer with viewed set to 0 (unviewed)
-                    cursor.execute('''
-                        INSERT INTO farmer_notifications (user_id, alert_id, viewed)
-                        VALUES (?, ?, 0)
-                    ''', (farmer[0], alert_id))
                 
-                conn.commit()
+                # Insert a notification for each farmer with viewed set to 0 (unviewed);
+                # the background writer commits them as one batch
+                AlertRepository().enqueue_notifications(alert_id, [farmer[0] for farmer in affected_farmers])
                 print(f"Notified {len(affected_farmers)} farmers about the outbreak.")
             except Exception as e:
                 print(f"Error notifying farmers: {e}")
@@ -84,59 +81,46 @@ class DiseaseOutbreak:
                 conn.close()
 
     def view_alerts_for_admin(self):
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, disease_name, affected_crop, region, description, created_at
-                    FROM disease_alerts
-                    ORDER BY created_at DESC
-                ''')
-                alerts = cursor.fetchall()
-
-                if alerts:
+        days = input("Show alerts from the last how many days? (Enter for all): ").strip()
+        if days and not days.isdigit():
+            print("Invalid input! Please enter a number of days.")
+            return
+        try:
+            found = False
+            repository = AlertRepository()
+            alerts = repository.since(timeutil.days_ago(int(days))) if days else repository.iter_all()
+            for alert in alerts:
+                if not found:
                     print("\n=== Disease Outbreak Alerts ===")
-                    for alert in alerts:
-                        print(f"\nAlert ID: {alert[0]}")
-                        print(f"Disease: {alert[1]}")
-                        print(f"Affected Crop: {alert[2]}")
-                        print(f"Region: {alert[3]}")
-                        print(f"Description: {alert[4]}")
-                        print(f"Created At: {alert[5]}")
-                        print("-" * 50)
-                else:
-                    print("No disease outbreak alerts found.")
-            except Exception as e:
-                print(f"Error viewing alerts: {e}")
-            finally:
-                conn.close()
+                    found = True
+                print(f"\nAlert ID: {alert.id}")
+                print(f"Disease: {alert.disease_name}")
+                print(f"Affected Crop: {alert.affected_crop}")
+                print(f"Region: {alert.region}")
+                print(f"Description: {alert.description}")
+                print(f"Created At: {timeutil.format_timestamp(alert.created_at)}")
+                print("-" * 50)
+            if not found:
+                print(f"No disease outbreak alerts in the last {days} days." if days
+                      else "No disease outbreak alerts found.")
+        except Exception as e:
+            print(f"Error viewing alerts: {e}")
 
     def view_alerts_for_farmer(self, user_id):
         conn = create_connection()
         if conn:
             try:
-                cursor = conn.cursor()
                 # Fetch unviewed notifications for this user
-                cursor.execute('''
-                    SELECT da.disease_name, da.affected_crop, da.region, da.description, fn.notified_at, fn.id
-                    FROM farmer_notifications fn
-                    JOIN disease_alerts da ON fn.alert_id = da.id
-                    WHERE fn.user_id = ? AND fn.viewed = 0  -- Only fetch unviewed notifications
-                    ORDER BY fn.notified_at DESC
-                ''', (user_id,))
-                alerts = cursor.fetchall()
+                alerts = AlertRepository(conn).unviewed_for_farmer(user_id)
 
                 if alerts:
                     print("\n=== Your Disease Outbreak Alerts ===")
                     for alert in alerts:
-                        # Format the notified_at date for better readability
-                        notified_at = datetime.strptime(alert[4], "%Y-%m-%d %H:%M:%S")  # Adjust format as needed
-                        print(f"Disease: {alert[0]}")
-                        print(f"Affected Crop: {alert[1]}")
-                        print(f"Region: {alert[2]}")
-                        print(f"Description: {alert[3]}")
-                        print(f"Notified At: {notified_at.strftime('%b %d, %Y %H:%M:%S')}")
+                        print(f"Disease: {alert.disease_name}")
+                        print(f"Affected Crop: {alert.affected_crop}")
+                        print(f"Region: {alert.region}")
+                        print(f"Description: {alert.description}")
+                        print(f"Notified At: {timeutil.format_timestamp(alert.notified_at, '%b %d, %Y %H:%M:%S')}")
                         print("-" * 50)
 
                     # Ask if the farmer wants to mark the notifications as viewed
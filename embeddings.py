@@ -0,0 +1,72 @@
+# embeddings.py
+# Image embeddings for similar-case search (see case_index.py). The input to
+# the classifier's softmax layer (the last Dense/Dropout block built by
+# ModelTrainer.build_model, 64 values by default) is a compact description of
+# the leaf, and it comes out of the same forward pass as the class scores.
+# Embeddings are L2-normalised and stored as float16 (128 bytes each).
+import base64
+from lazy_imports import lazy_import
+
+tf = lazy_import('tensorflow')
+np = lazy_import('numpy')
+
+EMBEDDING_DTYPE = 'float16'
+
+
+class FeatureModel:
+    """
+    A Keras classifier whose forward pass also returns the penultimate-layer
+    features. predict_on_batch() behaves like the wrapped model's.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._dual = tf.keras.Model(model.inputs, [model.layers[-1].input, model.output])
+
+    def predict_on_batch(self, batch):
+        return self.predict_with_features(batch)[0]
+
+    def predict_with_features(self, batch):
+        """(scores, features) for a batch, from one forward pass."""
+        features, scores = self._dual.predict_on_batch(batch)
+        return np.asarray(scores), np.asarray(features)
+
+
+def with_features(model):
+    """Wrap a Keras model in a FeatureModel, or return it unchanged if that is not possible."""
+    try:
+        return FeatureModel(model)
+    except Exception as e:
+        print(f"Embeddings unavailable for this model: {e}")
+        return model
+
+
+def forward(model, batch):
+    """(scores, features) for a batch; features is None for models without embeddings (e.g. TFLite)."""
+    if isinstance(model, FeatureModel):
+        return model.predict_with_features(batch)
+    return np.asarray(model.predict_on_batch(batch)), None
+
+
+def normalise(features):
+    """L2-normalised float16 embeddings of one feature vector or a (batch, dim) array."""
+    features = np.asarray(features, dtype=np.float32)
+    norms = np.linalg.norm(features, axis=-1, keepdims=True)
+    return (features / np.maximum(norms, 1e-12)).astype(EMBEDDING_DTYPE)
+
+
+def to_bytes(embedding):
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def from_bytes(blob):
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+
+def to_text(embedding):
+    """Base64 of the float16 bytes, for JSON (inference server responses)."""
+    return base64.b64encode(to_bytes(embedding)).decode('ascii')
+
+
+def from_text(text):
+    return from_bytes(base64.b64decode(text)) if text else None
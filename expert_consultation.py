@@ -1,16 +1,21 @@
 from db import create_connection
+from repositories import ConsultationRepository
+import case_index
 from datetime import datetime
-from PIL import Image
-import matplotlib.image as mpimg
-import matplotlib.pyplot as plt
+import timeutil
+from lazy_imports import lazy_import
 from rewards import RewardSystem, ExpertRewards, FarmerRewards
 from disease_identification import *
 import zipfile
 import shutil
 import os
-from PIL import Image
 import glob
 import random
+import threading
+
+Image = lazy_import('PIL.Image')
+mpimg = lazy_import('matplotlib.image')
+plt = lazy_import('matplotlib.pyplot')
 
 
 class ExpertConsultation:
@@ -249,14 +254,8 @@ class ExpertConsultation:
         conn = create_connection()
         if conn:
             try:
-                cursor = conn.cursor()
                 # Fetch new messages for the expert
-                cursor.execute('''
-                    SELECT COUNT(*) 
-                    FROM consultations 
-                    WHERE status = 'pending'
-                ''')
-                count = cursor.fetchone()[0]
+                count = ConsultationRepository(conn).pending_count()
                 # Debug: check the count value
                 # print(f"Fetched count: {count}")
                 if count > 0:
@@ -367,6 +366,10 @@ class ExpertConsultation:
                 conn.commit()
                 print("\nConsultation request created successfully!")
 
+                # Make the case findable by similar-case search once an expert answers it
+                if image_path:
+                    self.record_consultation_case(cursor.lastrowid, farmer_id, image_path)
+
                 # Add points for consultation request
                 self.add_consultation_request_points(farmer_id)
 
@@ -439,14 +442,8 @@ class ExpertConsultation:
         conn = create_connection()
         if conn:
             try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, description, status, created_at 
-                    FROM consultations 
-                    WHERE farmer_id = ?
-                    ORDER BY created_at DESC
-                ''', (farmer_id,))
-                consultations = cursor.fetchall()
+                repository = ConsultationRepository(conn)
+                consultations = repository.for_farmer(farmer_id)
                 
                 if not consultations:
                     print("\nNo consultations found.")
@@ -454,21 +451,16 @@ class ExpertConsultation:
                 
                 print("\n=== Your Consultations ===")
                 for cons in consultations:
-                    print(f"\nConsultation ID: {cons[0]}")
-                    print(f"Details:\n{cons[1]}")
-                    print(f"Status: {cons[2]}")
-                    print(f"Created: {cons[3]}")
+                    print(f"\nConsultation ID: {cons.id}")
+                    print(f"Details:\n{cons.description}")
+                    print(f"Status: {cons.status}")
+                    print(f"Created: {timeutil.format_timestamp(cons.created_at)}")
                     
                     # If consultation is completed, show expert response
-                    if cons[2].lower() == 'completed':
-                        cursor.execute('''
-                            SELECT expert_response 
-                            FROM consultation_responses 
-                            WHERE consultation_id = ?
-                        ''', (cons[0],))
-                        response = cursor.fetchone()
+                    if cons.status.lower() == 'completed':
+                        response = repository.response_for(cons.id)
                         if response:
-                            print(f"Expert Response: {response[0]}")
+                            print(f"Expert Response: {response}")
                     print("-" * 50)
             finally:
                 conn.close()
@@ -478,16 +470,7 @@ class ExpertConsultation:
         conn = create_connection()
         if conn:
             try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT c.id, u.username, c.description, c.image_path, c.created_at,
-                        c.plant_name, c.symptoms, c.region, c.date_noticed, c.treatments 
-                    FROM consultations c
-                    JOIN users u ON c.farmer_id = u.id
-                    WHERE c.status = 'pending'
-                    ORDER BY c.created_at
-                ''')
-                consultations = cursor.fetchall()
+                consultations = ConsultationRepository(conn).pending()
                 
                 if not consultations:
                     print("\nNo pending consultations.")
@@ -495,19 +478,22 @@ class ExpertConsultation:
 
                 print("\n=== Pending Consultations ===")
                 for cons in consultations:
-                    print(f"\nConsultation ID: {cons[0]}")
-                    print(f"Farmer: {cons[1]}")
-                    print(f"Plant: {cons[5]}")
-                    print(f"Symptoms: {cons[6]}")
-                    print(f"Region: {cons[7]}")
-                    print(f"Date Noticed: {cons[8]}")
-                    print(f"Treatments Attempted: {cons[9] if cons[9] else 'None'}")
-                    print(f"Created: {cons[4]}")
+                    print(f"\nConsultation ID: {cons.id}")
+                    print(f"Farmer: {cons.username}")
+                    print(f"Plant: {cons.plant_name}")
+                    print(f"Symptoms: {cons.symptoms}")
+                    print(f"Region: {cons.region}")
+                    print(f"Date Noticed: {cons.date_noticed}")
+                    print(f"Treatments Attempted: {cons.treatments if cons.treatments else 'None'}")
+                    print(f"Created: {timeutil.format_timestamp(cons.created_at)}")
                     
-                    if cons[3]:  # if image path exists
+                    if cons.image_path:  # if image path exists
                         print("\nWould you like to view the image? (y/n)")
                         if input().lower() == 'y':
-                            self.disease_identifier.display_image(cons[3])
+                            self.disease_identifier.display_image(cons.image_path)
+                        print("Would you like to see similar past cases? (y/n)")
+                        if input().lower() == 'y':
+                            self.show_similar_cases(cons.image_path)
                     print("-" * 50)
                 
                 # Option to respond to a consultation
@@ -518,7 +504,7 @@ class ExpertConsultation:
                     try:
                         cons_id = int(cons_id)
                         # Check if this ID was in the list of pending consultations
-                        if cons_id in [c[0] for c in consultations]:
+                        if cons_id in [c.id for c in consultations]:
                             self.respond_to_consultation(expert_id, cons_id)
                             break
                         else:
@@ -527,11 +513,50 @@ class ExpertConsultation:
                         print("Error: Please enter a valid number.")
             finally:
                 conn.close()
+    def record_consultation_case(self, consultation_id, farmer_id, image_path):
+        """
+        Store the embedding of a consultation image, linked to the consultation,
+        in a background thread so that creating the consultation never waits
+        for a model load or forward pass. Returns the thread.
+        """
+        thread = threading.Thread(target=self._record_consultation_case,
+                                  args=(consultation_id, farmer_id, image_path),
+                                  name='consultation-case', daemon=True)
+        thread.start()
+        return thread
+
+    def _record_consultation_case(self, consultation_id, farmer_id, image_path):
+        try:
+            # Usually the image was just diagnosed and only needs linking to the consultation
+            image = self.disease_identifier.embed_image(image_path)
+        except Exception as e:
+            print(f"Error embedding consultation image: {e}")
+            return
+        if image is not None:
+            self.disease_identifier.store_case(image.model_version_id, image.image_hash, farmer_id, image_path,
+                                               image.disease_name, image.embedding, consultation_id)
+
+    def show_similar_cases(self, image_path, k=case_index.K):
+        """Print the answered consultations whose images are most similar to this one."""
+        image = self.disease_identifier.embed_image(image_path)
+        if image is None:
+            print("Similar-case search is not available for this image or model.")
+            return
+        similar = case_index.similar_cases(image.model_version_id, image.embedding, k, exclude=image.image_hash)
+        if not similar:
+            print("No similar past cases found.")
+            return
+        print("\n=== Similar Past Cases ===")
+        for similarity, case in similar:
+            print(f"\n{similarity:.0%} similar: {case.description or case.image_path}")
+            if case.disease_name:
+                print(f"AI diagnosis: {case.disease_name}")
+            print(f"Expert response: {case.expert_response or 'Not answered yet'}")
+
     def add_consultation_response_points(self, expert_id, response_time):
         conn = create_connection()
         if conn:
             try:
-                # conn.execute("PRAGMA busy_timeout = 5000")  # Wait up to 5 seconds for the lock
                 cursor = conn.cursor()
 
                 # Add fast response bonus if applicable
@@ -697,16 +722,12 @@ class ExpertConsultation:
         Calculate the response time in hours.
 
         Args:
-            created_at (str): The timestamp when the consultation was created.
+            created_at (int): Epoch time when the consultation was created.
 
         Returns:
             int: Response time in hours.
         """
-        from datetime import datetime
-        created_time = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")
-        current_time = datetime.now()
-        response_time = (current_time - created_time).total_seconds() / 3600
-        return int(response_time)
+        return int(timeutil.hours_since(created_at))
     
     # for famer to submit
     def submit_disease_samples(self, farmer_id, unknown_disease_id, samples_path):
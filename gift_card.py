@@ -1,7 +1,8 @@
 
 import random
 from db import create_connection
-from datetime import datetime, timedelta
+from repositories import CouponRepository
+import timeutil
 
 
 def generate_coupon_code():
@@ -32,7 +33,7 @@ def add_coupon(value, days_valid):
         try:
             cursor = conn.cursor()
             code = generate_coupon_code()
-            expiration_date = datetime.now() + timedelta(days=days_valid)
+            expiration_date = timeutil.days_from_now(days_valid)
 
             cursor.execute('''
                 INSERT INTO coupons (code, value, expiration_date)
@@ -40,7 +41,7 @@ def add_coupon(value, days_valid):
             ''', (code, value, expiration_date))
 
             conn.commit()
-            print(f"Coupon created: {code}, Value: ${value}, Expires: {expiration_date}")
+            print(f"Coupon created: {code}, Value: ${value}, Expires: {timeutil.format_timestamp(expiration_date)}")
         except Exception as e:
             print(f"Database error: {e}")
         finally:
@@ -60,19 +61,19 @@ def view_coupons():
             cursor.execute('''
                 UPDATE coupons
                 SET is_active = 0
-                WHERE expiration_date < ?
-            ''', (datetime.now(),))  # Deactivate expired coupons
+                WHERE is_active = 1 AND expiration_date < ?
+            ''', (timeutil.now(),))  # Deactivate expired coupons
             conn.commit()
 
-            # Now, fetch and display all coupons
-            cursor.execute('SELECT id, code, value, expiration_date, is_active FROM coupons')
-            coupons = cursor.fetchall()
-            if not coupons:
+            # Now, stream and display all coupons
+            found = False
+            for coupon in CouponRepository(conn).iter_all():
+                if not found:
+                    print("=== Coupon List ===")
+                    found = True
+                print(f"ID: {coupon.id}, Code: {coupon.code}, Value: ${coupon.value}, Expires: {timeutil.format_timestamp(coupon.expiration_date)}, Active: {bool(coupon.is_active)}")
+            if not found:
                 print("\nNo coupons available...!")
-            else:
-                print("=== Coupon List ===")
-                for coupon in coupons:
-                    print(f"ID: {coupon[0]}, Code: {coupon[1]}, Value: ${coupon[2]}, Expires: {coupon[3]}, Active: {bool(coupon[4])}")
                 
         except Exception as e:
             print(f"Database error: {e}")
@@ -88,16 +89,15 @@ def deactivate_coupon():
             # Display the list of coupons
             
             cursor = conn.cursor()
-            cursor.execute('SELECT id, code, value, expiration_date, is_active FROM coupons')
-            coupons = cursor.fetchall()
+            coupons = CouponRepository(conn).all()
 
             if not coupons:
                 print("\nNo coupons available..!")
                 return
             print("\n=== Available Coupons ===")
             for coupon in coupons:
-                status = "Active" if coupon[4] else "Inactive"
-                print(f"ID: {coupon[0]}, Code: {coupon[1]}, Value: ${coupon[2]}, Expires: {coupon[3]}, Status: {status}")
+                status = "Active" if coupon.is_active else "Inactive"
+                print(f"ID: {coupon.id}, Code: {coupon.code}, Value: ${coupon.value}, Expires: {timeutil.format_timestamp(coupon.expiration_date)}, Status: {status}")
 
             # Prompt the user for the ID of the coupon to deactivate
             coupon_id = input("\nEnter the ID of the coupon to deactivate: ")
@@ -121,7 +121,7 @@ def deactivate_coupon():
 def add_multiple_coupons(value, days_valid, count):
     """Generate and add multiple gift cards."""
     conn = create_connection()
-    expiration_date = datetime.now() + timedelta(days=days_valid)
+    expiration_date = timeutil.days_from_now(days_valid)
     coupons = []
 
     for _ in range(count):
@@ -136,7 +136,7 @@ def add_multiple_coupons(value, days_valid, count):
     conn.commit()
     conn.close()
 
-    print(f"{count} gift cards of value ${value} created. All expire on {expiration_date}.")
+    print(f"{count} gift cards of value ${value} created. All expire on {timeutil.format_timestamp(expiration_date)}.")
 
 # def generate_gift_cards():
 #     """Generate a unique gift card code."""
@@ -277,13 +277,13 @@ def redeem_coupon(user_id, code):
             elif not coupon[2]:
                 print("Coupon is inactive.")
                 return
-            elif datetime.strptime(coupon[3], '%Y-%m-%d %H:%M:%S.%f') < datetime.now():
+            elif coupon[3] < timeutil.now():
                 print("Coupon has expired.")
                 return
 
             # Mark coupon as redeemed
             coupon_id = coupon[0]
-            redemption_time = datetime.now()
+            redemption_time = timeutil.now()
 
             # Insert into coupon_usage table
             cursor.execute('''
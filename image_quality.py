@@ -0,0 +1,126 @@
+# image_quality.py
+# Cheap pre-screen of decoded photos before the forward pass. Tiny, blurry,
+# under- or over-exposed photos only produce low-confidence predictions that
+# send the farmer to an expert, so they are turned away with a reason
+# instead ("please retake the photo") and the reason is recorded in
+# image_rejections. Sharpness and exposure are measured on the decoded
+# 224x224 model input, which costs well under a millisecond.
+#
+#   python image_quality.py IMAGE...    # measurements, for tuning thresholds
+#   python image_quality.py --report 30 # rejections per reason, last 30 days
+import os
+import sys
+from collections import namedtuple
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Thresholds; set any of them to 0 to turn that check off
+MIN_IMAGE_SIDE = int(os.environ.get('AGROEXPERT_MIN_IMAGE_SIDE', 100))   # pixels, of the original photo
+MIN_SHARPNESS = float(os.environ.get('AGROEXPERT_MIN_SHARPNESS', 20.0))  # Laplacian variance
+MAX_CLIPPED = float(os.environ.get('AGROEXPERT_MAX_CLIPPED', 0.6))       # fraction of black or white pixels
+DARK_LEVEL = 16      # grey levels at or below this count as black
+BRIGHT_LEVEL = 240   # and at or above this as white
+LUMA = (0.299, 0.587, 0.114)
+
+MESSAGES = {
+    'too_small': "Image resolution is too low to diagnose. Please upload a larger photo.",
+    'blurry': "Image is too blurry to diagnose. Please retake the photo with the leaf in focus.",
+    'underexposed': "Image is too dark to diagnose. Please retake the photo in better light.",
+    'overexposed': "Image is too bright to diagnose. Please retake the photo out of direct glare.",
+}
+
+
+class Rejection(namedtuple('Rejection', ['reason', 'value'])):
+    """Why a photo was turned away and the measurement that failed the check."""
+
+    @property
+    def message(self):
+        return MESSAGES[self.reason]
+
+    def result(self):
+        """The process_image() result for a rejected photo."""
+        return {"error": self.message, "rejected": self.reason, "measured": self.value}
+
+
+def to_grey(pixels):
+    """(height, width) float32 luma of an RGB uint8 array."""
+    return np.dot(pixels, np.asarray(LUMA, dtype=np.float32))
+
+
+def sharpness(grey):
+    """Variance of the 4-neighbour Laplacian; low when there are no edges, i.e. blur."""
+    laplacian = (grey[:-2, 1:-1] + grey[2:, 1:-1] + grey[1:-1, :-2] + grey[1:-1, 2:]
+                 - 4 * grey[1:-1, 1:-1])
+    return float(laplacian.var())
+
+
+def exposure(grey):
+    """(fraction of black pixels, fraction of white pixels) from a 256-bin histogram."""
+    histogram = np.bincount(grey.astype(np.uint8).ravel(), minlength=256)
+    total = histogram.sum()
+    return float(histogram[:DARK_LEVEL + 1].sum() / total), float(histogram[BRIGHT_LEVEL:].sum() / total)
+
+
+def measure(pixels, source_size=None):
+    grey = to_grey(pixels)
+    dark, bright = exposure(grey)
+    return {
+        'min_side': min(source_size) if source_size else None,
+        'sharpness': round(sharpness(grey), 2),
+        'dark_fraction': round(dark, 4),
+        'bright_fraction': round(bright, 4),
+    }
+
+
+def screen(pixels, source_size=None, min_side=None, min_sharpness=None, max_clipped=None):
+    """
+    Check one decoded image (an RGB uint8 array of the model input size).
+    source_size is the (width, height) of the original photo. Thresholds
+    default to the module settings. Returns a Rejection, or None if the
+    image is usable.
+    """
+    min_side = MIN_IMAGE_SIDE if min_side is None else min_side
+    min_sharpness = MIN_SHARPNESS if min_sharpness is None else min_sharpness
+    max_clipped = MAX_CLIPPED if max_clipped is None else max_clipped
+    if min_side and source_size and min(source_size) < min_side:
+        return Rejection('too_small', min(source_size))
+    grey = to_grey(pixels)
+    if max_clipped:
+        dark, bright = exposure(grey)
+        # Exposure first: the edges of a black or blown-out photo say nothing about focus
+        if dark > max_clipped:
+            return Rejection('underexposed', round(dark, 4))
+        if bright > max_clipped:
+            return Rejection('overexposed', round(bright, 4))
+    if min_sharpness:
+        value = sharpness(grey)
+        if value < min_sharpness:
+            return Rejection('blurry', round(value, 2))
+    return None
+
+
+def print_report(days=30):
+    import timeutil
+    from repositories import ImageRejectionRepository
+    rows = ImageRejectionRepository().counts_by_reason(timeutil.days_ago(days))
+    print(f"\n=== Rejected images, last {days} days ===")
+    if not rows:
+        print("None")
+    for row in rows:
+        print(f"{row.key:<14} {row.count}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--report':
+        print_report(int(sys.argv[2]) if len(sys.argv) > 2 else 30)
+    elif len(sys.argv) > 1:
+        import preprocessing
+        buffer = preprocessing.allocate_batch(1)
+        for path in sys.argv[1:]:
+            source_size = preprocessing.decode_into(path, buffer[0])
+            rejection = screen(buffer[0], source_size)
+            print(f"{path}: {measure(buffer[0], source_size)} -> "
+                  f"{rejection.reason if rejection else 'ok'}")
+    else:
+        print("Usage: python image_quality.py IMAGE... | --report [DAYS]")
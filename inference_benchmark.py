@@ -0,0 +1,311 @@
+# inference_benchmark.py
+# Latency and throughput of every model version in model_versions on fixed
+# workloads: the photos in test_images/, synthetic 224x224 inputs and large
+# (12 MP) JPEGs. Each version is measured in a fresh interpreter, so the
+# cold-start time (imports, model load including TensorFlow, first
+# prediction) and the peak RSS belong to that version alone. The large
+# JPEGs are written once by the parent so their generation does not count
+# towards any version's RSS. Results are written as JSON and
+# compared against a stored baseline; any metric worse than the baseline by
+# more than the tolerance is reported and the exit status is 1.
+#
+#   python inference_benchmark.py                   # run, compare with baseline
+#   python inference_benchmark.py --save-baseline   # run and store as the baseline
+#   python inference_benchmark.py --version-id 3 --variant int8 --repeats 50
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from query_profiler import percentile
+
+RESULTS_FILE = os.environ.get('AGROEXPERT_BENCHMARK_FILE', 'data/inference_benchmark.json')
+BASELINE_FILE = os.environ.get('AGROEXPERT_BENCHMARK_BASELINE', 'data/inference_baseline.json')
+TEST_IMAGE_DIR = 'test_images'
+BATCH_SIZES = (1, 8, 32, 64)
+LARGE_JPEG_SIZE = (4000, 3000)   # 12 MP, a typical phone photo
+LARGE_JPEG_COUNT = 3
+# Relative change beyond which a metric counts as a regression
+TOLERANCE = 0.10
+
+
+def summarise(samples_ms):
+    """count, mean and p50/p95/p99 of a list of latencies in milliseconds."""
+    ordered = sorted(samples_ms)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50), 3),
+        'p95_ms': round(percentile(ordered, 0.95), 3),
+        'p99_ms': round(percentile(ordered, 0.99), 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def benchmark_images(image_dir=TEST_IMAGE_DIR):
+    return sorted(p for p in glob.glob(os.path.join(image_dir, '*'))
+                  if os.path.splitext(p)[1].lower() in ('.jpg', '.jpeg', '.png'))
+
+
+def write_large_jpegs(directory, count=LARGE_JPEG_COUNT, size=LARGE_JPEG_SIZE):
+    """Write count reproducible 12 MP JPEGs with photo-like detail and return their paths."""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        # Smooth colour regions from an upscaled random image, plus sensor-like noise
+        coarse = Image.fromarray(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)).resize(size, Image.BICUBIC)
+        pixels = np.asarray(coarse, dtype=np.int16) + rng.integers(-12, 13, (size[1], size[0], 3), dtype=np.int16)
+        path = os.path.join(directory, f'large_{i}.jpg')
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+# --- Child: one model version in a fresh interpreter -----------------------
+def measure_version(version_id, variant=None, repeats=20, large_dir=None, batch_sizes=BATCH_SIZES,
+                    image_dir=TEST_IMAGE_DIR):
+    """Benchmark one model version in this process; returns its results dict."""
+    start = time.perf_counter()
+    import numpy as np
+    from disease_identification import DiseaseIdentification, warm_up, IMAGE_SIZE
+    from inference_metrics import Timings
+    from repositories import ModelVersionRepository
+    import_ms = (time.perf_counter() - start) * 1000
+
+    version = next((v for v in ModelVersionRepository().all() if v.id == version_id), None)
+    if version is None:
+        raise RuntimeError(f"No model version with id {version_id}")
+    identifier = DiseaseIdentification(use_server=False, watch=False, warmup=False)
+    start = time.perf_counter()
+    current = identifier.read_model_version(version, variant)
+    load_ms = (time.perf_counter() - start) * 1000
+    identifier.current = current
+
+    def diagnose(image_path):
+        # Decode, resize, quality screen and forward pass; no cache or database involved
+        began = time.perf_counter()
+        batch, _ = identifier.decode_and_screen(image_path, Timings())
+        identifier.predict_disease(batch, current)
+        return (time.perf_counter() - began) * 1000
+
+    images = benchmark_images(image_dir)
+    synthetic = np.random.default_rng(0).integers(0, 256, (max(batch_sizes), IMAGE_SIZE[1], IMAGE_SIZE[0], 3),
+                                                  dtype=np.uint8)
+    # The first prediction of a cold model pays for tracing and allocation
+    first_prediction_ms = diagnose(images[0]) if images else None
+    if first_prediction_ms is None:
+        began = time.perf_counter()
+        identifier.predict_disease(synthetic[:1], current)
+        first_prediction_ms = (time.perf_counter() - began) * 1000
+    warm_up(current.model, batch_sizes)
+
+    latency = {}
+    if images:
+        latency['test_images'] = summarise([diagnose(path) for _ in range(repeats) for path in images])
+    single = synthetic[:1]
+    samples = []
+    for _ in range(repeats * 4):
+        began = time.perf_counter()
+        identifier.predict_disease(single, current)
+        samples.append((time.perf_counter() - began) * 1000)
+    latency['synthetic_224'] = summarise(samples)
+    large = benchmark_images(large_dir) if large_dir else []
+    if large:
+        latency['large_jpeg_12mp'] = summarise([diagnose(path) for _ in range(max(1, repeats // 4))
+                                                for path in large])
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = synthetic[:batch_size]
+        iterations = max(3, (repeats * 8) // batch_size)
+        began = time.perf_counter()
+        for _ in range(iterations):
+            current.model.predict_on_batch(batch)
+        throughput[str(batch_size)] = round(batch_size * iterations / (time.perf_counter() - began), 1)
+
+    return {
+        'version_number': version.version_number,
+        'variant': current.variant,
+        'cold_start': {
+            'import_ms': round(import_ms, 1),
+            'load_ms': round(load_ms, 1),
+            'first_prediction_ms': round(first_prediction_ms, 1),
+            'total_ms': round(import_ms + load_ms + first_prediction_ms, 1),
+        },
+        'latency': latency,
+        'throughput_images_per_s': throughput,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_child(version_id, variant, repeats, large_dir=None):
+    """Run measure_version() for one version in a fresh interpreter."""
+    args = [sys.executable, os.path.abspath(__file__), '--child', str(version_id), '--repeats', str(repeats)]
+    if large_dir:
+        args += ['--large-dir', large_dir]
+    if variant:
+        args += ['--variant', variant]
+    result = subprocess.run(args, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'
+        return {'error': error}
+    return json.loads(lines[-1])
+
+
+def benchmark(version_ids=None, variant=None, repeats=20):
+    """Benchmark every model version (or the given ids); returns the results document."""
+    from repositories import ModelVersionRepository
+    versions = ModelVersionRepository().all()
+    active = next((v.id for v in versions if v.is_active), None)
+    results = {
+        'created_at': int(time.time()),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'active_version_id': active,
+        'versions': {},
+    }
+    versions = [v for v in versions if not version_ids or v.id in version_ids]
+    if not versions:
+        return results
+    with tempfile.TemporaryDirectory(prefix='agroexpert_bench_') as large_dir:
+        write_large_jpegs(large_dir)
+        for version in versions:
+            print(f"Benchmarking model version {version.version_number} (id {version.id})...")
+            results['versions'][str(version.id)] = run_child(version.id, variant, repeats, large_dir)
+    return results
+
+
+# --- Baseline comparison ---------------------------------------------------
+def metrics(entry):
+    """(name, value, higher_is_better) for every compared metric of one version's results."""
+    found = [('cold_start.total_ms', entry.get('cold_start', {}).get('total_ms'), False),
+             ('peak_rss_mb', entry.get('peak_rss_mb'), False)]
+    for workload, stats in entry.get('latency', {}).items():
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            found.append((f'latency.{workload}.{key}', stats.get(key), False))
+    for batch_size, images_per_s in entry.get('throughput_images_per_s', {}).items():
+        found.append((f'throughput.batch_{batch_size}', images_per_s, True))
+    return [(name, value, higher) for name, value, higher in found if value is not None]
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Regressions of results against baseline as a list of strings. A version
+    missing from the baseline (e.g. a newly trained model) is compared
+    against the version that was active when the baseline was stored.
+    """
+    regressions = []
+    reference_id = str(baseline.get('active_version_id'))
+    for version_id, entry in results.get('versions', {}).items():
+        if 'error' in entry:
+            regressions.append(f"version {version_id}: benchmark failed: {entry['error']}")
+            continue
+        reference = baseline.get('versions', {}).get(version_id) or baseline.get('versions', {}).get(reference_id)
+        if not reference or 'error' in reference:
+            continue
+        expected = {name: value for name, value, _ in metrics(reference)}
+        for name, value, higher_is_better in metrics(entry):
+            old = expected.get(name)
+            if not old:
+                continue
+            change = (value - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"version {version_id}: {name} {old:g} -> {value:g} ({change:+.0%})")
+    return regressions
+
+
+def save(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_report(results):
+    for version_id, entry in results['versions'].items():
+        if 'error' in entry:
+            print(f"\n=== Model version id {version_id}: FAILED: {entry['error']} ===")
+            continue
+        cold = entry['cold_start']
+        print(f"\n=== Model version {entry['version_number']} (id {version_id}, {entry['variant']}) ===")
+        print(f"cold start: {cold['total_ms']:.0f} ms (import {cold['import_ms']:.0f}, load {cold['load_ms']:.0f}, "
+              f"first prediction {cold['first_prediction_ms']:.0f})   peak RSS: {entry['peak_rss_mb']} MB")
+        for workload, s in entry['latency'].items():
+            print(f"{workload:<16} n={s['count']:<5} p50: {s['p50_ms']:8.2f} ms  p95: {s['p95_ms']:8.2f} ms  "
+                  f"p99: {s['p99_ms']:8.2f} ms")
+        print("throughput: " + "  ".join(f"batch {size}: {rate:.1f} img/s"
+                                         for size, rate in entry['throughput_images_per_s'].items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark inference latency of every model version")
+    parser.add_argument('--version-id', type=int, action='append', help="only this version (repeatable)")
+    parser.add_argument('--variant', choices=('keras', 'float16', 'int8'),
+                        help="model variant to run (default: each version's serving variant)")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed relative regression")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--large-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(measure_version(args.child, args.variant, args.repeats, args.large_dir)))
+        return 0
+
+    results = benchmark(args.version_id, args.variant, args.repeats)
+    if not results['versions']:
+        print("No model versions to benchmark")
+        return 1
+    print_report(results)
+    save(results, args.output)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    baseline = load(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, so regressions were not checked; "
+              f"run with --save-baseline on the reference machine to store one")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
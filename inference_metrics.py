@@ -0,0 +1,148 @@
+# inference_metrics.py
+# Per-stage latency of diagnoses (cache lookup, decode, resize, forward pass,
+# DB insert and total), kept per model version so p50/p99 can be compared
+# across rollouts. Each diagnosis can also be appended to a JSON-lines file
+# (AGROEXPERT_METRICS_FILE) for offline analysis; `python inference_metrics.py
+# [file]` summarises such a file.
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from query_profiler import percentile
+
+METRICS_FILE = os.environ.get('AGROEXPERT_METRICS_FILE')
+# Latency samples kept per (model version, stage) for the percentile estimates
+MAX_SAMPLES = 2048
+STAGES = ('cache', 'decode', 'resize', 'screen', 'forward', 'db_insert', 'total',
+          'batch_decode', 'batch_screen', 'batch_forward', 'batch_db_insert', 'batch_total')
+
+
+class StageStats:
+    __slots__ = ('count', 'total_ms', 'max_ms', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+    def as_dict(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(percentile(ordered, 0.50), 3),
+            'p99_ms': round(percentile(ordered, 0.99), 3),
+            'max_ms': round(self.max_ms, 3),
+        }
+
+
+class Timings(dict):
+    """Stage -> milliseconds for one diagnosis (or one batch)."""
+
+    def __init__(self):
+        super().__init__()
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def add(self, name, elapsed_ms):
+        self[name] = self.get(name, 0.0) + elapsed_ms
+
+    def finish(self, name='total'):
+        self[name] = (time.perf_counter() - self._start) * 1000
+        return self
+
+
+class _StageTimer:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class InferenceMetrics:
+    def __init__(self, metrics_file=METRICS_FILE):
+        self.metrics_file = metrics_file
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_version_id, timings, images=1, **fields):
+        """Add one diagnosis (or a batch of `images`) to the counters and the metrics file."""
+        with self._lock:
+            for stage, elapsed_ms in timings.items():
+                key = (model_version_id, stage)
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = StageStats()
+                stats.add(elapsed_ms)
+        if self.metrics_file:
+            self._append({'ts': round(time.time(), 3), 'model_version_id': model_version_id,
+                          'images': images, **fields,
+                          'stages': {stage: round(ms, 3) for stage, ms in timings.items()}})
+
+    def _append(self, entry):
+        try:
+            directory = os.path.dirname(self.metrics_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.metrics_file, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"Error writing inference metrics: {e}")
+
+    def stats(self):
+        """{model version id: {stage: {count, mean_ms, p50_ms, p99_ms, max_ms}}}"""
+        result = {}
+        with self._lock:
+            for (version_id, stage), stats in self._stats.items():
+                result.setdefault(version_id, {})[stage] = stats.as_dict()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def summarise_file(path):
+    """Rebuild the per-version stage statistics from a JSON-lines metrics file."""
+    metrics = InferenceMetrics(metrics_file=None)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                metrics.record(entry.get('model_version_id'), entry.get('stages', {}))
+    return metrics.stats()
+
+
+def print_report(stats):
+    for version_id, stages in stats.items():
+        print(f"\n=== Inference latency, model version id {version_id} ===")
+        for stage in sorted(stages, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            s = stages[stage]
+            print(f"{stage:<16} n={s['count']:<6} mean: {s['mean_ms']:8.2f} ms  p50: {s['p50_ms']:8.2f} ms  "
+                  f"p99: {s['p99_ms']:8.2f} ms  max: {s['max_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else METRICS_FILE
+    if not path or not os.path.exists(path):
+        print("Usage: python inference_metrics.py METRICS_FILE (or set AGROEXPERT_METRICS_FILE)")
+    else:
+        print_report(summarise_file(path))
@@ -0,0 +1,258 @@
+# inference_server.py
+# Local inference daemon. Loads the active model once and serves
+# predictions over localhost HTTP; concurrent requests are grouped into
+# micro-batches so one forward pass serves many users.
+#
+#   python inference_server.py [--port 8765] [--max-batch 16] [--wait-ms 10]
+#
+# DiseaseIdentification uses the daemon automatically when it is running
+# (see predict_remote()) and falls back to its own model otherwise.
+# GET /metrics returns per-stage latency per model version.
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lazy_imports import lazy_import
+from inference_metrics import Timings
+import embeddings
+
+np = lazy_import('numpy')
+
+INFERENCE_HOST = '127.0.0.1'
+INFERENCE_PORT = int(os.environ.get('AGROEXPERT_INFERENCE_PORT', 8765))
+MAX_BATCH = int(os.environ.get('AGROEXPERT_INFERENCE_MAX_BATCH', 16))
+MAX_WAIT_MS = float(os.environ.get('AGROEXPERT_INFERENCE_WAIT_MS', 10))
+REQUEST_TIMEOUT = 30          # seconds a client waits for a prediction
+PROBE_TIMEOUT = 0.25          # seconds for the health check
+PROBE_CACHE_SECONDS = 5       # how long a "no server" answer is trusted
+
+
+class MicroBatcher:
+    """
+    Groups decoded images from concurrent requests into one forward pass.
+
+    A batch runs when max_batch images are waiting or max_wait_ms after the
+    first one arrived, whichever comes first. Batches are padded to
+    max_batch so the model always sees the same input shape.
+    """
+
+    def __init__(self, identifier, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.identifier = identifier
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image_array):
+        """Queue one decoded image; the returned Future resolves to the prediction dict."""
+        future = Future()
+        self._queue.put((image_array, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._predict(batch)
+
+    def _predict(self, batch):
+        # A model swap between batches is picked up here; this batch stays on one model
+        current = self.identifier.current
+        timings = Timings()
+        try:
+            arrays = np.stack([array for array, _ in batch])
+            padded = np.zeros((self.max_batch, *arrays.shape[1:]), dtype=arrays.dtype)
+            padded[:len(batch)] = arrays
+            with timings.stage('batch_forward'):
+                scores, features = embeddings.forward(current.model, padded)
+                scores = scores[:len(batch)]
+                features = features[:len(batch)] if features is not None else None
+            for (_, future), prediction in zip(batch, self.identifier.predictions_from_batch(
+                    scores, current.classes, features)):
+                prediction['model_version_id'] = current.version_id
+                if prediction.embedding is not None:
+                    # The client stores the case, see DiseaseIdentification.store_case()
+                    prediction['embedding'] = embeddings.to_text(prediction.embedding)
+                future.set_result(prediction)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        self.identifier.metrics.record(current.version_id, timings, images=len(batch), source='server_batch')
+        self.requests += len(batch)
+        self.batches += 1
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'queue_depth': self._queue.qsize(),
+        }
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    # Set per server by create_server()
+    identifier = None
+    batcher = None
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            # JSON keys must be strings
+            self._reply(200, {str(version_id): stages
+                              for version_id, stages in self.identifier.latency_stats().items()})
+            return
+        if self.path != '/health':
+            self._reply(404, {"error": "Not found"})
+            return
+        current = self.identifier.current
+        self._reply(200, {
+            "status": "ok",
+            "model_version_id": current.version_id,
+            "model_variant": current.variant,
+            "classes": len(current.classes),
+            **self.batcher.stats(),
+        })
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._reply(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            image_path = json.loads(self.rfile.read(length))['image_path']
+        except (ValueError, KeyError, TypeError):
+            self._reply(400, {"error": "Expected a JSON body with image_path"})
+            return
+        if not os.path.exists(image_path):
+            self._reply(200, {"error": "Image file not found"})
+            return
+        timings = Timings()
+        try:
+            # Decoding and the quality pre-screen run in the request thread, so requests decode in parallel
+            batch, rejection = self.identifier.decode_and_screen(image_path, timings)
+        except Exception:
+            self._reply(200, {"error": "Error preprocessing image"})
+            return
+        if rejection is not None:
+            # Recorded by the client, which knows the user
+            self._reply(200, rejection.result())
+            return
+        image_array = batch[0]
+        try:
+            # Includes the wait for the micro-batch to fill
+            with timings.stage('forward'):
+                prediction = self.batcher.submit(image_array).result(timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            print(f"Error making prediction: {e}")
+            self._reply(200, {"error": "Error making prediction"})
+            return
+        self.identifier.metrics.record(prediction.get('model_version_id'), timings.finish(), source='server')
+        self._reply(200, prediction)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(identifier, host=INFERENCE_HOST, port=INFERENCE_PORT,
+                  max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+    """Build the HTTP server around an identifier whose model is already loaded."""
+    handler = type('BoundInferenceHandler', (InferenceHandler,), {
+        'identifier': identifier,
+        'batcher': MicroBatcher(identifier, max_batch, max_wait_ms),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(host=INFERENCE_HOST, port=INFERENCE_PORT, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+    from disease_identification import DiseaseIdentification
+    identifier = DiseaseIdentification(use_server=False)
+    if not identifier.ensure_model_loaded():
+        print("Error: Could not load the active model. Run config.py first.")
+        return
+    server = create_server(identifier, host, port, max_batch, max_wait_ms)
+    print(f"Inference server listening on http://{host}:{port} "
+          f"(max batch {max_batch}, wait {max_wait_ms:g} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- Client ----------------------------------------------------------------
+_server_down_until = 0.0
+
+
+def _server_url(path):
+    return f"http://{INFERENCE_HOST}:{INFERENCE_PORT}{path}"
+
+
+def server_available():
+    """True if an inference daemon answers on this machine (negative answers are cached briefly)."""
+    global _server_down_until
+    if time.monotonic() < _server_down_until:
+        return False
+    try:
+        with urllib.request.urlopen(_server_url('/health'), timeout=PROBE_TIMEOUT) as response:
+            return response.status == 200
+    except (OSError, urllib.error.URLError):
+        _server_down_until = time.monotonic() + PROBE_CACHE_SECONDS
+        return False
+
+
+def predict_remote(image_path):
+    """
+    Ask the running daemon for a prediction.
+
+    Returns the same dict as DiseaseIdentification.predict_disease() plus the
+    model_version_id that produced it (or an {"error": ...} dict), or None
+    when no daemon is available.
+    """
+    if not server_available():
+        return None
+    body = json.dumps({'image_path': os.path.abspath(image_path)}).encode('utf-8')
+    request = urllib.request.Request(_server_url('/predict'), data=body,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read())
+    except (OSError, urllib.error.URLError, ValueError) as e:
+        print(f"Inference server unavailable, predicting locally: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AgroExpert local inference server")
+    parser.add_argument('--host', default=INFERENCE_HOST)
+    parser.add_argument('--port', type=int, default=INFERENCE_PORT)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_batch, args.wait_ms)
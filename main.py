@@ -46,6 +46,8 @@ class AgroExpert:
     def display_user_menu(self):
         role = self.current_user['role']
         if role == 'farmer':
+            # Farmers are the ones who diagnose images: warm the model up in the background
+            self.disease_identifier.preload()
             # # Notify farmer about replies
             print("----------------------Notifications---------------:\n")
             self.consultation.notify_farmer_replies(self.current_user['id'])
@@ -0,0 +1,642 @@
+# migrations.py
+# Versioned schema migrations. Each step is applied once, inside its own
+# transaction, and recorded in the schema_version table. A released step
+# never changes; new tables and indexes go in a new numbered step.
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from urllib.request import pathname2url
+from db import create_connection, connect_raw, get_database
+import timeutil
+from timeutil import SQL_NOW
+
+Migration = namedtuple('Migration', ['version', 'name', 'apply'])
+
+
+def _0001_base_schema(cursor):
+    # IF NOT EXISTS lets databases created before schema_version existed
+    # adopt version 1 without losing data.
+
+    # Create Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            email TEXT UNIQUE,
+            phone TEXT,
+            status TEXT DEFAULT 'active',
+            last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expert_details (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE,
+            scope TEXT,
+            specialization TEXT,
+            commodity TEXT,
+            region TEXT,
+            city TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # Create Diseases table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS diseases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            symptoms TEXT,
+            treatment TEXT
+        )
+    ''')
+
+    # Create Disease Predictions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS disease_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_path TEXT,
+            disease_name TEXT,
+            confidence REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create NEW Consultations table with image_path included
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS consultations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            farmer_id INTEGER,
+            expert_id INTEGER,
+            description TEXT,
+            image_path TEXT,
+            plant_name TEXT,
+            symptoms TEXT,
+            region TEXT,
+            date_noticed DATE,
+            treatments TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (farmer_id) REFERENCES users (id),
+            FOREIGN KEY (expert_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create Consultation Responses table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS consultation_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            consultation_id INTEGER,
+            expert_id INTEGER,
+            expert_response TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (consultation_id) REFERENCES consultations (id),
+            FOREIGN KEY (expert_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create Rewards table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rewards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            points INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create Reward Transactions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reward_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            action TEXT,
+            points INTEGER,
+            description TEXT,
+            transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+     # Create coupons table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS coupons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE,
+            value INTEGER,
+            expiration_date TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+
+    # Create coupon usage table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS coupon_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            coupon_id INTEGER,
+            user_id INTEGER,
+            redemption_date TIMESTAMP,
+            FOREIGN KEY (coupon_id) REFERENCES coupons (id)
+        )
+    ''')
+    # Create News table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS news (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # For tracking ML model versions
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS model_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_path TEXT NOT NULL,
+            version_number TEXT NOT NULL,
+            accuracy REAL,
+            total_classes INTEGER,
+            training_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            description TEXT,
+            is_active BOOLEAN DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS unknown_diseases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reported_by_farmer_id INTEGER,
+            verified_by_expert_id INTEGER,
+            related_consultation_id INTEGER, -- Link to specific consultation
+            initial_image_path TEXT,
+            samples_folder_path TEXT,
+            description TEXT,
+            symptoms TEXT,
+            date_reported TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending', -- pending, samples_requested, samples_received, verified, training_in_progress, completed
+            admin_notes TEXT,
+            FOREIGN KEY (reported_by_farmer_id) REFERENCES users (id),
+            FOREIGN KEY (verified_by_expert_id) REFERENCES users (id),
+            FOREIGN KEY (related_consultation_id) REFERENCES consultations (id)
+        )
+    ''')
+
+
+    # For tracking disease samples collection
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS disease_samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unknown_disease_id INTEGER,
+            farmer_id INTEGER,
+            samples_zip_path TEXT,
+            upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending', -- pending, verified, rejected
+            expert_notes TEXT,
+            FOREIGN KEY (unknown_disease_id) REFERENCES unknown_diseases (id),
+            FOREIGN KEY (farmer_id) REFERENCES users (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS model_classes (
+            class_index INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_name TEXT NOT NULL UNIQUE,
+            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+       # Create Crops table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crops (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            crop_name TEXT,
+            variety TEXT,
+            planting_date DATE,
+            notes TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS disease_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            disease_name TEXT NOT NULL,
+            affected_crop TEXT NOT NULL,
+            region TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS farmer_notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        alert_id INTEGER,
+        notified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        viewed INTEGER DEFAULT 0,  -- New column to track if the notification has been viewed
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (alert_id) REFERENCES disease_alerts (id)
+    );
+    ''')
+
+# Secondary indexes for the hot query paths (see db.HOT_QUERIES)
+_0002_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_consultations_status_created ON consultations (status, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_consultations_farmer ON consultations (farmer_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_consultation_responses_consultation ON consultation_responses (consultation_id)',
+    'CREATE INDEX IF NOT EXISTS idx_farmer_notifications_user_viewed ON farmer_notifications (user_id, viewed)',
+    'CREATE INDEX IF NOT EXISTS idx_crops_user ON crops (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_crops_lower_crop_name ON crops (LOWER(crop_name))',
+    'CREATE INDEX IF NOT EXISTS idx_rewards_user ON rewards (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_reward_transactions_user_date ON reward_transactions (user_id, transaction_date)',
+    'CREATE INDEX IF NOT EXISTS idx_disease_samples_status ON disease_samples (status)',
+    'CREATE INDEX IF NOT EXISTS idx_unknown_diseases_expert ON unknown_diseases (verified_by_expert_id)',
+]
+
+
+def _0002_hot_path_indexes(cursor):
+    for sql in _0002_INDEXES:
+        cursor.execute(sql)
+
+
+# TIMESTAMP columns converted to INTEGER epoch seconds: table -> [(column, stored_as_local_time)].
+# CURRENT_TIMESTAMP and datetime('now') values are UTC; coupon dates were
+# written from datetime.now() and are local time.
+EPOCH_COLUMNS = {
+    'users': [('last_login', False)],
+    'disease_predictions': [('created_at', False)],
+    'consultations': [('created_at', False)],
+    'consultation_responses': [('created_at', False)],
+    'reward_transactions': [('transaction_date', False)],
+    'coupons': [('expiration_date', True)],
+    'coupon_usage': [('redemption_date', True)],
+    'news': [('created_at', False)],
+    'model_versions': [('training_date', False)],
+    'unknown_diseases': [('date_reported', False)],
+    'disease_samples': [('upload_date', False)],
+    'model_classes': [('date_added', False)],
+    'disease_alerts': [('created_at', False)],
+    'farmer_notifications': [('notified_at', False)],
+}
+
+
+def _epoch_expression(column, local):
+    modifier = ", 'utc'" if local else ''
+    return (f"CASE WHEN typeof({column}) = 'text' "
+            f"THEN CAST(strftime('%s', {column}{modifier}) AS INTEGER) ELSE {column} END")
+
+
+def _rebuild_with_epoch_columns(cursor, table, columns):
+    """
+    Rebuild table with the given TIMESTAMP columns as INTEGER epoch seconds.
+
+    SQLite cannot change a column's type or default in place, so this
+    follows the create/copy/drop/rename procedure from the SQLite docs.
+    """
+    create_sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    for column, _ in columns:
+        create_sql, found = re.subn(
+            rf'\b{column}\s+TIMESTAMP(\s+DEFAULT\s+CURRENT_TIMESTAMP)?',
+            lambda m: f'{column} INTEGER' + (f' DEFAULT {SQL_NOW}' if m.group(1) else ''),
+            create_sql, count=1, flags=re.IGNORECASE)
+        if not found:
+            raise ValueError(f"{table}.{column} is not a TIMESTAMP column")
+    create_sql = re.sub(rf'^CREATE TABLE\s+(IF NOT EXISTS\s+)?{table}\b',
+                        f'CREATE TABLE {table}_new', create_sql.strip(), flags=re.IGNORECASE)
+
+    names = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    local_columns = dict(columns)
+    select = ', '.join(_epoch_expression(name, local_columns[name]) if name in local_columns else name
+                       for name in names)
+    sequence = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table}_new ({', '.join(names)}) SELECT {select} FROM {table}")
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    if sequence:
+        # Keep AUTOINCREMENT from reusing ids of rows deleted before the rebuild
+        cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+
+
+# Indexes after the rebuild: those of migration 2, the consultation response
+# index extended by created_at, and two for the new epoch range queries
+_0003_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_consultations_status_created ON consultations (status, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_consultations_farmer ON consultations (farmer_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_consultation_responses_consultation '
+    'ON consultation_responses (consultation_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_farmer_notifications_user_viewed ON farmer_notifications (user_id, viewed)',
+    'CREATE INDEX IF NOT EXISTS idx_crops_user ON crops (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_crops_lower_crop_name ON crops (LOWER(crop_name))',
+    'CREATE INDEX IF NOT EXISTS idx_rewards_user ON rewards (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_reward_transactions_user_date ON reward_transactions (user_id, transaction_date)',
+    'CREATE INDEX IF NOT EXISTS idx_disease_samples_status ON disease_samples (status)',
+    'CREATE INDEX IF NOT EXISTS idx_unknown_diseases_expert ON unknown_diseases (verified_by_expert_id)',
+    'CREATE INDEX IF NOT EXISTS idx_coupons_active_expiration ON coupons (is_active, expiration_date)',
+    'CREATE INDEX IF NOT EXISTS idx_disease_alerts_created ON disease_alerts (created_at)',
+]
+
+
+def _0003_epoch_timestamps(cursor):
+    for table, columns in EPOCH_COLUMNS.items():
+        _rebuild_with_epoch_columns(cursor, table, columns)
+    # Dropping the old tables dropped their indexes as well
+    for sql in _0003_INDEXES:
+        cursor.execute(sql)
+
+
+def _0004_prediction_cache(cursor):
+    # Predictions keyed by image content and the model version that produced them
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS prediction_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            image_hash TEXT NOT NULL,
+            model_version_id INTEGER NOT NULL,
+            disease_name TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            all_predictions TEXT,
+            created_at INTEGER DEFAULT {SQL_NOW},
+            last_used_at INTEGER DEFAULT {SQL_NOW},
+            UNIQUE (image_hash, model_version_id),
+            FOREIGN KEY (model_version_id) REFERENCES model_versions (id)
+        )
+    ''')
+    # LRU eviction order
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_prediction_cache_last_used ON prediction_cache (last_used_at)')
+
+
+def _0005_model_variants(cursor):
+    # Exported TFLite variants of each model version with their measured cost
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS model_variants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_version_id INTEGER NOT NULL,
+            variant TEXT NOT NULL,
+            model_path TEXT NOT NULL,
+            size_bytes INTEGER,
+            latency_ms REAL,
+            accuracy REAL,
+            created_at INTEGER DEFAULT {SQL_NOW},
+            UNIQUE (model_version_id, variant),
+            FOREIGN KEY (model_version_id) REFERENCES model_versions (id)
+        )
+    ''')
+    # Which variant DiseaseIdentification loads for this version
+    cursor.execute("ALTER TABLE model_versions ADD COLUMN serving_variant TEXT DEFAULT 'keras'")
+
+
+def _0006_prediction_cache_phash(cursor):
+    # 64-bit dHash (stored signed) for near-duplicate lookup, see perceptual_index.py
+    cursor.execute('ALTER TABLE prediction_cache ADD COLUMN phash INTEGER')
+    # Covers loading one version's hashes into the BK-tree
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_prediction_cache_version_phash
+        ON prediction_cache (model_version_id, phash)
+    ''')
+
+
+def _0007_write_spool_state(cursor):
+    # Highest spooled write committed per spool file, see db.WriteSpool
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS write_spool_state (
+            spool TEXT PRIMARY KEY,
+            committed_seq INTEGER NOT NULL
+        )
+    ''')
+
+
+def _0008_image_rejections(cursor):
+    # Photos turned away by the quality pre-screen, see image_quality.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_rejections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_path TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            value REAL,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_image_rejections_created_at
+        ON image_rejections (created_at, reason)
+    ''')
+
+
+def _0009_case_embeddings(cursor):
+    # Penultimate-layer embeddings of diagnosed and consultation images, see case_index.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS case_embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_version_id INTEGER NOT NULL,
+            image_hash TEXT NOT NULL,
+            user_id INTEGER,
+            consultation_id INTEGER,
+            image_path TEXT,
+            disease_name TEXT,
+            embedding BLOB NOT NULL,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (model_version_id) REFERENCES model_versions (id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (consultation_id) REFERENCES consultations (id)
+        )
+    ''')
+    # One case per image and model version; also covers loading a version into the index
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_case_embeddings_version_hash
+        ON case_embeddings (model_version_id, image_hash)
+    ''')
+
+
+def _0010_schema_version_epoch(cursor):
+    # schema_version is created before any migration runs, with the old
+    # TIMESTAMP column; this step's own row is inserted after the rebuild
+    _rebuild_with_epoch_columns(cursor, 'schema_version', [('applied_at', False)])
+
+
+MIGRATIONS = [
+    Migration(1, 'base schema', _0001_base_schema),
+    Migration(2, 'hot path indexes', _0002_hot_path_indexes),
+    Migration(3, 'integer epoch timestamps', _0003_epoch_timestamps),
+    Migration(4, 'prediction cache', _0004_prediction_cache),
+    Migration(5, 'model variants', _0005_model_variants),
+    Migration(6, 'prediction cache perceptual hash', _0006_prediction_cache_phash),
+    Migration(7, 'write spool state', _0007_write_spool_state),
+    Migration(8, 'image rejections', _0008_image_rejections),
+    Migration(9, 'case embeddings', _0009_case_embeddings),
+    Migration(10, 'schema version epoch timestamps', _0010_schema_version_epoch),
+]
+
+
+def ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL
+        )
+    ''')
+    conn.commit()
+
+
+def current_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)."""
+    ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn, target=None):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS
+            if m.version > version and (target is None or m.version <= target)]
+
+
+def apply_migration(conn, migration):
+    """Apply one migration in a single transaction and return its duration in ms."""
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN')
+        migration.apply(cursor)
+        duration_ms = (time.perf_counter() - start) * 1000
+        cursor.execute('''
+            INSERT INTO schema_version (version, name, duration_ms)
+            VALUES (?, ?, ?)
+        ''', (migration.version, migration.name, duration_ms))
+        conn.commit()
+        return duration_ms
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate(conn=None, target=None):
+    """
+    Apply all pending migrations (up to target, if given) in version order.
+
+    Stops at the first failing step and re-raises its error; that step is
+    rolled back and the database stays at the previous version.
+    Returns the applied versions.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = create_connection()
+        if conn is None:
+            print("Error: Could not establish database connection")
+            return []
+    applied = []
+    try:
+        for migration in pending_migrations(conn, target):
+            try:
+                duration_ms = apply_migration(conn, migration)
+            except Exception as e:
+                print(f"Error applying migration {migration.version} ({migration.name}): {e}")
+                raise
+            applied.append(migration.version)
+            print(f"Applied migration {migration.version}: {migration.name} ({duration_ms:.1f} ms)")
+        if not applied:
+            print(f"Database schema is up to date (version {current_version(conn)})")
+    finally:
+        if own_conn:
+            conn.close()
+    return applied
+
+
+def dry_run(database=None, target=None):
+    """
+    Apply pending migrations to a throwaway copy of the database and report
+    how long each step took. The real database is not modified, and one
+    that does not exist is not created. Returns None in that case.
+    """
+    database = get_database() if database is None else database
+    if database.startswith('file:'):
+        source = connect_raw(database)
+    elif os.path.isfile(database):
+        # Read-only, so not even a journal or WAL file is written next to it
+        source = sqlite3.connect(f'file:{pathname2url(os.path.abspath(database))}?mode=ro', uri=True)
+    else:
+        print(f"Error: Database {database} does not exist")
+        return None
+    fd, copy_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    results = []
+    try:
+        copy = sqlite3.connect(copy_path)
+        try:
+            source.backup(copy)
+        finally:
+            source.close()
+        try:
+            for migration in pending_migrations(copy, target):
+                try:
+                    duration_ms = apply_migration(copy, migration)
+                except Exception as e:
+                    results.append((migration.version, migration.name, None, str(e)))
+                    break
+                results.append((migration.version, migration.name, duration_ms, None))
+        finally:
+            copy.close()
+    finally:
+        os.remove(copy_path)
+
+    print(f"\n=== Migration dry run on a copy of {database} ===")
+    if not results:
+        print("No pending migrations.")
+    for version, name, duration_ms, error in results:
+        if error:
+            print(f"{version}: {name} -> FAILED ({error})")
+        else:
+            print(f"{version}: {name} -> {duration_ms:.1f} ms")
+    return results
+
+
+def migration_status(conn=None):
+    """Print applied and pending migrations."""
+    own_conn = conn is None
+    if own_conn:
+        conn = create_connection()
+        if conn is None:
+            print("Error: Could not establish database connection")
+            return
+    try:
+        ensure_version_table(conn)
+        # applied_at is still text on a database that has not reached migration 10
+        applied = conn.execute(f'''
+            SELECT version, name, {_epoch_expression('applied_at', False)}, duration_ms
+            FROM schema_version
+            ORDER BY version
+        ''').fetchall()
+        print("\n=== Schema Migrations ===")
+        for version, name, applied_at, duration_ms in applied:
+            print(f"{version}: {name} (applied {timeutil.format_timestamp(applied_at)}, "
+                  f"{duration_ms or 0:.1f} ms)")
+        for migration in pending_migrations(conn):
+            print(f"{migration.version}: {migration.name} (pending)")
+    finally:
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    if '--dry-run' in sys.argv[1:]:
+        dry_run()
+    elif '--status' in sys.argv[1:]:
+        migration_status()
+    else:
+        migrate()
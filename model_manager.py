@@ -0,0 +1,67 @@
+# model_manager.py
+# Hot model swap. A ModelManager polls a cheap stamp of the active model
+# (active version id, serving variant and the newest model_classes row) and,
+# when an admin activates a model or changes its serving variant, loads and
+# warms up the new model in the background and swaps it into the running
+# DiseaseIdentification. Predictions already in flight finish on the model
+# they started with, so long-running sessions and inference_server.py pick
+# up a rollout without a restart.
+import os
+import threading
+from repositories import ModelVersionRepository
+
+POLL_SECONDS = float(os.environ.get('AGROEXPERT_MODEL_POLL_SECONDS', 10))
+
+
+def active_model_stamp():
+    """(version id, serving variant, newest class index) of the active model, or None."""
+    try:
+        return ModelVersionRepository().stamp()
+    except Exception as e:
+        print(f"Error reading active model version: {e}")
+        return None
+
+
+class ModelManager:
+    """Keeps a DiseaseIdentification on the active model version."""
+
+    def __init__(self, identifier, interval=POLL_SECONDS):
+        self.identifier = identifier
+        self.interval = interval
+        self.swaps = 0
+        # A stamp whose model failed to load is not retried until it changes
+        self._failed_stamp = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Swap in the active model if it changed since it was loaded. Returns True on a swap."""
+        loaded_stamp = self.identifier.current.stamp
+        if self.identifier.model is None or loaded_stamp is None:
+            # Nothing loaded yet; first use loads the active model anyway
+            return False
+        stamp = active_model_stamp()
+        if stamp is None or stamp == loaded_stamp or stamp == self._failed_stamp:
+            return False
+        if self.identifier.swap_model():
+            self.swaps += 1
+            self._failed_stamp = None
+            return True
+        self._failed_stamp = stamp
+        return False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='model-manager', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
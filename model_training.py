@@ -164,3 +164,12 @@ class ModelTrainer:
             
         self.model.save(model_path)
         return model_path
+
+    def export_tflite_variants(self, model_path, model_version_id):
+        """
+        Export float16 and int8 TFLite variants of the saved model, calibrated
+        on the training data, and record their latency and accuracy.
+        """
+        import tflite_models
+        return tflite_models.export_variants(self.model, model_path, model_version_id,
+                                             self.train_ds, self.test_ds)
@@ -1,5 +1,6 @@
 # news_updates.py
 from db import create_connection
+import timeutil
 
 class NewsUpdates:
     def display_news_for_user(self):
@@ -18,7 +19,7 @@ class NewsUpdates:
                 for item in news_items:
                     print(f"\nTitle: {item[0]}")
                     print(f"Content: {item[1]}")
-                    print(f"Date: {item[2]}")
+                    print(f"Date: {timeutil.format_timestamp(item[2])}")
                     print("-" * 50)
             finally:
                 conn.close()
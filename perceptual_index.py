@@ -0,0 +1,150 @@
+# perceptual_index.py
+# Near-duplicate lookup for the prediction cache. A recompressed, resized or
+# slightly cropped copy of an earlier photo has different bytes but nearly
+# the same 64-bit difference hash (dHash), so its earlier prediction can be
+# returned without running the model. Hashes of cached predictions are kept
+# in a BK-tree per model version, loaded from prediction_cache on first use
+# and updated as predictions are stored.
+import os
+import threading
+from lazy_imports import lazy_import
+from repositories import PredictionCacheRepository
+
+Image = lazy_import('PIL.Image')
+ImageOps = lazy_import('PIL.ImageOps')
+np = lazy_import('numpy')
+
+HASH_SIZE = 8   # 8x8 gradient bits -> 64-bit hash
+# Largest Hamming distance (of 64 bits) still treated as the same photo
+MAX_DISTANCE = int(os.environ.get('AGROEXPERT_PHASH_DISTANCE', 4))
+_SIGN_BIT = 1 << 63
+
+
+def dhash(image_path, hash_size=HASH_SIZE):
+    """Difference hash: whether each pixel is brighter than its right neighbour on a tiny greyscale copy."""
+    with Image.open(image_path) as image:
+        # Only the coarsest JPEG scale is needed for a 9x8 thumbnail
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(image).convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_phash(image_path):
+    """dHash of an image, or None if it cannot be computed."""
+    try:
+        return dhash(image_path)
+    except Exception:
+        return None
+
+
+def to_signed(phash):
+    # SQLite integers are signed 64-bit
+    return phash - (1 << 64) if phash >= _SIGN_BIT else phash
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance. Each child edge is labelled
+    with its distance to the parent, so a search within d only descends into
+    edges labelled within d of the query's distance to the node.
+    """
+
+    def __init__(self):
+        self.root = None   # [hash, values, {distance: child}]
+        self.size = 0
+
+    def add(self, phash, value):
+        self.size += 1
+        if self.root is None:
+            self.root = [phash, [value], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(phash, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, [value], {}]
+                return
+            node = child
+
+    def search(self, phash, max_distance):
+        """(distance, value) pairs within max_distance, closest first."""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(phash, node[0])
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in node[2].items() if low <= edge <= high)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class PerceptualIndex:
+    """BK-tree of cached image hashes (SHA-256) for one model version at a time."""
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.model_version_id = None
+        self.tree = BKTree()
+        self._lock = threading.Lock()
+
+    def _ensure_version(self, model_version_id):
+        if model_version_id != self.model_version_id:
+            tree = BKTree()
+            for digest, phash in PredictionCacheRepository().phashes(model_version_id):
+                tree.add(to_unsigned(phash), digest)
+            self.tree, self.model_version_id = tree, model_version_id
+
+    def nearest(self, phash, model_version_id):
+        """Image hashes of cached predictions within max_distance, closest first."""
+        if phash is None or model_version_id is None:
+            return []
+        with self._lock:
+            self._ensure_version(model_version_id)
+            return [digest for _, digest in self.tree.search(phash, self.max_distance)]
+
+    def add(self, phash, model_version_id, digest):
+        if phash is None or model_version_id is None:
+            return
+        with self._lock:
+            # Entries for another version are loaded from the table when that version is used
+            if model_version_id == self.model_version_id:
+                self.tree.add(phash, digest)
+
+    def reset(self):
+        with self._lock:
+            self.model_version_id = None
+            self.tree = BKTree()
+
+
+_index = PerceptualIndex()
+
+
+def nearest(phash, model_version_id):
+    return _index.nearest(phash, model_version_id)
+
+
+def add(phash, model_version_id, digest):
+    _index.add(phash, model_version_id, digest)
+
+
+def reset():
+    _index.reset()
@@ -0,0 +1,100 @@
+# prediction_cache.py
+# Persistent prediction cache keyed by the SHA-256 of the image bytes and the
+# model version that produced the prediction. A repeat submission of the same
+# photo (e.g. uploaded for diagnosis and then attached to a consultation)
+# skips decode and inference. Bounded by least-recently-used eviction and
+# cleared whenever an admin activates a model. Entries keep the top-k classes
+# of each prediction, not the full probability vector. Near-duplicates (the
+# same photo recompressed or resized) are found through perceptual_index.py.
+import hashlib
+import json
+import os
+import predictions
+import perceptual_index
+from repositories import PredictionCacheRepository, ModelVersionRepository
+
+MAX_ENTRIES = int(os.environ.get('AGROEXPERT_PREDICTION_CACHE_SIZE', 10000))
+# Eviction is checked every EVICT_EVERY stores instead of counting rows on each one
+EVICT_EVERY = 64
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_stores_since_evict = 0
+
+
+def image_hash(image_path):
+    """SHA-256 hex digest of the file contents."""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def active_model_version_id():
+    version = ModelVersionRepository().active()
+    return version.id if version else None
+
+
+def lookup(digest, model_version_id):
+    """Return the cached prediction dict, or None on a miss."""
+    if model_version_id is None:
+        return None
+    entry = PredictionCacheRepository().get(digest, model_version_id)
+    if entry is None:
+        return None
+    return _use_entry(entry)
+
+
+def lookup_similar(phash, model_version_id):
+    """Return the cached prediction of a near-duplicate image (see perceptual_index.py), or None."""
+    repository = PredictionCacheRepository()
+    for similar_digest in perceptual_index.nearest(phash, model_version_id):
+        # The index can hold entries evicted from the table since it was loaded
+        entry = repository.get(similar_digest, model_version_id)
+        if entry is not None:
+            return _use_entry(entry)
+    return None
+
+
+def _use_entry(entry):
+    PredictionCacheRepository().touch(entry.id)
+    stored = json.loads(entry.all_predictions) if entry.all_predictions else {}
+    return {
+        "name": entry.disease_name,
+        "confidence": entry.confidence,
+        "top_k": [tuple(pair) for pair in predictions.top_k_from_dict(stored)],
+    }
+
+
+def store(digest, model_version_id, prediction, phash=None, max_entries=MAX_ENTRIES):
+    global _stores_since_evict
+    if model_version_id is None:
+        return
+    repository = PredictionCacheRepository()
+    try:
+        repository.put(digest, model_version_id, prediction['name'], prediction['confidence'],
+                       json.dumps(dict(prediction.get('top_k', ()))),
+                       perceptual_index.to_signed(phash) if phash is not None else None)
+        perceptual_index.add(phash, model_version_id, digest)
+        _stores_since_evict += 1
+        if _stores_since_evict >= EVICT_EVERY:
+            _stores_since_evict = 0
+            evict(max_entries)
+    except Exception as e:
+        # The cache is an optimisation; a failed store must not fail the diagnosis
+        print(f"Error storing cached prediction: {e}")
+
+
+def evict(max_entries=MAX_ENTRIES):
+    """Drop least-recently-used entries beyond max_entries."""
+    repository = PredictionCacheRepository()
+    excess = repository.count() - max_entries
+    if excess > 0:
+        repository.evict_oldest(excess)
+    return max(excess, 0)
+
+
+def invalidate():
+    """Forget every cached prediction, e.g. after the active model or its classes change."""
+    PredictionCacheRepository().clear()
+    perceptual_index.reset()
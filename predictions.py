@@ -0,0 +1,71 @@
+# predictions.py
+# Turning model output into prediction results. The top-k classes come from
+# np.argpartition over the whole batch at once, so the cost per image no
+# longer grows with a dict and sort over every class; the per-class dict is
+# only built for callers that ask for it.
+import heapq
+from lazy_imports import lazy_import
+import embeddings
+
+np = lazy_import('numpy')
+
+TOP_K = 3
+
+
+def top_k_indices(scores, k=TOP_K):
+    """
+    Indices of the k highest scores in each row of a (batch, classes) array,
+    highest first.
+    """
+    scores = np.asarray(scores)
+    k = min(k, scores.shape[-1])
+    if k < scores.shape[-1]:
+        indices = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        indices = np.broadcast_to(np.arange(k), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, indices, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(indices, order, axis=-1)
+
+
+class Prediction(dict):
+    """
+    Prediction result: a dict with "name", "confidence" and "top_k" (a list of
+    (class name, confidence) pairs, highest first). The full probability
+    vector is kept as .probabilities; prediction["all_predictions"] builds
+    the per-class dict on first access. .embedding is the image embedding
+    (see embeddings.py), or None if the model does not provide one.
+    """
+
+    def __init__(self, classes, probabilities, top_indices, embedding=None):
+        self.classes = classes
+        self.probabilities = probabilities
+        self.embedding = embedding
+        top_k = [(classes[i], float(probabilities[i])) for i in top_indices]
+        super().__init__(name=top_k[0][0], confidence=top_k[0][1], top_k=top_k)
+
+    def __missing__(self, key):
+        if key != 'all_predictions':
+            raise KeyError(key)
+        value = dict(zip(self.classes, self.probabilities.tolist()))
+        self[key] = value
+        return value
+
+
+def from_scores(classes, scores, k=TOP_K, features=None):
+    """Prediction for one row of model output (and its penultimate-layer features, if any)."""
+    scores = np.asarray(scores)
+    embedding = embeddings.normalise(features) if features is not None else None
+    return Prediction(classes, scores, top_k_indices(scores[np.newaxis], k)[0], embedding)
+
+
+def from_batch(classes, scores, k=TOP_K, features=None):
+    """Predictions for every row of a (batch, classes) array, with one top-k pass."""
+    scores = np.asarray(scores)
+    batch_embeddings = embeddings.normalise(features) if features is not None else [None] * len(scores)
+    return [Prediction(classes, row, indices, embedding)
+            for row, indices, embedding in zip(scores, top_k_indices(scores, k), batch_embeddings)]
+
+
+def top_k_from_dict(all_predictions, k=TOP_K):
+    """Top-k pairs from a {class name: confidence} dict, e.g. one stored in the cache."""
+    return heapq.nlargest(k, all_predictions.items(), key=lambda item: item[1])
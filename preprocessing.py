@@ -0,0 +1,128 @@
+# preprocessing.py
+# Image decoding for inference. Phone photos are 12 MP or more, and decoding
+# every pixel only to throw most of them away in resize() used to cost more
+# than the forward pass. JPEGs are decoded at reduced scale with draft mode
+# (the decoder skips DCT coefficients, 1/2 to 1/8 scale), then rotated per
+# EXIF orientation, normalised to RGB and resized straight into a
+# preallocated uint8 batch buffer.
+#
+#   python preprocessing.py [image_dir] [repeats]   # decode benchmark
+import glob
+import os
+import statistics
+import sys
+import time
+from lazy_imports import lazy_import
+
+Image = lazy_import('PIL.Image')
+ImageOps = lazy_import('PIL.ImageOps')
+np = lazy_import('numpy')
+
+IMAGE_SIZE = (224, 224)
+# Draft mode never decodes below this multiple of the target size, so the
+# final resize still has enough pixels to antialias from
+DRAFT_OVERSAMPLE = 2
+BACKGROUND = (255, 255, 255)   # transparent pixels are flattened onto white
+
+
+def allocate_batch(batch_size, size=IMAGE_SIZE):
+    """Zeroed uint8 buffer of shape (batch_size, height, width, 3)."""
+    return np.zeros((batch_size, size[1], size[0], 3), dtype=np.uint8)
+
+
+def to_rgb(image):
+    """Convert any PIL mode (greyscale, palette, CMYK, RGBA...) to RGB."""
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, BACKGROUND)
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def load_image(image_path, size=IMAGE_SIZE, timings=None):
+    """
+    Decode, orient and resize one image to an RGB PIL image of the given size.
+
+    If timings (an inference_metrics.Timings) is given, the 'decode' and
+    'resize' stages are added to it.
+    """
+    return _load(image_path, size, timings)[0]
+
+
+def _load(image_path, size, timings):
+    # Also returns the original (width, height), before draft mode shrinks it
+    start = time.perf_counter()
+    with Image.open(image_path) as image:
+        source_size = image.size
+        if image.format == 'JPEG':
+            # Decode at the smallest scale that is still >= DRAFT_OVERSAMPLE * size
+            image.draft('RGB', (size[0] * DRAFT_OVERSAMPLE, size[1] * DRAFT_OVERSAMPLE))
+        image.load()
+        decoded = time.perf_counter()
+        image = ImageOps.exif_transpose(image)
+        image = to_rgb(image)
+        image = image.resize(size, Image.BILINEAR, reducing_gap=DRAFT_OVERSAMPLE)
+    if timings is not None:
+        timings.add('decode', (decoded - start) * 1000)
+        timings.add('resize', (time.perf_counter() - decoded) * 1000)
+    return image, source_size
+
+
+def decode(image_path, size=IMAGE_SIZE, timings=None):
+    """One image as a (height, width, 3) uint8 array."""
+    return np.asarray(load_image(image_path, size, timings))
+
+
+def decode_into(image_path, out, timings=None):
+    """Decode one image into a row of a buffer from allocate_batch(); returns its original (width, height)."""
+    image, source_size = _load(image_path, (out.shape[1], out.shape[0]), timings)
+    out[...] = image
+    return source_size
+
+
+# --- Benchmark -------------------------------------------------------------
+def _baseline_decode(image_path, size=IMAGE_SIZE):
+    # The decode path img_to_pred() used before this module
+    return np.asarray(Image.open(image_path).resize(size))
+
+
+def benchmark(image_dir='test_images', repeats=5):
+    """Return {image: (baseline_ms, fast_ms)} using the median of repeats decodes."""
+    paths = sorted(p for p in glob.glob(os.path.join(image_dir, '*'))
+                   if os.path.splitext(p)[1].lower() in ('.jpg', '.jpeg', '.png'))
+    buffer = allocate_batch(1)
+    results = {}
+    for path in paths:
+        timings = {'baseline': [], 'fast': []}
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _baseline_decode(path)
+            timings['baseline'].append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            decode_into(path, buffer[0])
+            timings['fast'].append((time.perf_counter() - start) * 1000)
+        results[path] = (statistics.median(timings['baseline']), statistics.median(timings['fast']))
+    return results
+
+
+def print_report(results):
+    print("\n=== Image decode + resize (median ms) ===")
+    for path, (baseline_ms, fast_ms) in results.items():
+        with Image.open(path) as image:
+            width, height = image.size
+        print(f"{os.path.basename(path):<20} {width}x{height:<6} baseline: {baseline_ms:8.1f}  "
+              f"draft: {fast_ms:8.1f}  speedup: {baseline_ms / fast_ms:5.1f}x")
+    if results:
+        baseline_total = sum(b for b, _ in results.values())
+        fast_total = sum(f for _, f in results.values())
+        print(f"{'total':<20} {'':<11} baseline: {baseline_total:8.1f}  draft: {fast_total:8.1f}  "
+              f"speedup: {baseline_total / fast_total:5.1f}x")
+
+
+if __name__ == "__main__":
+    image_dir = sys.argv[1] if len(sys.argv) > 1 else 'test_images'
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print_report(benchmark(image_dir, repeats))
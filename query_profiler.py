@@ -0,0 +1,266 @@
+# query_profiler.py
+# Per-statement timing for every query run through db.create_connection().
+# Enable with AGROEXPERT_QUERY_PROFILE=1 or enable_profiling(); statements
+# slower than the threshold are appended to the slow-query log.
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DEFAULT_SLOW_MS = float(os.environ.get('AGROEXPERT_SLOW_QUERY_MS', 100))
+DEFAULT_SLOW_LOG = os.environ.get('AGROEXPERT_SLOW_QUERY_LOG', 'data/slow_queries.log')
+DEFAULT_PROFILE_DUMP = 'data/query_profile.json'
+
+# Latency samples kept per statement for the percentile estimates
+MAX_SAMPLES = 2048
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and replace literals with '?' so equal statements group together."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class StatementStats:
+    __slots__ = ('sql', 'calls', 'total_ms', 'max_ms', 'rows', 'samples')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, elapsed_ms, rows):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.samples.append(elapsed_ms)
+
+    def as_dict(self):
+        ordered = sorted(self.samples)
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 3),
+            'p50_ms': round(percentile(ordered, 0.50), 3),
+            'p99_ms': round(percentile(ordered, 0.99), 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+        }
+
+
+class QueryProfiler:
+    def __init__(self, slow_ms=DEFAULT_SLOW_MS, slow_log_path=DEFAULT_SLOW_LOG):
+        self.slow_ms = slow_ms
+        self.slow_log_path = slow_log_path
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, cursor):
+        return InstrumentedCursor(self, cursor)
+
+    def record(self, sql, elapsed_ms, rows):
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(key)
+            stats.add(elapsed_ms, rows)
+        if self.slow_log_path and elapsed_ms >= self.slow_ms:
+            self._log_slow(key, elapsed_ms, rows)
+
+    def _log_slow(self, sql, elapsed_ms, rows):
+        try:
+            directory = os.path.dirname(self.slow_log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.slow_log_path, 'a') as log:
+                log.write(f"{datetime.now().isoformat(timespec='seconds')}\t{elapsed_ms:.2f} ms\t"
+                          f"rows={rows}\t{sql}\n")
+        except OSError as e:
+            print(f"Error writing slow query log: {e}")
+
+    def snapshot(self):
+        """Return the per-statement statistics as a list of dicts."""
+        with self._lock:
+            return [stats.as_dict() for stats in self._stats.values()]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def dump(self, path=DEFAULT_PROFILE_DUMP):
+        """Write the statistics to a JSON file for the report command."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'generated_at': datetime.now().isoformat(timespec='seconds'),
+                       'statements': self.snapshot()}, f, indent=2)
+
+
+class InstrumentedCursor:
+    """
+    Cursor wrapper that times execute() together with the fetches that follow it.
+
+    SQLite produces rows lazily, so the cost of a SELECT is only known once
+    its rows have been fetched; each execution is recorded when the next
+    statement starts or the cursor is closed/discarded.
+    """
+
+    def __init__(self, profiler, cursor):
+        self._profiler = profiler
+        self._cursor = cursor
+        self._sql = None
+        self._elapsed_ms = 0.0
+        self._rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    @property
+    def row_factory(self):
+        return self._cursor.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory):
+        self._cursor.row_factory = factory
+
+    def _flush(self):
+        if self._sql is not None:
+            self._profiler.record(self._sql, self._elapsed_ms, self._rows)
+            self._sql = None
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed_ms += (time.perf_counter() - start) * 1000
+
+    def execute(self, sql, parameters=()):
+        self._flush()
+        self._sql, self._elapsed_ms, self._rows = sql, 0.0, 0
+        self._timed(self._cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._flush()
+        self._sql, self._elapsed_ms, self._rows = sql, 0.0, 0
+        self._timed(self._cursor.executemany, sql, seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(self._cursor.fetchmany, size or self._cursor.arraysize)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
+
+    def __del__(self):
+        try:
+            self._flush()
+        except Exception:
+            pass
+
+
+_profiler = None
+
+
+def get_profiler():
+    """Return the active QueryProfiler, or None when profiling is disabled."""
+    return _profiler
+
+
+def enable_profiling(slow_ms=DEFAULT_SLOW_MS, slow_log_path=DEFAULT_SLOW_LOG, dump_path=DEFAULT_PROFILE_DUMP):
+    """Start profiling; statistics are written to dump_path when the process exits."""
+    global _profiler
+    _profiler = QueryProfiler(slow_ms, slow_log_path)
+    if dump_path:
+        atexit.register(_dump_at_exit, _profiler, dump_path)
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    _profiler = None
+
+
+def _dump_at_exit(profiler, path):
+    try:
+        profiler.dump(path)
+    except OSError as e:
+        print(f"Error writing query profile: {e}")
+
+
+def top_statements(statements, top=10, sort_by='total_ms'):
+    return sorted(statements, key=lambda s: s[sort_by], reverse=True)[:top]
+
+
+def print_report(statements=None, top=10, sort_by='total_ms'):
+    """Print the most expensive statements (in-process stats by default)."""
+    if statements is None:
+        statements = _profiler.snapshot() if _profiler else []
+    if not statements:
+        print("No query statistics recorded.")
+        return
+    print(f"\n=== Top {top} statements by {sort_by} ===")
+    for s in top_statements(statements, top, sort_by):
+        print(f"\n{s['sql'][:120]}")
+        print(f"  calls: {s['calls']}  total: {s['total_ms']:.2f} ms  "
+              f"p50: {s['p50_ms']:.2f} ms  p99: {s['p99_ms']:.2f} ms  rows: {s['rows']}")
+
+
+if os.environ.get('AGROEXPERT_QUERY_PROFILE') == '1':
+    enable_profiling()
+
+
+if __name__ == "__main__":
+    # python query_profiler.py [profile.json] [total_ms|p99_ms|calls]
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PROFILE_DUMP
+    sort_by = sys.argv[2] if len(sys.argv) > 2 else 'total_ms'
+    if not os.path.exists(path):
+        print(f"No query profile found at {path}. Run with AGROEXPERT_QUERY_PROFILE=1 first.")
+    else:
+        with open(path) as f:
+            print_report(json.load(f)['statements'], sort_by=sort_by)
@@ -0,0 +1,532 @@
+# repositories.py
+# Data-access layer: one repository per table, returning compact named-tuple
+# rows instead of positional tuples. SQL lives in module-level constants so
+# the exact same statement text is reused and hits sqlite3's statement cache.
+from collections import namedtuple
+import db
+import timeutil
+
+# Rows fetched per round trip by the streaming iterators
+STREAM_BATCH_SIZE = 500
+
+# --- Row types -------------------------------------------------------------
+UserRow = namedtuple('UserRow', ['id', 'username', 'role', 'email', 'status'])
+PendingExpertRow = namedtuple('PendingExpertRow', ['id', 'username', 'email'])
+ConsultationRow = namedtuple('ConsultationRow', ['id', 'description', 'status', 'created_at'])
+PendingConsultationRow = namedtuple('PendingConsultationRow', [
+    'id', 'username', 'description', 'image_path', 'created_at',
+    'plant_name', 'symptoms', 'region', 'date_noticed', 'treatments'])
+RewardTransactionRow = namedtuple('RewardTransactionRow', ['action', 'points', 'description', 'transaction_date'])
+CouponRow = namedtuple('CouponRow', ['id', 'code', 'value', 'expiration_date', 'is_active'])
+AlertRow = namedtuple('AlertRow', ['id', 'disease_name', 'affected_crop', 'region', 'description', 'created_at'])
+FarmerAlertRow = namedtuple('FarmerAlertRow', [
+    'disease_name', 'affected_crop', 'region', 'description', 'notified_at', 'notification_id'])
+ModelVersionRow = namedtuple('ModelVersionRow', [
+    'id', 'version_number', 'accuracy', 'total_classes', 'training_date',
+    'description', 'is_active', 'model_path'])
+CountRow = namedtuple('CountRow', ['key', 'count'])
+CaseRow = namedtuple('CaseRow', [
+    'image_hash', 'image_path', 'disease_name', 'consultation_id', 'description', 'expert_response'])
+CachedPredictionRow = namedtuple('CachedPredictionRow', ['id', 'disease_name', 'confidence', 'all_predictions'])
+ModelVariantRow = namedtuple('ModelVariantRow', [
+    'id', 'model_version_id', 'variant', 'model_path', 'size_bytes', 'latency_ms', 'accuracy'])
+
+
+def row_factory(row_type):
+    """sqlite3 row factory that builds row_type directly from the result tuple."""
+    make = row_type._make
+    return lambda cursor, row: make(row)
+
+
+class Repository:
+    """
+    Base class for the table repositories.
+
+    A repository either borrows a connection passed in by the caller (and
+    leaves it open) or checks one out of the pool for every call.
+    """
+
+    def __init__(self, conn=None):
+        self.conn = conn
+
+    def _acquire(self):
+        return self.conn if self.conn is not None else db.create_connection()
+
+    def _release(self, conn):
+        if conn is not None and conn is not self.conn:
+            conn.close()
+
+    def _cursor(self, conn, row_type):
+        cursor = conn.cursor()
+        if row_type is not None:
+            cursor.row_factory = row_factory(row_type)
+        return cursor
+
+    def fetch_all(self, sql, params=(), row_type=None):
+        conn = self._acquire()
+        if conn is None:
+            return []
+        try:
+            cursor = self._cursor(conn, row_type)
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            self._release(conn)
+
+    def fetch_one(self, sql, params=(), row_type=None):
+        conn = self._acquire()
+        if conn is None:
+            return None
+        try:
+            cursor = self._cursor(conn, row_type)
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+        finally:
+            self._release(conn)
+
+    def stream(self, sql, params=(), row_type=None, batch_size=STREAM_BATCH_SIZE):
+        """Yield rows in batches of batch_size without materializing the full result."""
+        conn = self._acquire()
+        if conn is None:
+            return
+        try:
+            cursor = self._cursor(conn, row_type)
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            self._release(conn)
+
+    def execute(self, sql, params=()):
+        """Run a write statement in its own transaction and return the cursor."""
+        conn = self._acquire()
+        if conn is None:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            conn.commit()
+            return cursor
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+
+# --- Users -----------------------------------------------------------------
+SQL_USERS_ALL = '''
+    SELECT id, username, role, email, status
+    FROM users
+    ORDER BY role, username
+'''
+SQL_USERS_PENDING_EXPERTS = '''
+    SELECT id, username, email
+    FROM users
+    WHERE role = 'expert' AND status = 'pending'
+'''
+SQL_USERS_COUNT_BY_ROLE = 'SELECT role, COUNT(*) FROM users GROUP BY role'
+SQL_USER_BY_ID = 'SELECT id, username, role, email, status FROM users WHERE id = ?'
+
+
+class UserRepository(Repository):
+    def iter_all(self):
+        return self.stream(SQL_USERS_ALL, row_type=UserRow)
+
+    def get(self, user_id):
+        return self.fetch_one(SQL_USER_BY_ID, (user_id,), UserRow)
+
+    def pending_experts(self):
+        return self.fetch_all(SQL_USERS_PENDING_EXPERTS, row_type=PendingExpertRow)
+
+    def counts_by_role(self):
+        return self.fetch_all(SQL_USERS_COUNT_BY_ROLE, row_type=CountRow)
+
+
+# --- Consultations ---------------------------------------------------------
+SQL_CONSULTATIONS_FOR_FARMER = '''
+    SELECT id, description, status, created_at
+    FROM consultations
+    WHERE farmer_id = ?
+    ORDER BY created_at DESC
+'''
+SQL_CONSULTATIONS_PENDING = '''
+    SELECT c.id, u.username, c.description, c.image_path, c.created_at,
+        c.plant_name, c.symptoms, c.region, c.date_noticed, c.treatments
+    FROM consultations c
+    JOIN users u ON c.farmer_id = u.id
+    WHERE c.status = 'pending'
+    ORDER BY c.created_at
+'''
+SQL_CONSULTATIONS_PENDING_COUNT = "SELECT COUNT(*) FROM consultations WHERE status = 'pending'"
+SQL_CONSULTATIONS_COUNT_BY_STATUS = 'SELECT status, COUNT(*) FROM consultations GROUP BY status'
+SQL_CONSULTATION_RESPONSE = '''
+    SELECT expert_response
+    FROM consultation_responses
+    WHERE consultation_id = ?
+'''
+
+
+class ConsultationRepository(Repository):
+    def for_farmer(self, farmer_id):
+        return self.fetch_all(SQL_CONSULTATIONS_FOR_FARMER, (farmer_id,), ConsultationRow)
+
+    def pending(self):
+        return self.fetch_all(SQL_CONSULTATIONS_PENDING, row_type=PendingConsultationRow)
+
+    def pending_count(self):
+        return self.fetch_one(SQL_CONSULTATIONS_PENDING_COUNT)[0]
+
+    def counts_by_status(self):
+        return self.fetch_all(SQL_CONSULTATIONS_COUNT_BY_STATUS, row_type=CountRow)
+
+    def response_for(self, consultation_id):
+        row = self.fetch_one(SQL_CONSULTATION_RESPONSE, (consultation_id,))
+        return row[0] if row else None
+
+
+# --- Disease predictions ---------------------------------------------------
+SQL_PREDICTION_INSERT = '''
+    INSERT INTO disease_predictions
+    (user_id, image_path, disease_name, confidence)
+    VALUES (?, ?, ?, ?)
+'''
+SQL_PREDICTIONS_TOP_DISEASES = '''
+    SELECT disease_name, COUNT(*)
+    FROM disease_predictions
+    GROUP BY disease_name
+    ORDER BY COUNT(*) DESC
+    LIMIT ?
+'''
+
+
+class PredictionRepository(Repository):
+    def add(self, user_id, image_path, disease_name, confidence):
+        cursor = self.execute(SQL_PREDICTION_INSERT, (user_id, image_path, disease_name, confidence))
+        return cursor.lastrowid if cursor else None
+
+    def enqueue(self, user_id, image_path, disease_name, confidence):
+        """Queue the insert on the group-commit writer instead of committing now."""
+        db.enqueue_write(SQL_PREDICTION_INSERT, (user_id, image_path, disease_name, confidence))
+
+    def enqueue_many(self, rows):
+        """Queue (user_id, image_path, disease_name, confidence) rows; they commit as one batch."""
+        db.get_write_queue().submit_many(SQL_PREDICTION_INSERT, rows)
+
+    def top_diseases(self, limit=5):
+        # Predictions may still sit in the write queue, so flush it first
+        db.flush_writes()
+        return self.fetch_all(SQL_PREDICTIONS_TOP_DISEASES, (limit,), CountRow)
+
+
+# --- Image rejections ------------------------------------------------------
+SQL_IMAGE_REJECTION_INSERT = '''
+    INSERT INTO image_rejections (user_id, image_path, reason, value, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_IMAGE_REJECTIONS_BY_REASON = '''
+    SELECT reason, COUNT(*) AS count
+    FROM image_rejections
+    WHERE created_at >= ?
+    GROUP BY reason
+    ORDER BY count DESC
+'''
+
+
+class ImageRejectionRepository(Repository):
+    def enqueue(self, user_id, image_path, reason, value):
+        """Queue the insert on the group-commit writer instead of committing now."""
+        db.enqueue_write(SQL_IMAGE_REJECTION_INSERT, (user_id, image_path, reason, value, timeutil.now()))
+
+    def enqueue_many(self, rows):
+        """Queue (user_id, image_path, reason, value) rows; they commit as one batch."""
+        now = timeutil.now()
+        db.get_write_queue().submit_many(SQL_IMAGE_REJECTION_INSERT, [(*row, now) for row in rows])
+
+    def counts_by_reason(self, since):
+        db.flush_writes()
+        return self.fetch_all(SQL_IMAGE_REJECTIONS_BY_REASON, (since,), CountRow)
+
+
+# --- Case embeddings -------------------------------------------------------
+# A consultation about an image that was already diagnosed links the existing case
+SQL_CASE_EMBEDDING_PUT = '''
+    INSERT INTO case_embeddings
+    (model_version_id, image_hash, user_id, consultation_id, image_path, disease_name, embedding, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (model_version_id, image_hash) DO UPDATE SET
+        consultation_id = COALESCE(excluded.consultation_id, case_embeddings.consultation_id)
+'''
+SQL_CASE_EMBEDDING_GET = '''
+    SELECT disease_name, embedding
+    FROM case_embeddings
+    WHERE model_version_id = ? AND image_hash = ?
+'''
+SQL_CASE_EMBEDDINGS_FOR_VERSION = '''
+    SELECT image_hash, consultation_id IS NOT NULL, embedding
+    FROM case_embeddings
+    WHERE model_version_id = ?
+'''
+SQL_CASES_BY_HASH = '''
+    SELECT e.image_hash, e.image_path, e.disease_name, e.consultation_id, c.description,
+        (SELECT r.expert_response FROM consultation_responses r
+         WHERE r.consultation_id = e.consultation_id
+         ORDER BY r.created_at DESC LIMIT 1) AS expert_response
+    FROM case_embeddings e
+    LEFT JOIN consultations c ON c.id = e.consultation_id
+    WHERE e.model_version_id = ? AND e.image_hash IN ({placeholders})
+'''
+
+
+class CaseEmbeddingRepository(Repository):
+    def enqueue(self, model_version_id, image_hash, user_id, consultation_id, image_path, disease_name, embedding):
+        """Queue the insert on the group-commit writer; embedding is float16 bytes."""
+        db.enqueue_write(SQL_CASE_EMBEDDING_PUT, (model_version_id, image_hash, user_id, consultation_id,
+                                                  image_path, disease_name, embedding, timeutil.now()))
+
+    def enqueue_many(self, rows):
+        """Queue (model_version_id, image_hash, user_id, consultation_id, image_path, disease_name, embedding) rows."""
+        now = timeutil.now()
+        db.get_write_queue().submit_many(SQL_CASE_EMBEDDING_PUT, [(*row, now) for row in rows])
+
+    def get(self, model_version_id, image_hash):
+        """(disease name, float16 bytes) of a stored case, or None."""
+        db.flush_writes()
+        return self.fetch_one(SQL_CASE_EMBEDDING_GET, (model_version_id, image_hash))
+
+    def stream_for_version(self, model_version_id):
+        """(image hash, is consultation, float16 bytes) of every case for a model version."""
+        db.flush_writes()
+        return self.stream(SQL_CASE_EMBEDDINGS_FOR_VERSION, (model_version_id,))
+
+    def cases(self, model_version_id, image_hashes):
+        if not image_hashes:
+            return []
+        db.flush_writes()
+        sql = SQL_CASES_BY_HASH.format(placeholders=', '.join('?' * len(image_hashes)))
+        return self.fetch_all(sql, (model_version_id, *image_hashes), CaseRow)
+
+
+# --- Prediction cache ------------------------------------------------------
+SQL_PREDICTION_CACHE_GET = '''
+    SELECT id, disease_name, confidence, all_predictions
+    FROM prediction_cache
+    WHERE image_hash = ? AND model_version_id = ?
+'''
+SQL_PREDICTION_CACHE_TOUCH = 'UPDATE prediction_cache SET last_used_at = ? WHERE id = ?'
+SQL_PREDICTION_CACHE_PUT = '''
+    INSERT OR REPLACE INTO prediction_cache
+    (image_hash, model_version_id, disease_name, confidence, all_predictions, phash, created_at, last_used_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_PREDICTION_CACHE_PHASHES = '''
+    SELECT image_hash, phash
+    FROM prediction_cache
+    WHERE model_version_id = ? AND phash IS NOT NULL
+'''
+SQL_PREDICTION_CACHE_COUNT = 'SELECT COUNT(*) FROM prediction_cache'
+SQL_PREDICTION_CACHE_EVICT = '''
+    DELETE FROM prediction_cache
+    WHERE id IN (SELECT id FROM prediction_cache ORDER BY last_used_at LIMIT ?)
+'''
+SQL_PREDICTION_CACHE_CLEAR = 'DELETE FROM prediction_cache'
+
+
+class PredictionCacheRepository(Repository):
+    # Lookups do not flush the write queue: a diagnosis must not wait for a
+    # group commit, and missing an entry that is still queued costs one
+    # forward pass. count() and clear() flush, as they need every entry.
+    def get(self, image_hash, model_version_id):
+        return self.fetch_one(SQL_PREDICTION_CACHE_GET, (image_hash, model_version_id), CachedPredictionRow)
+
+    def phashes(self, model_version_id):
+        """(image hash, signed phash) of every entry for a model version."""
+        return self.stream(SQL_PREDICTION_CACHE_PHASHES, (model_version_id,))
+
+    def touch(self, entry_id):
+        """Mark an entry as recently used; queued, since LRU order need not be exact."""
+        db.enqueue_write(SQL_PREDICTION_CACHE_TOUCH, (timeutil.now(), entry_id), durable=False)
+
+    def put(self, image_hash, model_version_id, disease_name, confidence, all_predictions, phash=None):
+        """Insert or replace an entry; queued, and not spooled since the cache can be rebuilt."""
+        now = timeutil.now()
+        db.enqueue_write(SQL_PREDICTION_CACHE_PUT,
+                         (image_hash, model_version_id, disease_name, confidence, all_predictions,
+                          phash, now, now), durable=False)
+
+    def count(self):
+        db.flush_writes()
+        return self.fetch_one(SQL_PREDICTION_CACHE_COUNT)[0]
+
+    def evict_oldest(self, count):
+        self.execute(SQL_PREDICTION_CACHE_EVICT, (count,))
+
+    def clear(self):
+        db.flush_writes()
+        self.execute(SQL_PREDICTION_CACHE_CLEAR)
+
+
+# --- Rewards ---------------------------------------------------------------
+SQL_REWARD_POINTS = 'SELECT SUM(points) FROM rewards WHERE user_id = ?'
+SQL_REWARD_TRANSACTION_INSERT = '''
+    INSERT INTO reward_transactions
+    (user_id, action, points, description, transaction_date)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_REWARD_HISTORY = '''
+    SELECT action, points, description, transaction_date
+    FROM reward_transactions
+    WHERE user_id = ?
+    ORDER BY transaction_date DESC
+    LIMIT ?
+'''
+
+
+class RewardRepository(Repository):
+    def points(self, user_id):
+        row = self.fetch_one(SQL_REWARD_POINTS, (user_id,))
+        return row[0] if row else 0
+
+    def log_transaction(self, user_id, action, points, description):
+        """Queue a reward transaction on the group-commit writer, stamped with the current time."""
+        db.enqueue_write(SQL_REWARD_TRANSACTION_INSERT, (user_id, action, points, description, timeutil.now()))
+
+    def history(self, user_id, limit=10):
+        db.flush_writes()
+        return self.fetch_all(SQL_REWARD_HISTORY, (user_id, limit), RewardTransactionRow)
+
+
+# --- Coupons ---------------------------------------------------------------
+SQL_COUPONS_ALL = 'SELECT id, code, value, expiration_date, is_active FROM coupons'
+
+
+class CouponRepository(Repository):
+    def iter_all(self):
+        return self.stream(SQL_COUPONS_ALL, row_type=CouponRow)
+
+    def all(self):
+        return self.fetch_all(SQL_COUPONS_ALL, row_type=CouponRow)
+
+
+# --- Disease alerts --------------------------------------------------------
+SQL_ALERTS_ALL = '''
+    SELECT id, disease_name, affected_crop, region, description, created_at
+    FROM disease_alerts
+    ORDER BY created_at DESC
+'''
+SQL_ALERTS_SINCE = '''
+    SELECT id, disease_name, affected_crop, region, description, created_at
+    FROM disease_alerts
+    WHERE created_at >= ?
+    ORDER BY created_at DESC
+'''
+SQL_FARMER_NOTIFICATION_INSERT = '''
+    INSERT INTO farmer_notifications (user_id, alert_id, viewed)
+    VALUES (?, ?, 0)
+'''
+SQL_ALERTS_UNVIEWED_FOR_FARMER = '''
+    SELECT da.disease_name, da.affected_crop, da.region, da.description, fn.notified_at, fn.id
+    FROM farmer_notifications fn
+    JOIN disease_alerts da ON fn.alert_id = da.id
+    WHERE fn.user_id = ? AND fn.viewed = 0
+    ORDER BY fn.notified_at DESC
+'''
+
+
+class AlertRepository(Repository):
+    def iter_all(self):
+        return self.stream(SQL_ALERTS_ALL, row_type=AlertRow)
+
+    def since(self, epoch):
+        """Alerts created at or after the given epoch time, newest first."""
+        return self.fetch_all(SQL_ALERTS_SINCE, (epoch,), AlertRow)
+
+    def enqueue_notifications(self, alert_id, user_ids):
+        """Queue one unviewed notification per farmer on the group-commit writer."""
+        db.get_write_queue().submit_many(SQL_FARMER_NOTIFICATION_INSERT,
+                                         [(user_id, alert_id) for user_id in user_ids])
+
+    def unviewed_for_farmer(self, user_id):
+        db.flush_writes()
+        return self.fetch_all(SQL_ALERTS_UNVIEWED_FOR_FARMER, (user_id,), FarmerAlertRow)
+
+
+# --- Model versions --------------------------------------------------------
+SQL_MODEL_VERSIONS_ALL = '''
+    SELECT id, version_number, accuracy, total_classes,
+        training_date, description, is_active, model_path
+    FROM model_versions
+    ORDER BY training_date DESC
+'''
+# Changes whenever a model is activated, its serving variant changes or the
+# class list is rewritten (class_index is AUTOINCREMENT)
+SQL_MODEL_ACTIVE_STAMP = '''
+    SELECT id, serving_variant, (SELECT MAX(class_index) FROM model_classes)
+    FROM model_versions
+    WHERE is_active = 1
+    ORDER BY training_date DESC
+    LIMIT 1
+'''
+SQL_MODEL_VERSION_ACTIVE = '''
+    SELECT id, version_number, accuracy, total_classes,
+        training_date, description, is_active, model_path
+    FROM model_versions
+    WHERE is_active = 1
+    ORDER BY training_date DESC
+    LIMIT 1
+'''
+
+
+class ModelVersionRepository(Repository):
+    def all(self):
+        return self.fetch_all(SQL_MODEL_VERSIONS_ALL, row_type=ModelVersionRow)
+
+    def active(self):
+        return self.fetch_one(SQL_MODEL_VERSION_ACTIVE, row_type=ModelVersionRow)
+
+    def stamp(self):
+        row = self.fetch_one(SQL_MODEL_ACTIVE_STAMP)
+        return tuple(row) if row else None
+
+
+# --- Model variants --------------------------------------------------------
+SQL_MODEL_VARIANT_RECORD = '''
+    INSERT OR REPLACE INTO model_variants
+    (model_version_id, variant, model_path, size_bytes, latency_ms, accuracy, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_MODEL_VARIANTS_FOR_VERSION = '''
+    SELECT id, model_version_id, variant, model_path, size_bytes, latency_ms, accuracy
+    FROM model_variants
+    WHERE model_version_id = ?
+    ORDER BY latency_ms
+'''
+SQL_MODEL_VARIANT_GET = '''
+    SELECT id, model_version_id, variant, model_path, size_bytes, latency_ms, accuracy
+    FROM model_variants
+    WHERE model_version_id = ? AND variant = ?
+'''
+SQL_MODEL_SERVING_VARIANT_SET = 'UPDATE model_versions SET serving_variant = ? WHERE id = ?'
+SQL_MODEL_SERVING_VARIANT_GET = 'SELECT serving_variant FROM model_versions WHERE id = ?'
+
+
+class ModelVariantRepository(Repository):
+    def record(self, model_version_id, variant, model_path, size_bytes, latency_ms, accuracy):
+        self.execute(SQL_MODEL_VARIANT_RECORD, (model_version_id, variant, model_path, size_bytes,
+                                                latency_ms, accuracy, timeutil.now()))
+
+    def for_version(self, model_version_id):
+        return self.fetch_all(SQL_MODEL_VARIANTS_FOR_VERSION, (model_version_id,), ModelVariantRow)
+
+    def get(self, model_version_id, variant):
+        return self.fetch_one(SQL_MODEL_VARIANT_GET, (model_version_id, variant), ModelVariantRow)
+
+    def serving_variant(self, model_version_id):
+        row = self.fetch_one(SQL_MODEL_SERVING_VARIANT_GET, (model_version_id,))
+        return row[0] if row else None
+
+    def set_serving_variant(self, model_version_id, variant):
+        self.execute(SQL_MODEL_SERVING_VARIANT_SET, (variant, model_version_id))
@@ -1,6 +1,8 @@
 from db import create_connection
+from repositories import RewardRepository
 from gift_card import redeem_coupon
 from datetime import datetime
+import timeutil
 
 class RewardSystem:
     def __init__(self):
@@ -17,16 +19,7 @@ class RewardSystem:
         }
 
     def get_user_points(self, user_id):
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute('SELECT SUM(points) FROM rewards WHERE user_id = ?', (user_id,))
-                result = cursor.fetchone()
-                return result[0] if result else 0
-            finally:
-                conn.close()
-        return 0
+        return RewardRepository().points(user_id)
 
     def add_points(self, user_id, points):
         """
@@ -78,20 +71,9 @@ class RewardSystem:
         return False
 
     def log_reward_transaction(self, user_id, action, points, description):
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO reward_transactions 
-                    (user_id, action, points, description, transaction_date)
-                    VALUES (?, ?, ?, ?, datetime('now'))
-                ''', (user_id, action, points, description))
-                conn.commit()
-                return True
-            finally:
-                conn.close()
-        return False
+        # Group-committed by the background writer; history reads flush it first
+        RewardRepository().log_transaction(user_id, action, points, description)
+        return True
 
 class FarmerRewards(RewardSystem):
     def redeem_reward(self, farmer_id, points_to_redeem):
@@ -245,27 +227,14 @@ def display_rewards_menu(user_id, user_role):
             print("Invalid choice. Please try again.")
 
 def display_points_history(user_id):
-    conn = create_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT action, points, description, transaction_date 
-                FROM reward_transactions 
-                WHERE user_id = ? 
-                ORDER BY transaction_date DESC
-                LIMIT 10
-            ''', (user_id,))
-            transactions = cursor.fetchall()
-            
-            print("\n=== Recent Points History ===")
-            for trans in transactions:
-                print(f"\nAction: {trans[0]}")
-                print(f"Points: {trans[1]}")
-                print(f"Description: {trans[2]}")
-                print(f"Date: {trans[3]}")
-        finally:
-            conn.close()
+    transactions = RewardRepository().history(user_id, limit=10)
+
+    print("\n=== Recent Points History ===")
+    for trans in transactions:
+        print(f"\nAction: {trans.action}")
+        print(f"Points: {trans.points}")
+        print(f"Description: {trans.description}")
+        print(f"Date: {timeutil.format_timestamp(trans.transaction_date)}")
 
 def handle_point_redemption(user_id, rewards):
     current_points = rewards.get_user_points(user_id)
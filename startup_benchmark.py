@@ -0,0 +1,91 @@
+# startup_benchmark.py
+# Measures time-to-prompt for the CLI entry points in fresh interpreters:
+# everything that runs before the first input() call. Each run uses a
+# temporary copy of the database, so data/agroexpert.db is not modified.
+#
+#   python startup_benchmark.py [runs]
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('tensorflow', 'matplotlib', 'numpy', 'PIL')
+
+# name -> code run up to the point where the entry point would prompt
+ENTRY_POINTS = {
+    'main.py': 'import main; main.AgroExpert()',
+    'config.py': 'import config; config.initialize_system()',
+    'admin_functions.py': 'import admin_functions; admin_functions.AdminFunctions()',
+}
+
+_CHILD = '''
+import json, sys, time, io, contextlib
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    exec({code!r})
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed_ms,
+                   "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def run_once(code, database):
+    env = dict(os.environ, AGROEXPERT_DB=database)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', _CHILD.format(code=code, heavy=HEAVY_MODULES)],
+                            capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'failed')
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall_ms, measured['ms'], measured['heavy']
+
+
+def benchmark(runs=5, source_db='data/agroexpert.db'):
+    """Return {entry point: stats dict}, or an 'error' entry for ones that fail to start."""
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix='agroexpert_startup_')
+    try:
+        for name, code in ENTRY_POINTS.items():
+            walls, imports, heavy = [], [], []
+            try:
+                for i in range(runs):
+                    database = os.path.join(tmp_dir, f'{i}.db')
+                    if os.path.exists(source_db):
+                        shutil.copyfile(source_db, database)
+                    wall_ms, import_ms, heavy = run_once(code, database)
+                    walls.append(wall_ms)
+                    imports.append(import_ms)
+            except RuntimeError as e:
+                results[name] = {'error': str(e)}
+                continue
+            results[name] = {
+                'wall_median_ms': round(statistics.median(walls), 1),
+                'wall_min_ms': round(min(walls), 1),
+                'to_prompt_median_ms': round(statistics.median(imports), 1),
+                'heavy_modules_loaded': heavy,
+            }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def print_report(results):
+    print("\n=== Startup time (fresh interpreter, median) ===")
+    for name, stats in results.items():
+        if 'error' in stats:
+            print(f"{name:<20} FAILED: {stats['error']}")
+            continue
+        heavy = ', '.join(stats['heavy_modules_loaded']) or 'none'
+        print(f"{name:<20} to prompt: {stats['to_prompt_median_ms']:>8.1f} ms   "
+              f"process: {stats['wall_median_ms']:>8.1f} ms   heavy imports: {heavy}")
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print_report(benchmark(runs))
@@ -0,0 +1,46 @@
+# Shared pytest fixtures.
+# Every test runs against its own copy of a schema-only database, so tests
+# never touch data/agroexpert.db and can run in parallel workers.
+# Set AGROEXPERT_TEST_DB=memory to use shared-cache in-memory databases
+# instead of per-test temporary files.
+import os
+import sqlite3
+import uuid
+import pytest
+
+import db
+from migrations import migrate
+
+TEST_DB_MODE = os.environ.get('AGROEXPERT_TEST_DB', 'file')
+
+
+@pytest.fixture(scope="session")
+def schema_template():
+    """
+    Build the migrated schema once per session in memory.
+    """
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_database(schema_template, tmp_path):
+    """
+    Clone the schema template with the SQLite backup API and point
+    db.create_connection() at the clone for the duration of the test.
+    """
+    previous = db.DB_PATH
+    if TEST_DB_MODE == 'memory':
+        target = f"file:test_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    else:
+        target = str(tmp_path / "agroexpert.db")
+    database = db.configure_database(target)
+
+    clone = db.connect_raw(database)
+    schema_template.backup(clone)
+    clone.close()
+
+    yield database
+    db.configure_database(previous)
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
 from admin_functions import AdminFunctions
 from db import create_connection
 import sys
@@ -130,9 +130,9 @@ class TestAdminFunctions(unittest.TestCase):
                 mock_cursor.execute.assert_called_with(
                     '''
                     INSERT INTO news (title, content, created_at)
-                    VALUES (?, ?, datetime('now'))
+                    VALUES (?, ?, ?)
                     ''', 
-                    ("Test News", "Content Line 1\nContent Line 2")
+                    ("Test News", "Content Line 1\nContent Line 2", ANY)
                 )
                 mock_print.assert_any_call("News added successfully!")
 
@@ -0,0 +1,65 @@
+# Tests for the read-only analytics replica in analytics.py
+import sqlite3
+import pytest
+
+import analytics
+import db
+
+
+def _add_news(title):
+    conn = db.create_connection()
+    conn.execute("INSERT INTO news (title) VALUES (?)", (title,))
+    conn.commit()
+    conn.close()
+
+
+def _news_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+
+
+@pytest.fixture
+def replica_required(isolated_database):
+    if analytics.replica_path() is None:
+        pytest.skip("in-memory databases are reported on directly")
+
+
+def test_replica_is_read_only(replica_required):
+    conn = analytics.connect_replica()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO news (title) VALUES ('x')")
+    finally:
+        conn.close()
+
+
+def test_replica_refreshes_when_invalidated(replica_required):
+    _add_news("first")
+    conn = analytics.connect_replica()
+    assert _news_count(conn) == 1
+    conn.close()
+
+    _add_news("second")
+    conn = analytics.connect_replica()
+    assert _news_count(conn) == 1  # still the earlier snapshot
+    conn.close()
+
+    analytics.invalidate_snapshot()
+    conn = analytics.connect_replica()
+    assert _news_count(conn) == 2
+    conn.close()
+
+
+def test_user_list_shows_users_added_after_the_snapshot(replica_required, capsys):
+    from admin_functions import AdminFunctions
+    conn = analytics.connect_replica()
+    conn.close()
+    # Registered from another session, which cannot invalidate this process's snapshot
+    conn = db.create_connection()
+    conn.execute("INSERT INTO users (username, password, role, email, status) "
+                 "VALUES ('newfarmer', 'x', 'farmer', 'n@test.com', 'active')")
+    conn.commit()
+    conn.close()
+
+    AdminFunctions().view_all_users()
+
+    assert "Username: newfarmer" in capsys.readouterr().out
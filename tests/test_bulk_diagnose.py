@@ -0,0 +1,78 @@
+# Tests for folder diagnosis with checkpoint/resume in bulk_diagnose.py
+import csv
+import json
+
+import pytest
+
+import bulk_diagnose
+
+
+class FakeIdentifier:
+    """Diagnoses by file name; optionally fails after a number of images."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.seen = []
+
+    def verify_model_loaded(self):
+        return True
+
+    def process_images(self, image_paths, user_id, batch_size):
+        for image_path in image_paths:
+            if self.fail_after is not None and len(self.seen) == self.fail_after:
+                raise KeyboardInterrupt
+            self.seen.append(image_path)
+            if image_path.endswith("bad.png"):
+                yield image_path, {"error": "Error preprocessing image"}
+            else:
+                yield image_path, {"name": "Tomato___healthy", "confidence": 0.9,
+                                   "top_k": [("Tomato___healthy", 0.9)]}
+
+
+@pytest.fixture
+def survey(tmp_path):
+    folder = tmp_path / "survey"
+    for sub in ("field_b", "field_a"):
+        (folder / sub).mkdir(parents=True)
+        for i in range(3):
+            (folder / sub / f"leaf{i}.jpg").write_bytes(b"x")
+    (folder / "field_a" / "bad.png").write_bytes(b"x")
+    (folder / "field_a" / "notes.txt").write_text("not an image")
+    return str(folder)
+
+
+def test_images_are_walked_in_sorted_order(survey):
+    names = [path.split("survey")[1] for path in bulk_diagnose.iter_images(survey)]
+    assert len(names) == 7
+    assert names == sorted(names)
+
+
+def test_interrupted_run_resumes_without_repeating_committed_batches(survey, tmp_path):
+    output = str(tmp_path / "results.csv")
+    with pytest.raises(KeyboardInterrupt):
+        bulk_diagnose.diagnose_folder(survey, 1, output, batch_size=2, identifier=FakeIdentifier(fail_after=5))
+
+    identifier = FakeIdentifier()
+    processed, failed, skipped = bulk_diagnose.diagnose_folder(survey, 1, output, batch_size=2,
+                                                               identifier=identifier)
+
+    # Two full batches (4 images) were committed before the interruption
+    assert skipped == 4 and processed == 3
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len({row['image_path'] for row in rows}) == 7
+    assert sum(1 for row in rows if row['error']) == 1
+
+
+def test_jsonl_output_and_no_resume(survey, tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    bulk_diagnose.diagnose_folder(survey, 1, output, batch_size=4, identifier=FakeIdentifier())
+    processed, failed, skipped = bulk_diagnose.diagnose_folder(survey, 1, output, resume=False, batch_size=4,
+                                                               identifier=FakeIdentifier())
+
+    assert (processed, failed, skipped) == (7, 1, 0)
+    with open(output) as f:
+        rows = [json.loads(line) for line in f]
+    assert len(rows) == 7
+    assert rows[0] == {"image_path": rows[0]["image_path"], "error": "Error preprocessing image"}
+    assert rows[1]['top_k'] == [["Tomato___healthy", 0.9]]
@@ -0,0 +1,182 @@
+# Tests for similar-case search in case_index.py
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import db
+import case_index
+import embeddings
+from case_index import EmbeddingIndex
+from repositories import CaseEmbeddingRepository
+
+
+def _key(i):
+    return f"{i:064x}"
+
+
+def _clustered(n, dim=64, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    points = centres[rng.integers(0, clusters, n)] + 0.1 * rng.standard_normal((n, dim)).astype(np.float32)
+    return embeddings.normalise(points)
+
+
+def test_exact_search_returns_nearest_first():
+    vectors = _clustered(500)
+    index = EmbeddingIndex()
+    index.add([_key(i) for i in range(500)], vectors)
+
+    found = index.search(vectors[42], k=3)
+
+    assert index.centroids is None
+    assert found[0][1] == _key(42)
+    assert found[0][0] == pytest.approx(1.0, abs=1e-2)
+    assert [s for s, _ in found] == sorted((s for s, _ in found), reverse=True)
+
+
+def test_ivf_search_agrees_with_exact_search():
+    vectors = _clustered(4500)
+    keys = [_key(i) for i in range(4500)]
+    exact = EmbeddingIndex(ivf_min_size=10 ** 9)
+    exact.add(keys, vectors)
+    ivf = EmbeddingIndex(ivf_min_size=1000, nprobe=8)
+    ivf.add(keys[:4000], vectors[:4000])
+    ivf.add(keys[4000:], vectors[4000:])   # assigned to lists without rebuilding them
+
+    assert ivf.centroids is not None
+    assert ivf.trained_size == 4000
+    queries = vectors[::250]
+    recall = np.mean([len({k for _, k in exact.search(q, 5)} & {k for _, k in ivf.search(q, 5)}) / 5
+                      for q in queries])
+    assert recall >= 0.9
+
+
+
+def test_add_skips_keys_already_indexed():
+    vectors = _clustered(3)
+    index = EmbeddingIndex()
+    index.add([_key(0), _key(1), _key(0)], vectors)
+    index.add([_key(1), _key(2)], vectors[1:])
+
+    assert index.size == 3
+    assert _key(2) in index and _key(3) not in index
+    assert [key for _, key in index.search(vectors[1], k=3)].count(_key(1)) == 1
+
+
+def test_consultation_cases_go_in_both_indexes():
+    """As when a version is loaded from case_embeddings."""
+    vectors = _clustered(2)
+    case_index.reset()
+    case_index.similar_cases(7, vectors[0])          # loads the (empty) version
+    case_index.add(7, _key(0), vectors[0])
+    case_index.add(7, _key(0), vectors[0], consultation=True)   # diagnosed, then sent to an expert
+    case_index.add(7, _key(1), vectors[1], consultation=True)
+
+    assert case_index._index.cases.size == 2
+    assert case_index._index.consultations.size == 2
+
+def test_similar_cases_return_expert_responses():
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO consultations (farmer_id, description, status) VALUES (1, 'Tomato - spots', 'answered')")
+    consultation_id = cursor.lastrowid
+    cursor.execute("INSERT INTO consultation_responses (consultation_id, expert_id, expert_response) "
+                   "VALUES (?, 2, 'Spray copper fungicide')", (consultation_id,))
+    conn.commit()
+    conn.close()
+    vectors = _clustered(3)
+    repository = CaseEmbeddingRepository()
+    repository.enqueue(7, _key(0), 1, consultation_id, "a.jpg", "Tomato___Early_blight",
+                       embeddings.to_bytes(vectors[0]))
+    repository.enqueue(7, _key(1), 1, None, "b.jpg", "Tomato___healthy", embeddings.to_bytes(vectors[1]))
+    case_index.reset()
+
+    similar = case_index.similar_cases(7, vectors[0], k=3, exclude=_key(2))
+
+    assert [case.image_hash for _, case in similar] == [_key(0)]
+    assert similar[0].case.expert_response == "Spray copper fungicide"
+    assert similar[0].case.description == "Tomato - spots"
+    assert len(case_index.similar_cases(7, vectors[1], k=3, consultations_only=False)) == 2
+
+
+def test_store_case_through_spooled_write_queue(tmp_path, monkeypatch):
+    from disease_identification import DiseaseIdentification
+    spool = db.WriteSpool(str(tmp_path / "spool"))
+    monkeypatch.setattr(db, "_write_queue", db.WriteQueue(max_wait=1.0, spool=spool))
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    vectors = _clustered(2)
+    case_index.reset()
+
+    identifier.store_case(7, _key(0), 1, "a.jpg", "Tomato___healthy", vectors[0])
+    db.close_write_queue()
+
+    blobs = [row[2] for row in CaseEmbeddingRepository().stream_for_version(7)]
+    assert [embeddings.from_bytes(blob).tolist() for blob in blobs] == [vectors[0].tolist()]
+    assert not os.path.exists(spool.path)
+
+
+def test_case_storage_failure_keeps_the_diagnosis(tmp_path, monkeypatch):
+    Image = pytest.importorskip("PIL.Image")
+    from disease_identification import DiseaseIdentification
+
+    class FakeFeatureModel(embeddings.FeatureModel):
+        def __init__(self):
+            pass
+
+        def predict_with_features(self, batch):
+            return np.tile([[0.9, 0.1]], (len(batch), 1)), np.ones((len(batch), 8), dtype=np.float32)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(CaseEmbeddingRepository, "enqueue", broken)
+    path = str(tmp_path / "leaf.png")
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)).save(path)
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    identifier.current = identifier.current._replace(model=FakeFeatureModel(), version_id=7,
+                                                     classes=["Tomato___healthy", "Tomato___Early_blight"])
+    identifier._loaded = True
+    case_index.reset()
+
+    result = identifier.process_image(path, user_id=2)
+
+    assert result["name"] == "Tomato___healthy"
+    db.flush_writes()
+    conn = db.create_connection()
+    assert conn.execute("SELECT disease_name FROM disease_predictions").fetchall() == [("Tomato___healthy",)]
+    conn.close()
+    assert case_index.similar_cases(7, np.ones(8), consultations_only=False) == []
+
+
+def test_consultation_reuses_stored_case_embedding(tmp_path, monkeypatch):
+    import prediction_cache
+    from disease_identification import DiseaseIdentification
+    from expert_consultation import ExpertConsultation
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO model_versions (model_path, version_number, is_active) VALUES ('m.h5', '1.0', 1)")
+    version_id = cursor.lastrowid
+    cursor.execute("INSERT INTO consultations (farmer_id, description, status) VALUES (1, 'Tomato', 'pending')")
+    consultation_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    image_path = tmp_path / "leaf.jpg"
+    image_path.write_bytes(b"not decoded")
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    vector = _clustered(1)[0]
+    # Stored when the photo was diagnosed
+    digest = prediction_cache.image_hash(str(image_path))
+    identifier.store_case(version_id, digest, 1, str(image_path), "Tomato___healthy", vector)
+
+    def no_inference(*args, **kwargs):
+        raise AssertionError("the stored embedding should be reused")
+    monkeypatch.setattr(identifier, "decode_and_screen", no_inference)
+    monkeypatch.setattr(identifier, "verify_model_loaded", no_inference)
+
+    ExpertConsultation(identifier, None).record_consultation_case(consultation_id, 1, str(image_path)).join(5)
+
+    db.flush_writes()
+    conn = db.create_connection()
+    rows = conn.execute("SELECT consultation_id FROM case_embeddings").fetchall()
+    conn.close()
+    assert rows == [(consultation_id,)]
@@ -28,7 +28,7 @@ def test_initialize_system_ok():
     assert result is True, "System initialization should complete successfully"
 
     # Verify that tables are created as expected
-    conn = sqlite3.connect("data/agroexpert.db")
+    conn = create_connection()
     cursor = conn.cursor()
 
     tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
@@ -70,3 +70,369 @@ def test_create_connection_invalid_path(monkeypatch):
     monkeypatch.setattr("db.sqlite3.connect", lambda _: (_ for _ in ()).throw(Exception("Invalid Path")))
     conn = create_connection()
     assert conn is None, "Connection should fail with an invalid path"
+
+
+# CONNECTION POOL
+def test_connection_pool_reuses_connection(tmp_path):
+    """
+    A released connection is handed out again on the same thread.
+    """
+    from db import ConnectionPool
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.close()
+
+    with pool.connection() as conn:
+        conn.execute("SELECT * FROM t")
+
+    stats = pool.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    pool.close_all()
+
+
+def test_connection_pool_discards_uncommitted_work(tmp_path):
+    """
+    Closing a pooled connection rolls back uncommitted changes, like sqlite3 close().
+    """
+    from db import ConnectionPool
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close_all()
+
+
+def test_closed_pooled_connection_raises(tmp_path):
+    from db import ConnectionPool
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    conn = pool.acquire()
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.cursor()
+    pool.close_all()
+
+
+def test_pooled_connection_settings_reach_connection_and_are_reset(tmp_path):
+    """
+    Attributes set on a pooled connection apply to the wrapped connection
+    and do not leak to the next checkout.
+    """
+    from db import ConnectionPool
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    with pool.connection() as conn:
+        conn.row_factory = sqlite3.Row
+        conn.isolation_level = None
+        assert conn._raw.row_factory is sqlite3.Row
+        assert conn.execute("SELECT 1 AS one").fetchone()["one"] == 1
+
+    with pool.connection() as conn:
+        assert pool.stats()["hits"] == 1
+        assert conn.row_factory is None
+        assert conn.isolation_level == ""
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    pool.close_all()
+
+
+# PRAGMA PROFILES
+def test_pragma_profile_applied_to_new_connections(tmp_path):
+    """
+    Every pooled connection runs in WAL mode with the configured busy timeout.
+    """
+    from db import ConnectionPool, pragma_report
+    pool = ConnectionPool(str(tmp_path / "pragma.db"))
+    with pool.connection() as conn:
+        report = pragma_report(conn)
+    assert report["journal_mode"] == "wal"
+    assert report["busy_timeout"] == 5000
+    assert report["synchronous"] == 1  # NORMAL
+    pool.close_all()
+
+
+def test_set_pragma_profile_unknown_name():
+    from db import set_pragma_profile
+    with pytest.raises(ValueError):
+        set_pragma_profile("does-not-exist")
+
+
+# INDEX CATALOGUE
+def test_hot_queries_use_indexes(tmp_path, monkeypatch):
+    """
+    After init_database every registered hot query is served by an index.
+    """
+    import db
+    monkeypatch.setattr(db, "_pool", db.ConnectionPool(str(tmp_path / "idx.db")))
+    db.init_database()
+    assert db.check_query_plans() == []
+    db.close_pool()
+
+
+def test_full_scan_detection():
+    from db import is_full_scan
+    assert is_full_scan("SCAN consultations")
+    assert not is_full_scan("SCAN c USING INDEX idx_consultations_status_created")
+    assert not is_full_scan("SEARCH crops USING INDEX idx_crops_user (user_id=?)")
+
+
+# SCHEMA MIGRATIONS
+def test_migrate_records_schema_version(tmp_path):
+    """
+    Migrations are applied once, in order, and recorded in schema_version.
+    """
+    from migrations import MIGRATIONS, migrate, current_version
+    conn = sqlite3.connect(str(tmp_path / "migrate.db"))
+    applied = migrate(conn)
+    assert applied == [m.version for m in MIGRATIONS]
+    assert current_version(conn) == MIGRATIONS[-1].version
+    assert migrate(conn) == []
+    conn.close()
+
+
+def test_text_timestamps_migrated_to_epoch(tmp_path):
+    """
+    Migration 3 converts TIMESTAMP text to integer epoch seconds and keeps ids.
+    """
+    from migrations import migrate
+    import timeutil
+    conn = sqlite3.connect(str(tmp_path / "epoch.db"))
+    migrate(conn, target=2)
+    conn.execute("INSERT INTO consultations (id, farmer_id, created_at) VALUES (7, 1, '2024-01-01 00:00:00')")
+    conn.execute("INSERT INTO coupons (code, value, expiration_date) VALUES ('C1', 10, '2024-01-01 00:00:00.250000')")
+    conn.commit()
+    migrate(conn)
+
+    assert conn.execute("SELECT id, created_at FROM consultations").fetchone() == (7, 1704067200)
+    # Coupon dates were written in local time
+    expiration = conn.execute("SELECT expiration_date FROM coupons").fetchone()[0]
+    assert timeutil.from_epoch(expiration).strftime('%Y-%m-%d %H:%M:%S') == '2024-01-01 00:00:00'
+    conn.execute("INSERT INTO news (title) VALUES ('x')")
+    created_at = conn.execute("SELECT created_at FROM news").fetchone()[0]
+    assert isinstance(created_at, int) and abs(created_at - timeutil.now()) < 5
+    applied = conn.execute("SELECT DISTINCT typeof(applied_at) FROM schema_version").fetchall()
+    assert applied == [("integer",)]
+    conn.close()
+
+
+def test_failed_migration_is_rolled_back(tmp_path, monkeypatch):
+    import migrations
+
+    def broken(cursor):
+        cursor.execute("CREATE TABLE half_done (x INTEGER)")
+        raise RuntimeError("boom")
+
+    steps = migrations.MIGRATIONS + [migrations.Migration(999, "broken step", broken)]
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps)
+    conn = sqlite3.connect(str(tmp_path / "migrate.db"))
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    assert "half_done" not in tables
+    assert migrations.current_version(conn) == steps[-2].version
+    conn.close()
+
+
+def test_dry_run_leaves_database_untouched(tmp_path):
+    from migrations import dry_run, current_version
+    directory = tmp_path / "dry"
+    directory.mkdir()
+    path = str(directory / "dry.db")
+    sqlite3.connect(path).close()
+    before = os.stat(path).st_mtime_ns
+    results = dry_run(path)
+    assert results and all(error is None for _, _, _, error in results)
+    assert os.stat(path).st_mtime_ns == before
+    assert os.listdir(directory) == ["dry.db"]
+    conn = sqlite3.connect(path)
+    assert current_version(conn) == 0
+    conn.close()
+
+
+def test_dry_run_does_not_create_missing_database(tmp_path):
+    from migrations import dry_run
+    path = tmp_path / "missing.db"
+    assert dry_run(str(path)) is None
+    assert not path.exists()
+
+
+def test_migration_indexes_are_fixed_per_step():
+    """
+    Migrating to version 2 creates the indexes migration 2 shipped with,
+    whatever later steps add.
+    """
+    from migrations import migrate
+    conn = sqlite3.connect(":memory:")
+    migrate(conn, target=2)
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                            "AND name LIKE 'idx_%'")}
+    assert len(names) == 10
+    assert "idx_disease_alerts_created" not in names
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'idx_consultation_responses_consultation'"
+                       ).fetchone()[0]
+    assert sql.endswith("(consultation_id)")
+    conn.close()
+
+
+# QUERY PROFILING
+def test_query_profiler_records_statements(tmp_path):
+    """
+    Statements run through pooled connections are grouped by normalized SQL.
+    """
+    import query_profiler
+    from db import ConnectionPool
+    slow_log = tmp_path / "slow.log"
+    profiler = query_profiler.enable_profiling(slow_ms=0, slow_log_path=str(slow_log), dump_path=None)
+    try:
+        pool = ConnectionPool(str(tmp_path / "profile.db"))
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE t (x INTEGER)")
+            cursor.executemany("INSERT INTO t VALUES (?)", [(1,), (2,), (3,)])
+            for value in (1, 2):
+                cursor.execute(f"SELECT x FROM t WHERE x >= {value}")
+                cursor.fetchall()
+            cursor.close()
+        pool.close_all()
+    finally:
+        query_profiler.disable_profiling()
+
+    stats = {s["sql"]: s for s in profiler.snapshot()}
+    select = stats["SELECT x FROM t WHERE x >= ?"]
+    assert select["calls"] == 2
+    assert select["rows"] == 5
+    assert select["p99_ms"] >= select["p50_ms"]
+    assert "SELECT x FROM t WHERE x >= ?" in slow_log.read_text()
+
+
+def test_normalize_sql():
+    from query_profiler import normalize_sql
+    assert normalize_sql("SELECT *\n  FROM users WHERE name = 'bob' AND id = 42") == \
+        "SELECT * FROM users WHERE name = ? AND id = ?"
+
+
+# GROUP-COMMIT WRITE QUEUE
+def _make_queue_table():
+    conn = create_connection()
+    conn.execute("CREATE TABLE queued (x INTEGER NOT NULL)")
+    conn.commit()
+    conn.close()
+
+
+def _queued_values():
+    conn = create_connection()
+    values = [row[0] for row in conn.execute("SELECT x FROM queued ORDER BY x")]
+    conn.close()
+    return values
+
+
+def test_write_queue_batches_and_flushes():
+    """
+    Queued writes are committed in batches and visible after flush().
+    """
+    from db import WriteQueue
+    _make_queue_table()
+    write_queue = WriteQueue(max_batch=10, max_wait=1.0)
+    try:
+        write_queue.submit_many("INSERT INTO queued VALUES (?)", [(i,) for i in range(25)])
+        assert write_queue.flush(timeout=5)
+        assert _queued_values() == list(range(25))
+        stats = write_queue.stats()
+        assert stats["rows"] == 25
+        assert stats["batches"] < 25
+        assert stats["queue_depth"] == 0
+    finally:
+        write_queue.close()
+
+
+def test_write_queue_bad_row_does_not_drop_batch():
+    from db import WriteQueue
+    _make_queue_table()
+    write_queue = WriteQueue(max_wait=1.0)
+    try:
+        write_queue.submit("INSERT INTO queued VALUES (?)", (1,))
+        write_queue.submit("INSERT INTO queued VALUES (?)", (None,))
+        write_queue.submit("INSERT INTO queued VALUES (?)", (2,))
+        assert write_queue.flush(timeout=5)
+        assert _queued_values() == [1, 2]
+        assert write_queue.stats()["failed"] == 1
+    finally:
+        write_queue.close()
+
+
+def test_flush_writes_gives_read_after_write():
+    from db import enqueue_write, flush_writes
+    _make_queue_table()
+    enqueue_write("INSERT INTO queued VALUES (?)", (7,))
+    flush_writes()
+    assert _queued_values() == [7]
+
+
+def test_spooled_writes_commit_and_truncate_spool(tmp_path):
+    from db import WriteQueue, WriteSpool
+    _make_queue_table()
+    spool = WriteSpool(str(tmp_path / "spool"))
+    write_queue = WriteQueue(max_wait=1.0, spool=spool)
+    try:
+        write_queue.submit_many("INSERT INTO queued VALUES (?)", [(i,) for i in range(5)])
+        write_queue.submit("INSERT INTO queued VALUES (?)", (99,), durable=False)
+        assert write_queue.flush(timeout=5)
+        assert _queued_values() == [0, 1, 2, 3, 4, 99]
+        assert os.path.getsize(spool.path) == 0
+    finally:
+        write_queue.close()
+    assert not os.path.exists(spool.path)
+
+
+def test_recover_spools_replays_uncommitted_writes_once(tmp_path):
+    import json
+    from db import recover_spools
+    _make_queue_table()
+    directory = tmp_path / "spool"
+    directory.mkdir()
+    # A process that died after committing seq 1 and 2 but not 3 and 4
+    with open(directory / "1234-1.spool", "w") as f:
+        for seq in range(1, 5):
+            f.write(json.dumps([seq, "INSERT INTO queued VALUES (?)", [seq]]) + "\n")
+        f.write('[5, "INSERT INTO queu')
+    conn = create_connection()
+    conn.executemany("INSERT INTO queued VALUES (?)", [(1,), (2,)])
+    conn.execute("INSERT INTO write_spool_state (spool, committed_seq) VALUES ('1234-1.spool', 2)")
+    conn.commit()
+    conn.close()
+
+    assert recover_spools(str(directory)) == 2
+    assert _queued_values() == [1, 2, 3, 4]
+    assert not os.listdir(directory)
+    assert recover_spools(str(directory)) == 0
+    assert _queued_values() == [1, 2, 3, 4]
+
+
+def test_spooled_blob_writes_commit_and_replay(tmp_path):
+    import json
+    from db import WriteQueue, WriteSpool, recover_spools
+    conn = create_connection()
+    conn.execute("CREATE TABLE blobs (seq INTEGER, data BLOB)")
+    conn.commit()
+    conn.close()
+    spool = WriteSpool(str(tmp_path / "spool"))
+    write_queue = WriteQueue(max_wait=1.0, spool=spool)
+    try:
+        write_queue.submit("INSERT INTO blobs VALUES (?, ?)", (1, b"\x00\xff\x10"))
+        assert write_queue.flush(timeout=5)
+    finally:
+        write_queue.close()
+    # A spool left by a crashed process, written the same way
+    directory = tmp_path / "crashed"
+    directory.mkdir()
+    with open(directory / "1234-1.spool", "w") as f:
+        f.write(json.dumps([1, "INSERT INTO blobs VALUES (?, ?)", [2, {"b64": "AP8Q"}]]) + "\n")
+    assert recover_spools(str(directory)) == 1
+
+    conn = create_connection()
+    rows = conn.execute("SELECT seq, data FROM blobs ORDER BY seq").fetchall()
+    conn.close()
+    assert rows == [(1, b"\x00\xff\x10"), (2, b"\x00\xff\x10")]
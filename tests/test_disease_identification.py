@@ -0,0 +1,59 @@
+# Tests for batch inference in disease_identification.py
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+import db
+import image_quality
+from disease_identification import DiseaseIdentification
+
+CLASSES = ["Tomato___healthy", "Tomato___Late_blight"]
+
+
+class FakeModel:
+    """Scores each image by its mean red value and records the batch shapes."""
+
+    def __init__(self):
+        self.batch_shapes = []
+
+    def predict_on_batch(self, batch):
+        self.batch_shapes.append(batch.shape)
+        red = batch[..., 0].mean(axis=(1, 2)) / 255.0
+        return np.stack([1 - red, red], axis=1)
+
+
+@pytest.fixture
+def identifier(monkeypatch):
+    # The solid-colour test images would fail the blur check
+    monkeypatch.setattr(image_quality, "MIN_SHARPNESS", 0)
+    identifier = DiseaseIdentification()
+    identifier.model = FakeModel()
+    identifier.classes = CLASSES
+    identifier._loaded = True
+    return identifier
+
+
+def _write_image(path, color, size=(300, 200)):
+    Image.new("RGB", size, color).save(path)
+    return str(path)
+
+
+def test_process_images_batches_and_stores_predictions(identifier, tmp_path):
+    paths = [_write_image(tmp_path / f"{i}.jpg", (255, 0, 0) if i % 2 else (0, 255, 0)) for i in range(5)]
+    paths.insert(2, str(tmp_path / "missing.jpg"))
+
+    results = list(identifier.process_images(paths, user_id=1, batch_size=4, workers=2))
+
+    assert [path for path, _ in results] == paths
+    assert results[2][1] == {"error": "Image file not found"}
+    assert results[0][1]["name"] == "Tomato___healthy"
+    assert results[1][1]["name"] == "Tomato___Late_blight"
+    # Every forward pass sees the same padded batch shape
+    assert identifier.model.batch_shapes == [(4, 224, 224, 3), (4, 224, 224, 3)]
+
+    db.flush_writes()
+    conn = db.create_connection()
+    count = conn.execute("SELECT COUNT(*) FROM disease_predictions WHERE user_id = 1").fetchone()[0]
+    conn.close()
+    assert count == 5
@@ -0,0 +1,60 @@
+# Tests for the image quality pre-screen in image_quality.py
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import db
+import image_quality
+from image_quality import screen
+
+
+def _textured(level=128, contrast=60):
+    # Random texture around a grey level: sharp, and neither black nor white
+    rng = np.random.default_rng(0)
+    pixels = level + rng.integers(-contrast, contrast + 1, (224, 224, 1))
+    return np.clip(np.repeat(pixels, 3, axis=2), 0, 255).astype(np.uint8)
+
+
+def test_sharp_well_exposed_image_passes():
+    assert screen(_textured(), (1024, 768)) is None
+
+
+def test_small_image_is_rejected():
+    assert screen(_textured(), (80, 60)) == ("too_small", 60)
+
+
+def test_flat_image_is_rejected_as_blurry():
+    rejection = screen(np.full((224, 224, 3), 128, dtype=np.uint8), (1024, 768))
+    assert rejection.reason == "blurry"
+    assert rejection.value == 0.0
+
+
+def test_dark_and_bright_images_are_rejected():
+    assert screen(_textured(level=5, contrast=5), (1024, 768)).reason == "underexposed"
+    assert screen(_textured(level=250, contrast=5), (1024, 768)).reason == "overexposed"
+
+
+def test_zero_threshold_turns_a_check_off(monkeypatch):
+    monkeypatch.setattr(image_quality, "MIN_SHARPNESS", 0)
+    assert screen(np.full((224, 224, 3), 128, dtype=np.uint8), (1024, 768)) is None
+
+
+def test_rejected_upload_skips_the_model_and_is_recorded(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    from disease_identification import DiseaseIdentification
+    path = str(tmp_path / "dark.jpg")
+    Image.new("RGB", (640, 480), (2, 2, 2)).save(path)
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    identifier.current = identifier.current._replace(model=object(), classes=["Tomato___healthy"])
+    identifier._loaded = True
+    identifier.predict_disease = lambda *args: pytest.fail("a rejected image must not reach the model")
+
+    result = identifier.process_image(path, user_id=2)
+
+    assert result["rejected"] == "underexposed"
+    assert "too dark" in result["error"]
+    db.flush_writes()
+    conn = db.create_connection()
+    rows = conn.execute("SELECT user_id, reason FROM image_rejections").fetchall()
+    conn.close()
+    assert [tuple(row) for row in rows] == [(2, "underexposed")]
@@ -0,0 +1,58 @@
+# Tests for baseline comparison in inference_benchmark.py
+from inference_benchmark import compare, summarise
+
+
+def _entry(p99_ms=50.0, images_per_s=100.0, cold_ms=3000.0):
+    return {
+        'version_number': '1.0',
+        'variant': 'keras',
+        'cold_start': {'import_ms': 10.0, 'load_ms': cold_ms - 110.0, 'first_prediction_ms': 100.0,
+                       'total_ms': cold_ms},
+        'latency': {'test_images': {'count': 80, 'mean_ms': 30.0, 'p50_ms': 30.0, 'p95_ms': 45.0,
+                                    'p99_ms': p99_ms}},
+        'throughput_images_per_s': {'32': images_per_s},
+        'peak_rss_mb': 900.0,
+    }
+
+
+def _results(active, **versions):
+    return {'active_version_id': active, 'versions': versions}
+
+
+def test_summarise_percentiles():
+    stats = summarise([float(ms) for ms in range(1, 101)])
+    assert stats['count'] == 100
+    assert stats['p50_ms'] == 51.0
+    assert stats['p95_ms'] == 95.0
+    assert stats['p99_ms'] == 99.0
+
+
+def test_changes_within_tolerance_pass():
+    baseline = _results(1, **{'1': _entry()})
+    results = _results(1, **{'1': _entry(p99_ms=54.0, images_per_s=92.0)})
+    assert compare(results, baseline, tolerance=0.10) == []
+
+
+def test_slower_latency_and_lower_throughput_are_regressions():
+    baseline = _results(1, **{'1': _entry()})
+    results = _results(1, **{'1': _entry(p99_ms=70.0, images_per_s=50.0)})
+
+    regressions = compare(results, baseline, tolerance=0.10)
+
+    assert len(regressions) == 2
+    assert any('latency.test_images.p99_ms' in r for r in regressions)
+    assert any('throughput.batch_32' in r for r in regressions)
+
+
+def test_new_version_is_compared_against_baseline_active_version():
+    baseline = _results(1, **{'1': _entry()})
+    results = _results(2, **{'2': _entry(cold_ms=6000.0)})
+
+    regressions = compare(results, baseline)
+
+    assert regressions == ["version 2: cold_start.total_ms 3000 -> 6000 (+100%)"]
+
+
+def test_failed_version_is_reported():
+    results = _results(1, **{'1': {'error': 'Model file not found'}})
+    assert compare(results, _results(1, **{'1': _entry()})) == ["version 1: benchmark failed: Model file not found"]
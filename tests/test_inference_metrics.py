@@ -0,0 +1,59 @@
+# Tests for per-stage inference latency in inference_metrics.py
+import json
+
+import db
+import inference_metrics
+import prediction_cache
+from disease_identification import DiseaseIdentification
+from inference_metrics import InferenceMetrics, Timings
+
+
+def test_stats_are_kept_per_model_version_and_stage():
+    metrics = InferenceMetrics(metrics_file=None)
+    for ms in range(1, 101):
+        metrics.record(1, {'forward': float(ms), 'total': ms + 10.0})
+    metrics.record(2, {'forward': 500.0})
+
+    stats = metrics.stats()
+
+    assert stats[1]['forward']['count'] == 100
+    assert stats[1]['forward']['p50_ms'] == 51.0
+    assert stats[1]['forward']['p99_ms'] == 99.0
+    assert stats[1]['total']['max_ms'] == 110.0
+    assert stats[2] == {'forward': {'count': 1, 'mean_ms': 500.0, 'p50_ms': 500.0,
+                                    'p99_ms': 500.0, 'max_ms': 500.0}}
+
+
+def test_metrics_file_round_trip(tmp_path):
+    path = tmp_path / "metrics" / "inference.jsonl"
+    metrics = InferenceMetrics(metrics_file=str(path))
+    timings = Timings()
+    with timings.stage('forward'):
+        pass
+    metrics.record(7, timings.finish(), source='local')
+
+    entry = json.loads(path.read_text().splitlines()[0])
+    assert entry['model_version_id'] == 7
+    assert entry['source'] == 'local'
+    assert set(entry['stages']) == {'forward', 'total'}
+    assert inference_metrics.summarise_file(str(path))[7]['forward']['count'] == 1
+
+
+def test_cache_hit_is_timed_under_the_active_version(tmp_path):
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO model_versions (model_path, version_number, is_active) VALUES ('m.h5', '1.0', 1)")
+    conn.commit()
+    version_id = cursor.lastrowid
+    conn.close()
+    leaf = tmp_path / "leaf.jpg"
+    leaf.write_bytes(b"leaf")
+    prediction_cache.store(prediction_cache.image_hash(str(leaf)), version_id,
+                           {"name": "Tomato___healthy", "confidence": 0.9, "top_k": []})
+    db.flush_writes()
+
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    identifier.process_image(str(leaf), user_id=1)
+
+    stages = identifier.latency_stats()[version_id]
+    assert set(stages) == {'cache', 'db_insert', 'total'}
@@ -0,0 +1,60 @@
+# Tests for the local inference server in inference_server.py
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+import inference_server
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def no_probe_cache(monkeypatch):
+    monkeypatch.setattr(inference_server, "_server_down_until", 0.0)
+
+
+def test_predict_remote_without_server_returns_none(monkeypatch, no_probe_cache):
+    monkeypatch.setattr(inference_server, "INFERENCE_PORT", _free_port())
+    assert inference_server.server_available() is False
+    assert inference_server.predict_remote("leaf.jpg") is None
+
+
+def test_concurrent_requests_are_micro_batched(monkeypatch, tmp_path, no_probe_cache):
+    np = pytest.importorskip("numpy")
+    Image = pytest.importorskip("PIL.Image")
+    import image_quality
+    from disease_identification import DiseaseIdentification
+    # A small solid-colour test image would fail the size and blur checks
+    monkeypatch.setattr(image_quality, "MIN_IMAGE_SIDE", 0)
+    monkeypatch.setattr(image_quality, "MIN_SHARPNESS", 0)
+
+    class FakeModel:
+        def predict_on_batch(self, batch):
+            red = batch[..., 0].mean(axis=(1, 2)) / 255.0
+            return np.stack([1 - red, red], axis=1)
+
+    identifier = DiseaseIdentification(use_server=False)
+    identifier.model = FakeModel()
+    identifier.classes = ["Tomato___healthy", "Tomato___Late_blight"]
+    server = inference_server.create_server(identifier, port=0, max_batch=8, max_wait_ms=100)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(inference_server, "INFERENCE_PORT", server.server_address[1])
+    try:
+        path = str(tmp_path / "leaf.jpg")
+        Image.new("RGB", (64, 64), (255, 0, 0)).save(path)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(inference_server.predict_remote, [path] * 8))
+        assert all(result["name"] == "Tomato___Late_blight" for result in results)
+        assert inference_server.predict_remote(str(tmp_path / "missing.jpg")) == {"error": "Image file not found"}
+
+        batcher = server.RequestHandlerClass.batcher
+        assert batcher.requests == 8
+        assert batcher.batches < 8
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,89 @@
+# Tests for hot model swap in model_manager.py
+import db
+from disease_identification import DiseaseIdentification, LoadedModel, NO_MODEL
+from model_manager import ModelManager, active_model_stamp
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+    def predict_on_batch(self, batch):
+        return [[1.0]]
+
+
+def _activate(version_number):
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE model_versions SET is_active = 0")
+    cursor.execute("INSERT INTO model_versions (model_path, version_number, is_active) VALUES (?, ?, 1)",
+                   (f"model_v{version_number}.h5", version_number))
+    cursor.execute("DELETE FROM model_classes")
+    cursor.execute("INSERT INTO model_classes (class_name) VALUES ('Tomato___healthy')")
+    conn.commit()
+    version_id = cursor.lastrowid
+    conn.close()
+    return version_id
+
+
+def _identifier_on_active_model(name):
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    stamp = active_model_stamp()
+    identifier.current = LoadedModel(FakeModel(name), ["Tomato___healthy"], stamp[0], 'keras', stamp)
+    return identifier
+
+
+def test_activation_swaps_model_once(monkeypatch):
+    _activate("1.0")
+    identifier = _identifier_on_active_model("old")
+    manager = ModelManager(identifier)
+    assert manager.check() is False
+
+    new_version_id = _activate("2.0")
+    monkeypatch.setattr(identifier, "read_active_model", lambda verbose=False: LoadedModel(
+        FakeModel("new"), ["Tomato___healthy"], new_version_id, 'keras', active_model_stamp()))
+
+    assert manager.check() is True
+    assert identifier.model.name == "new"
+    assert identifier.model_version_id == new_version_id
+    assert manager.check() is False
+
+
+def test_failed_load_keeps_old_model_and_is_not_retried(monkeypatch):
+    _activate("1.0")
+    identifier = _identifier_on_active_model("old")
+    manager = ModelManager(identifier)
+    _activate("2.0")
+    attempts = []
+
+    def failing_load(verbose=False):
+        attempts.append(1)
+        return NO_MODEL
+
+    monkeypatch.setattr(identifier, "read_active_model", failing_load)
+
+    assert manager.check() is False
+    assert manager.check() is False
+    assert identifier.model.name == "old"
+    assert len(attempts) == 1
+
+
+def test_unloaded_identifier_is_not_swapped():
+    _activate("1.0")
+    identifier = DiseaseIdentification(use_server=False, watch=False)
+    assert ModelManager(identifier).check() is False
+    assert identifier.model is None
+
+
+def test_swap_respects_warmup_opt_out(monkeypatch):
+    import disease_identification
+    version_id = _activate("1.0")
+    identifier = DiseaseIdentification(use_server=False, watch=False, warmup=False)
+    monkeypatch.setattr(identifier, "read_active_model", lambda verbose=False: LoadedModel(
+        FakeModel("new"), ["Tomato___healthy"], version_id, 'keras', active_model_stamp()))
+    warmed = []
+    monkeypatch.setattr(disease_identification, "warm_up", lambda model, *args: warmed.append(model))
+
+    assert identifier.swap_model() is True
+    assert identifier.model.name == "new"
+    assert warmed == []
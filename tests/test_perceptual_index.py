@@ -0,0 +1,88 @@
+# Tests for near-duplicate lookup in perceptual_index.py
+import random
+
+import pytest
+
+import db
+import perceptual_index
+import prediction_cache
+from perceptual_index import BKTree, hamming
+
+PREDICTION = {"name": "Tomato___Late_blight", "confidence": 0.93,
+              "top_k": [("Tomato___Late_blight", 0.93), ("Tomato___healthy", 0.07)]}
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    perceptual_index.reset()
+    yield
+    perceptual_index.reset()
+
+
+@pytest.fixture
+def version_id():
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO model_versions (model_path, version_number, is_active) VALUES ('m.h5', '1.0', 1)")
+    conn.commit()
+    version_id = cursor.lastrowid
+    conn.close()
+    return version_id
+
+
+def test_bk_tree_search_matches_linear_scan():
+    rng = random.Random(1)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for i, phash in enumerate(hashes):
+        tree.add(phash, i)
+    query = hashes[42] ^ 0b1011   # three bits away from entry 42
+
+    found = tree.search(query, 4)
+
+    expected = sorted((hamming(query, phash), i) for i, phash in enumerate(hashes) if hamming(query, phash) <= 4)
+    assert sorted(found) == expected
+    assert found[0] == (3, 42)
+
+
+def test_signed_storage_round_trip():
+    for phash in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        assert perceptual_index.to_unsigned(perceptual_index.to_signed(phash)) == phash
+
+
+def test_near_duplicate_returns_earlier_prediction(version_id):
+    phash = (1 << 63) | 0xF0F0F0F0
+    prediction_cache.store("original", version_id, PREDICTION, phash=phash)
+    db.flush_writes()
+
+    assert prediction_cache.lookup_similar(phash ^ 0b11, version_id) == PREDICTION
+    assert prediction_cache.lookup_similar(phash ^ 0xFFFF, version_id) is None
+    assert prediction_cache.lookup_similar(phash, version_id + 1) is None
+
+
+def test_index_is_loaded_from_the_table(version_id):
+    prediction_cache.store("original", version_id, PREDICTION, phash=12345)
+    db.flush_writes()
+    perceptual_index.reset()   # as in a new process
+
+    assert prediction_cache.lookup_similar(12345 ^ 1, version_id) == PREDICTION
+
+
+def test_invalidate_forgets_near_duplicates(version_id):
+    prediction_cache.store("original", version_id, PREDICTION, phash=12345)
+    prediction_cache.invalidate()
+
+    assert prediction_cache.lookup_similar(12345, version_id) is None
+
+
+def test_dhash_survives_recompression_and_resize(tmp_path):
+    pytest.importorskip("numpy")
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.radial_gradient("L").convert("RGB").resize((800, 600))
+    image.save(tmp_path / "leaf.jpg", quality=95)
+    image.resize((400, 300)).save(tmp_path / "copy.jpg", quality=60)
+
+    original = perceptual_index.dhash(str(tmp_path / "leaf.jpg"))
+    copy = perceptual_index.dhash(str(tmp_path / "copy.jpg"))
+
+    assert hamming(original, copy) <= perceptual_index.MAX_DISTANCE
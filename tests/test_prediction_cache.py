@@ -0,0 +1,74 @@
+# Tests for the content-hash prediction cache in prediction_cache.py
+import pytest
+
+import db
+import prediction_cache
+from disease_identification import DiseaseIdentification
+
+PREDICTION = {"name": "Tomato___Late_blight", "confidence": 0.93,
+              "top_k": [("Tomato___Late_blight", 0.93), ("Tomato___healthy", 0.07)]}
+
+
+@pytest.fixture
+def active_version():
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO model_versions (model_path, version_number, is_active) VALUES ('m.h5', '1.0', 1)")
+    conn.commit()
+    version_id = cursor.lastrowid
+    conn.close()
+    return version_id
+
+
+@pytest.fixture
+def leaf(tmp_path):
+    path = tmp_path / "leaf.jpg"
+    path.write_bytes(b"not really a jpeg")
+    return str(path)
+
+
+def test_lookup_is_keyed_by_content_and_model_version(leaf, tmp_path, active_version):
+    digest = prediction_cache.image_hash(leaf)
+    copy = tmp_path / "copy.jpg"
+    copy.write_bytes(b"not really a jpeg")
+    assert prediction_cache.image_hash(str(copy)) == digest
+
+    assert prediction_cache.lookup(digest, active_version) is None
+    prediction_cache.store(digest, active_version, PREDICTION)
+    db.flush_writes()   # lookups do not wait for queued cache writes
+    assert prediction_cache.lookup(digest, active_version) == PREDICTION
+    assert prediction_cache.lookup(digest, active_version + 1) is None
+
+    prediction_cache.invalidate()
+    assert prediction_cache.lookup(digest, active_version) is None
+
+
+def test_evict_keeps_most_recently_used(active_version):
+    for i in range(5):
+        prediction_cache.store(f"hash{i}", active_version, PREDICTION)
+    db.flush_writes()
+    conn = db.create_connection()
+    conn.execute("UPDATE prediction_cache SET last_used_at = 1000 + CAST(substr(image_hash, 5) AS INTEGER)")
+    conn.execute("UPDATE prediction_cache SET last_used_at = 9999 WHERE image_hash = 'hash0'")
+    conn.commit()
+    conn.close()
+
+    assert prediction_cache.evict(max_entries=2) == 3
+    assert prediction_cache.lookup("hash0", active_version) is not None
+    assert prediction_cache.lookup("hash4", active_version) is not None
+    assert prediction_cache.lookup("hash1", active_version) is None
+
+
+def test_cache_hit_skips_inference_but_records_prediction(leaf, active_version):
+    prediction_cache.store(prediction_cache.image_hash(leaf), active_version, PREDICTION)
+    db.flush_writes()
+    identifier = DiseaseIdentification(use_server=False)
+    identifier.predict_disease = lambda image: pytest.fail("cache hit must not run the model")
+
+    assert identifier.process_image(leaf, user_id=3) == PREDICTION
+
+    db.flush_writes()
+    conn = db.create_connection()
+    rows = conn.execute("SELECT disease_name FROM disease_predictions WHERE user_id = 3").fetchall()
+    conn.close()
+    assert rows == [("Tomato___Late_blight",)]
@@ -0,0 +1,47 @@
+# Tests for top-k prediction results in predictions.py
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import predictions
+
+CLASSES = [f"class_{i}" for i in range(10)]
+
+
+def test_top_k_indices_for_every_row_highest_first():
+    scores = np.array([
+        [0.05, 0.5, 0.1, 0.2, 0.0, 0.0, 0.05, 0.1, 0.0, 0.0],
+        [0.9, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.03, 0.07],
+    ])
+
+    assert predictions.top_k_indices(scores, 3).tolist() == [[1, 3, 2], [0, 9, 8]]
+
+
+def test_k_larger_than_class_count_returns_every_class():
+    assert predictions.top_k_indices(np.array([[0.2, 0.7, 0.1]]), 5).tolist() == [[1, 0, 2]]
+
+
+def test_prediction_builds_per_class_dict_only_on_request():
+    prediction = predictions.from_scores(CLASSES, np.linspace(0, 0.9, 10))
+
+    assert prediction["name"] == "class_9"
+    assert [name for name, _ in prediction["top_k"]] == ["class_9", "class_8", "class_7"]
+    assert "all_predictions" not in prediction
+    assert len(prediction["all_predictions"]) == 10
+    assert prediction["all_predictions"]["class_0"] == 0.0
+
+
+def test_batch_predictions_match_single_predictions_and_serialise():
+    scores = np.random.default_rng(0).random((4, 10))
+
+    batch = predictions.from_batch(CLASSES, scores)
+
+    assert [p["top_k"] for p in batch] == [predictions.from_scores(CLASSES, row)["top_k"] for row in scores]
+    # Sent as JSON by the inference server
+    assert json.loads(json.dumps(batch[0]))["name"] == batch[0]["name"]
+
+
+def test_top_k_from_dict():
+    assert predictions.top_k_from_dict({"a": 0.1, "b": 0.6, "c": 0.3}, 2) == [("b", 0.6), ("c", 0.3)]
@@ -0,0 +1,61 @@
+# Tests for the inference decode path in preprocessing.py
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+import preprocessing
+
+EXIF_ORIENTATION = 0x0112
+
+
+def test_large_jpeg_is_decoded_to_target_size(tmp_path):
+    path = tmp_path / "large.jpg"
+    Image.new("RGB", (4000, 3000), (200, 30, 30)).save(path)
+
+    array = preprocessing.decode(str(path))
+
+    assert array.shape == (224, 224, 3)
+    assert array.dtype == np.uint8
+    assert abs(int(array[..., 0].mean()) - 200) < 5
+
+
+@pytest.mark.parametrize("mode", ["L", "RGBA", "P", "CMYK"])
+def test_colour_modes_are_normalised_to_rgb(tmp_path, mode):
+    path = tmp_path / ("leaf.jpg" if mode == "CMYK" else "leaf.png")
+    Image.new(mode, (300, 300)).save(path)
+
+    assert preprocessing.decode(str(path)).shape == (224, 224, 3)
+
+
+def test_transparent_pixels_become_white(tmp_path):
+    path = tmp_path / "transparent.png"
+    Image.new("RGBA", (50, 50), (0, 0, 0, 0)).save(path)
+
+    assert preprocessing.decode(str(path)).min() == 255
+
+
+def test_exif_orientation_is_applied(tmp_path):
+    # Left half red, right half blue, stored rotated 90 degrees (orientation 6)
+    image = Image.new("RGB", (400, 200), (0, 0, 255))
+    image.paste((255, 0, 0), (0, 0, 200, 200))
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    path = tmp_path / "rotated.jpg"
+    image.save(path, exif=exif)
+
+    array = preprocessing.decode(str(path))
+
+    # Rotated upright the red half is on top
+    assert array[20, 112, 0] > 200 and array[200, 112, 2] > 200
+
+
+def test_decode_into_fills_a_batch_row(tmp_path):
+    path = tmp_path / "leaf.jpg"
+    Image.new("RGB", (640, 480), (0, 255, 0)).save(path)
+    buffer = preprocessing.allocate_batch(3)
+
+    preprocessing.decode_into(str(path), buffer[1])
+
+    assert buffer[0].max() == 0 and buffer[2].max() == 0
+    assert buffer[1][..., 1].mean() > 240
@@ -0,0 +1,61 @@
+# Tests for the repository layer in repositories.py
+import pytest
+import sqlite3
+from collections import namedtuple
+
+from migrations import migrate
+from repositories import (UserRepository, PredictionRepository, RewardRepository, AlertRepository,
+                          UserRow)
+import timeutil
+
+
+@pytest.fixture
+def schema_conn(tmp_path):
+    """
+    Fixture for a database file with the full migrated schema.
+    """
+    conn = sqlite3.connect(str(tmp_path / "repo.db"))
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def test_user_rows_have_named_fields(schema_conn):
+    schema_conn.executemany(
+        "INSERT INTO users (username, password, role, email, status) VALUES (?, ?, ?, ?, ?)",
+        [("farmer01", "x", "farmer", "f@test.com", "active"),
+         ("expert01", "x", "expert", "e@test.com", "pending")])
+    schema_conn.commit()
+
+    users = list(UserRepository(schema_conn).iter_all())
+    assert all(isinstance(user, UserRow) for user in users)
+    assert [user.username for user in users] == ["expert01", "farmer01"]
+    assert users[0].status == "pending"
+
+
+def test_stream_returns_every_row_across_batches(schema_conn):
+    repository = PredictionRepository(schema_conn)
+    for i in range(7):
+        repository.add(1, f"img_{i}.jpg", "Tomato___healthy", 0.9)
+
+    Row = namedtuple('Row', ['id', 'image_path'])
+    rows = list(repository.stream("SELECT id, image_path FROM disease_predictions ORDER BY id",
+                                  row_type=Row, batch_size=3))
+    assert len(rows) == 7
+    assert rows[-1].image_path == "img_6.jpg"
+    assert repository.top_diseases(1)[0].count == 7
+
+
+def test_alerts_since_uses_epoch_range(schema_conn):
+    schema_conn.executemany(
+        "INSERT INTO disease_alerts (disease_name, affected_crop, region, created_at) VALUES (?, ?, ?, ?)",
+        [("Blight", "Tomato", "North", timeutil.days_ago(30)),
+         ("Rust", "Corn", "South", timeutil.days_ago(2))])
+    schema_conn.commit()
+
+    alerts = AlertRepository(schema_conn).since(timeutil.days_ago(7))
+    assert [alert.disease_name for alert in alerts] == ["Rust"]
+
+
+def test_reward_points_for_unknown_user_is_none(schema_conn):
+    assert RewardRepository(schema_conn).points(12345) is None
@@ -0,0 +1,26 @@
+# Startup must not pay for TensorFlow, NumPy, matplotlib or Pillow
+import os
+import subprocess
+import sys
+
+from lazy_imports import LazyModule, lazy_import
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_entry_points_do_not_import_heavy_modules(tmp_path):
+    code = ("import sys, main, admin_functions; main.AgroExpert(); admin_functions.AdminFunctions(); "
+            "print([m for m in ('tensorflow', 'matplotlib', 'numpy', 'PIL') if m in sys.modules])")
+    env = dict(os.environ, AGROEXPERT_DB=str(tmp_path / "startup.db"))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_lazy_import_loads_on_first_attribute_access():
+    module = LazyModule("json")
+    assert "not loaded" in repr(module)
+    assert module.dumps([1]) == "[1]"
+    assert "(loaded)" in repr(module)
+    # Modules that are already imported are returned as they are
+    assert lazy_import("os") is os
@@ -0,0 +1,51 @@
+# Tests for recording and choosing TFLite model variants in tflite_models.py
+import pytest
+
+import db
+import prediction_cache
+import tflite_models
+from repositories import ModelVariantRepository
+
+
+@pytest.fixture
+def version_id():
+    conn = db.create_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO model_versions (model_path, version_number, is_active) VALUES ('m.h5', '1.0', 1)")
+    conn.commit()
+    version_id = cursor.lastrowid
+    conn.close()
+    repository = ModelVariantRepository()
+    repository.record(version_id, 'keras', 'm.h5', 40_000_000, 80.0, 0.950)
+    repository.record(version_id, 'float16', 'm_float16.tflite', 20_000_000, 30.0, 0.949)
+    repository.record(version_id, 'int8', 'm_int8.tflite', 10_000_000, 12.0, 0.930)
+    return version_id
+
+
+def test_new_versions_serve_the_keras_model(version_id):
+    assert ModelVariantRepository().serving_variant(version_id) == 'keras'
+
+
+def test_choose_fastest_variant_within_accuracy_drop(version_id):
+    assert tflite_models.choose_variant(version_id, latency_budget_ms=50) == 'float16'
+    assert ModelVariantRepository().serving_variant(version_id) == 'float16'
+    # A looser accuracy allowance admits the int8 model
+    assert tflite_models.choose_variant(version_id, 50, max_accuracy_drop=0.05) == 'int8'
+
+
+def test_no_variant_within_budget_keeps_serving_variant(version_id):
+    assert tflite_models.choose_variant(version_id, latency_budget_ms=5) is None
+    assert ModelVariantRepository().serving_variant(version_id) == 'keras'
+
+
+def test_choosing_a_variant_clears_the_prediction_cache(version_id):
+    prediction_cache.store('abc', version_id, {"name": "Tomato___healthy", "confidence": 0.9})
+    tflite_models.choose_variant(version_id, latency_budget_ms=50)
+    assert prediction_cache.lookup('abc', version_id) is None
+
+
+def test_recording_a_variant_again_replaces_it(version_id):
+    ModelVariantRepository().record(version_id, 'int8', 'm_int8.tflite', 10_000_000, 11.0, 0.945)
+    variants = {v.variant: v for v in ModelVariantRepository().for_version(version_id)}
+    assert len(variants) == 3
+    assert variants['int8'].accuracy == 0.945
@@ -0,0 +1,216 @@
+# tflite_models.py
+# TensorFlow Lite variants of the trained Keras models. After training, each
+# model version is exported as float16 and int8 (post-training quantization,
+# calibrated on training images); latency and accuracy of every variant are
+# recorded in model_variants so the serving variant can be chosen against a
+# latency budget. TFLiteModel runs a variant with the same predict() /
+# predict_on_batch() interface DiseaseIdentification uses for Keras models.
+#
+#   python tflite_models.py --report VERSION_ID
+#   python tflite_models.py --choose VERSION_ID --budget-ms 50 [--max-accuracy-drop 0.01]
+import argparse
+import os
+import time
+from lazy_imports import lazy_import
+from repositories import ModelVariantRepository
+
+tf = lazy_import('tensorflow')
+np = lazy_import('numpy')
+
+VARIANTS = ('float16', 'int8')
+CALIBRATION_IMAGES = 200      # training images used to calibrate int8 ranges
+EVALUATION_BATCHES = 20       # validation batches used for accuracy
+LATENCY_RUNS = 30             # single-image invocations timed per variant
+MAX_ACCURACY_DROP = 0.01      # accuracy a variant may lose against Keras
+
+
+def _interpreter_class():
+    # tflite_runtime is a much smaller install than TensorFlow on field laptops
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """Runs a .tflite model with the predict()/predict_on_batch() interface of a Keras model."""
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.interpreter = _interpreter_class()(model_path=model_path,
+                                                num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size, *self._input['shape'][1:]]
+            self.interpreter.resize_tensor_input(self._input['index'], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch)
+        self._resize(batch.shape[0])
+        dtype = self._input['dtype']
+        if dtype in (np.uint8, np.int8):
+            # Quantized input: real = (q - zero_point) * scale
+            scale, zero_point = self._input['quantization']
+            batch = np.clip(np.round(batch / scale + zero_point),
+                            np.iinfo(dtype).min, np.iinfo(dtype).max)
+        self.interpreter.set_tensor(self._input['index'], batch.astype(dtype))
+        self.interpreter.invoke()
+        scores = self.interpreter.get_tensor(self._output['index'])
+        if self._output['dtype'] in (np.uint8, np.int8):
+            scale, zero_point = self._output['quantization']
+            scores = (scores.astype(np.float32) - zero_point) * scale
+        return scores
+
+    def predict(self, batch, verbose=0):
+        return self.predict_on_batch(batch)
+
+
+# --- Export ----------------------------------------------------------------
+def _representative_dataset(train_ds, count=CALIBRATION_IMAGES):
+    def generator():
+        seen = 0
+        for images, _ in train_ds:
+            for image in images:
+                yield [tf.expand_dims(tf.cast(image, tf.float32), 0)]
+                seen += 1
+                if seen >= count:
+                    return
+    return generator
+
+
+def convert(model, variant, train_ds=None):
+    """Return the TFLite flatbuffer for a Keras model in the given variant."""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        if train_ds is None:
+            raise ValueError("int8 quantization needs training images for calibration")
+        converter.representative_dataset = _representative_dataset(train_ds)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    else:
+        raise ValueError(f"Unknown TFLite variant: {variant}")
+    return converter.convert()
+
+
+def measure(model, eval_ds, batches=EVALUATION_BATCHES, runs=LATENCY_RUNS):
+    """
+    Return (accuracy, mean single-image latency in ms) on eval_ds.
+
+    Latency is measured one image at a time, the way the CLI diagnoses.
+    """
+    correct = total = 0
+    sample = None
+    for images, labels in eval_ds.take(batches):
+        scores = np.asarray(model.predict_on_batch(images.numpy()))
+        correct += int(np.sum(np.argmax(scores, axis=1) == labels.numpy()))
+        total += len(labels)
+        if sample is None:
+            sample = images.numpy()[:1]
+    if sample is None:
+        return None, None
+    model.predict_on_batch(sample)  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict_on_batch(sample)
+    latency_ms = (time.perf_counter() - start) * 1000 / runs
+    return correct / total, latency_ms
+
+
+def export_variants(model, model_path, model_version_id, train_ds, eval_ds, variants=VARIANTS):
+    """
+    Write <model>_<variant>.tflite next to model_path for every variant and
+    record size, latency and accuracy (the Keras model as baseline) in
+    model_variants. Returns {variant: (accuracy, latency_ms)}.
+    """
+    repository = ModelVariantRepository()
+    results = {}
+    accuracy, latency_ms = measure(model, eval_ds)
+    repository.record(model_version_id, 'keras', model_path, os.path.getsize(model_path), latency_ms, accuracy)
+    results['keras'] = (accuracy, latency_ms)
+
+    root = os.path.splitext(model_path)[0]
+    for variant in variants:
+        try:
+            flatbuffer = convert(model, variant, train_ds)
+        except Exception as e:
+            print(f"Error exporting {variant} TFLite model: {e}")
+            continue
+        variant_path = f"{root}_{variant}.tflite"
+        with open(variant_path, 'wb') as f:
+            f.write(flatbuffer)
+        accuracy, latency_ms = measure(TFLiteModel(variant_path), eval_ds)
+        repository.record(model_version_id, variant, variant_path, len(flatbuffer), latency_ms, accuracy)
+        results[variant] = (accuracy, latency_ms)
+    return results
+
+
+# --- Choosing the serving variant ------------------------------------------
+def choose_variant(model_version_id, latency_budget_ms, max_accuracy_drop=MAX_ACCURACY_DROP):
+    """
+    Pick the fastest variant within the latency budget that loses at most
+    max_accuracy_drop accuracy against the Keras model, and make it the
+    serving variant. Returns the chosen variant name, or None if none fits.
+    """
+    repository = ModelVariantRepository()
+    variants = repository.for_version(model_version_id)
+    baseline = next((v for v in variants if v.variant == 'keras'), None)
+    if baseline is None or baseline.accuracy is None:
+        print("No measurements recorded for this model version.")
+        return None
+    candidates = [v for v in variants
+                  if v.latency_ms is not None and v.latency_ms <= latency_budget_ms
+                  and v.accuracy is not None and v.accuracy >= baseline.accuracy - max_accuracy_drop]
+    if not candidates:
+        print(f"No variant meets a {latency_budget_ms:g} ms budget within "
+              f"{max_accuracy_drop * 100:.1f}% of the Keras accuracy.")
+        return None
+    chosen = min(candidates, key=lambda v: v.latency_ms)
+    repository.set_serving_variant(model_version_id, chosen.variant)
+    # Cached predictions came from the previous variant
+    import prediction_cache
+    prediction_cache.invalidate()
+    return chosen.variant
+
+
+def print_report(model_version_id):
+    variants = ModelVariantRepository().for_version(model_version_id)
+    if not variants:
+        print("No variants recorded for this model version.")
+        return
+    print(f"\n=== Model variants for version id {model_version_id} ===")
+    for v in variants:
+        accuracy = f"{v.accuracy * 100:.2f}%" if v.accuracy is not None else "n/a"
+        latency = f"{v.latency_ms:.2f} ms" if v.latency_ms is not None else "n/a"
+        print(f"{v.variant:<8} size: {(v.size_bytes or 0) / 1e6:7.2f} MB  latency: {latency:>10}  "
+              f"accuracy: {accuracy}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TFLite model variants")
+    parser.add_argument('--report', type=int, metavar='VERSION_ID')
+    parser.add_argument('--choose', type=int, metavar='VERSION_ID')
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--max-accuracy-drop', type=float, default=MAX_ACCURACY_DROP)
+    args = parser.parse_args()
+    if args.choose is not None:
+        variant = choose_variant(args.choose, args.budget_ms, args.max_accuracy_drop)
+        if variant:
+            print(f"Serving variant for version id {args.choose} set to {variant}.")
+    if args.report is not None or args.choose is not None:
+        print_report(args.report if args.report is not None else args.choose)
+    else:
+        parser.print_help()
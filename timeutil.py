@@ -0,0 +1,50 @@
+# timeutil.py
+# Timestamps are stored as INTEGER seconds since the Unix epoch (UTC), so
+# date-range filters are plain indexed integer comparisons. These helpers
+# convert between epoch values, datetimes and display text.
+import time
+from datetime import datetime
+
+DAY = 24 * 60 * 60
+DISPLAY_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Column default / SQL expression for the current time as epoch seconds
+SQL_NOW = "(CAST(strftime('%s', 'now') AS INTEGER))"
+
+
+def now():
+    """Current time as epoch seconds."""
+    return int(time.time())
+
+
+def to_epoch(value):
+    """Convert a datetime (naive = local time) or a number to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def from_epoch(epoch):
+    """Local naive datetime for an epoch value."""
+    return datetime.fromtimestamp(epoch)
+
+
+def format_timestamp(epoch, fmt=DISPLAY_FORMAT):
+    """Local time display text for an epoch value ('N/A' when unset)."""
+    if epoch is None:
+        return 'N/A'
+    return from_epoch(epoch).strftime(fmt)
+
+
+def days_ago(days):
+    return now() - int(days * DAY)
+
+
+def days_from_now(days):
+    return now() + int(days * DAY)
+
+
+def hours_since(epoch):
+    return (now() - epoch) / 3600
@@ -1,5 +1,6 @@
 import re
 from db import create_connection
+import analytics
 
 def check_existing_user(field, value):
     """
@@ -68,6 +69,7 @@ def update_contact_information(user_id):
                     # Update email in the database
                     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
                     conn.commit()
+                    analytics.invalidate_snapshot()
                     print("Email updated successfully!")
                 
                 elif update_choice == '2':
@@ -93,6 +95,7 @@ def update_contact_information(user_id):
                     # Update phone number in the database
                     cursor.execute("UPDATE users SET phone = ? WHERE id = ?", (new_phone, user_id))
                     conn.commit()
+                    analytics.invalidate_snapshot()
                     print("Phone number updated successfully!")
                 
                 elif update_choice == '3':